@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Admission control of the queries sent to the databases
+
+A database runs at most `max_in_flight_queries` (its extra) or
+QUERY_ADMISSION_MAX_IN_FLIGHT queries at once, the others wait in its queue.
+Waiting queries are admitted by priority class first, interactive charts
+before cache warm-ups before exports, then by the number of queries their
+user already runs, then by arrival. A user with a heavy dashboard can't hold
+the database while the others wait, and `max_in_flight_queries_per_user`
+caps the queries of one user.
+
+The state of the databases is shared through Redis when
+QUERY_ADMISSION_REDIS_URL is set, each process keeps its own otherwise.
+Slots and waiters of crashed processes expire.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import Counter
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+import uuid
+
+from flask import g, has_app_context
+from flask_babel import lazy_gettext as _
+
+from superset import app
+from superset.exceptions import SupersetTimeoutException
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+
+# seconds between two attempts of a waiting query
+POLL_INTERVAL = 0.1
+# waiters that stopped polling for this long are dropped
+WAITER_TTL = 10
+
+
+class Priority(object):
+    """Priority classes, the lower the sooner"""
+    INTERACTIVE = 0
+    WARM_UP = 1
+    # CSV/Excel exports and async SQL Lab queries
+    EXPORT = 2
+    NAMES = {
+        INTERACTIVE: 'interactive',
+        WARM_UP: 'warm_up',
+        EXPORT: 'export',
+    }
+
+
+def set_priority(priority):
+    """Priority class of the queries of the current request or task"""
+    g.query_priority = priority
+
+
+def get_priority():
+    if not has_app_context():
+        return Priority.INTERACTIVE
+    return getattr(g, 'query_priority', Priority.INTERACTIVE)
+
+
+def get_user_id():
+    if not has_app_context():
+        return None
+    return getattr(getattr(g, 'user', None), 'id', None)
+
+
+def get_limits(database):
+    """Max number of queries running on the database and per user"""
+    extra = database.get_extra()
+    limit = extra.get('max_in_flight_queries') or config.get('QUERY_ADMISSION_MAX_IN_FLIGHT')
+    user_limit = (
+        extra.get('max_in_flight_queries_per_user') or
+        config.get('QUERY_ADMISSION_MAX_PER_USER'))
+    return limit, user_limit
+
+
+def new_state():
+    # ticket -> [user_id, expires] of the running queries, and
+    # ticket -> [user_id, priority, enqueued, expires] of the waiting ones
+    return {'slots': {}, 'queue': {}}
+
+
+def expire(state, now):
+    for entries in (state['slots'], state['queue']):
+        for ticket in [t for t, entry in entries.items() if entry[-1] < now]:
+            del entries[ticket]
+
+
+def pick(state, limit, user_limit=None):
+    """Ticket of the next waiter to admit, None when no one can be"""
+    if len(state['slots']) >= limit:
+        return None
+    held = Counter(user_id for user_id, expires in state['slots'].values())
+    candidates = [
+        (priority, held[user_id], enqueued, ticket)
+        for ticket, (user_id, priority, enqueued, expires) in state['queue'].items()
+        if not user_limit or held[user_id] < user_limit]
+    return min(candidates)[-1] if candidates else None
+
+
+class LocalBackend(object):
+    """Keeps the state of the databases in this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+
+    def update(self, key, func):
+        """Applies `func` to the state of `key` and returns what it returns"""
+        with self.lock:
+            return func(self.states.setdefault(key, new_state()))
+
+
+class RedisBackend(object):
+    """Keeps the state of the databases in Redis, shared by all the hosts"""
+
+    def __init__(self, url):
+        import redis
+        self.redis = redis.StrictRedis.from_url(url)
+
+    def update(self, key, func):
+        result = []
+
+        def transaction(pipe):
+            raw = pipe.get(key)
+            state = json.loads(raw.decode('utf-8')) if raw else new_state()
+            del result[:]
+            result.append(func(state))
+            pipe.multi()
+            pipe.set(key, json.dumps(state), ex=config.get('QUERY_ADMISSION_SLOT_TTL'))
+
+        self.redis.transaction(transaction, key)
+        return result[0]
+
+
+class AdmissionController(object):
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def try_admit(self, key, ticket, user_id, priority, limit, user_limit):
+        """Enqueues the ticket or keeps it queued, and admits it when its turn
+        comes. Returns whether it was admitted, the depth of the queue and
+        the number of queries running."""
+        def step(state):
+            now = time.time()
+            expire(state, now)
+            entry = state['queue'].get(ticket)
+            enqueued = entry[2] if entry else now
+            state['queue'][ticket] = [user_id, priority, enqueued, now + WAITER_TTL]
+            admitted = pick(state, limit, user_limit) == ticket
+            if admitted:
+                del state['queue'][ticket]
+                state['slots'][ticket] = [
+                    user_id, now + config.get('QUERY_ADMISSION_SLOT_TTL')]
+            return admitted, len(state['queue']), len(state['slots'])
+        return self.backend.update(key, step)
+
+    def leave(self, key, ticket):
+        """Frees the slot of the ticket, or drops it from the queue"""
+        def step(state):
+            state['slots'].pop(ticket, None)
+            state['queue'].pop(ticket, None)
+        self.backend.update(key, step)
+
+    @staticmethod
+    def gauge_load(name, depth, in_flight):
+        stats_logger.gauge('{}_queue_depth'.format(name), depth)
+        stats_logger.gauge('{}_in_flight'.format(name), in_flight)
+
+    def acquire(self, key, user_id, priority, limit, user_limit=None, timeout=None):
+        """Waits for a slot, returns its ticket once admitted"""
+        ticket = uuid.uuid4().hex
+        start = time.time()
+        name = key.replace(':', '_')
+        try:
+            while True:
+                admitted, depth, in_flight = self.try_admit(
+                    key, ticket, user_id, priority, limit, user_limit)
+                # gauged once per outcome, not on every poll
+                if admitted:
+                    self.gauge_load(name, depth, in_flight)
+                    break
+                if timeout and time.time() - start > timeout:
+                    self.gauge_load(name, depth, in_flight)
+                    stats_logger.incr('{}_timeout'.format(name))
+                    raise SupersetTimeoutException(_(
+                        'The database is busy, the query waited {} seconds to '
+                        'run. Try again later.').format(timeout))
+                time.sleep(POLL_INTERVAL)
+        except BaseException:
+            self.leave(key, ticket)
+            raise
+        stats_logger.gauge(
+            '{}_wait_ms_{}'.format(name, Priority.NAMES.get(priority, priority)),
+            int((time.time() - start) * 1000))
+        return ticket
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            url = config.get('QUERY_ADMISSION_REDIS_URL')
+            _controller = AdmissionController(
+                RedisBackend(url) if url else LocalBackend())
+        return _controller
+
+
+@contextmanager
+def admitted(database, priority=None, user_id=None):
+    """Waits for a slot of the database and holds it while the block runs
+
+    Doesn't wait at all for the databases without a limit.
+    """
+    limit, user_limit = get_limits(database)
+    if not limit:
+        yield
+        return
+    if priority is None:
+        priority = get_priority()
+    if user_id is None:
+        user_id = get_user_id()
+    controller = get_controller()
+    key = 'query_admission:{}'.format(database.id)
+    ticket = controller.acquire(
+        key, user_id, priority, int(limit), user_limit and int(user_limit),
+        timeout=config.get('QUERY_ADMISSION_TIMEOUT'))
+    try:
+        yield
+    finally:
+        try:
+            controller.leave(key, ticket)
+        except Exception as e:
+            # the slot expires on its own
+            logging.warning('Could not free the query slot: {}'.format(e))
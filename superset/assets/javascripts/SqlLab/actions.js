@@ -165,8 +165,9 @@ export function runQuery(query, pageOffset) {
       dataType: 'json',
       url: sqlJsonUrl,
       data: sqlJsonRequest,
-      success(results) {
-        if (!query.runAsync) {
+      success(results, textStatus, xhr) {
+        // 202: the query was sent to the workers, it is polled like async ones
+        if (!query.runAsync && xhr.status !== 202) {
           dispatch(querySuccess(query, results, pageOffset));
         }
       },
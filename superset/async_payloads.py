@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Payloads of the async dashboard charts
+
+The form_data of a chart doesn't go through the broker: explore_json keeps
+it in the results backend under its hash and the async_dashboard task only
+gets the hash. Charts of the same dashboard opened by many users share the
+same entry.
+
+Results are stored under the `query_identity` of the request for
+async_dashboard_result. Results over ASYNC_DASHBOARD_COMPRESS_THRESHOLD
+bytes are stored compressed, the small ones aren't worth it.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import zlib
+
+from superset import app, results_backend
+
+config = app.config
+
+# JSON results start with one of these, compressed ones never do
+JSON_STARTS = (b'{', b'[')
+
+
+def get_form_data_hash(form_data):
+    return hashlib.md5(
+        json.dumps(form_data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_form_data_key(form_data_hash):
+    return 'async_form_data:{}'.format(form_data_hash)
+
+
+def store_form_data(form_data):
+    """Keeps the form_data for the task, returns its hash"""
+    form_data_hash = get_form_data_hash(form_data)
+    results_backend.set(
+        get_form_data_key(form_data_hash),
+        json.dumps(form_data).encode('utf-8'),
+        timeout=config.get('ASYNC_DASHBOARD_CACHE_TIMEOUT'))
+    return form_data_hash
+
+
+def load_form_data(form_data_hash):
+    """form_data of the hash, None once it expired"""
+    blob = results_backend.get(get_form_data_key(form_data_hash))
+    return json.loads(blob.decode('utf-8')) if blob else None
+
+
+def store_result(query_identity, data):
+    """Stores the JSON result of the chart, compressed when large"""
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    if len(data) >= config.get('ASYNC_DASHBOARD_COMPRESS_THRESHOLD'):
+        data = zlib.compress(data)
+    results_backend.set(
+        query_identity, data, timeout=config.get('ASYNC_DASHBOARD_CACHE_TIMEOUT'))
+
+
+def load_result(blob):
+    """JSON string of a stored result"""
+    if blob[:1] in JSON_STARTS:
+        return blob.decode('utf-8')
+    return zlib.decompress(blob).decode('utf-8')
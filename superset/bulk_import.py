@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""Bulk import of exported dashboards, slices and datasources
+
+Existing objects are indexed by their natural keys up front (databases by
+name, tables by database/schema/name, columns and metrics by table/name,
+slices and dashboards by the `remote_id` of their params) with one query
+per kind. Inserts and updates are then computed in memory and written with
+bulk operations, everything in a single transaction.
+
+Columns, metrics, slices and dashboards bypass the ORM events, so no change
+log rows are written for them; the metadata cache of the imported tables
+is invalidated instead.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from copy import deepcopy
+import json
+import logging
+import time
+
+from superset import cache_util
+from superset.connectors.connector_registry import ConnectorRegistry
+from superset.exceptions import SupersetException
+
+
+def loads_params(params):
+    try:
+        return json.loads(params or '{}')
+    except ValueError:
+        return {}
+
+
+def export_values(obj):
+    return {field: getattr(obj, field, None) for field in obj.export_fields}
+
+
+class BulkImport(object):
+    """Imports the payload of `Dashboard.export_dashboards`
+
+    `run` returns the number of inserted and updated objects per kind.
+    """
+
+    kinds = ('datasources', 'columns', 'metrics', 'slices', 'dashboards')
+
+    def __init__(self, session, import_time=None):
+        self.session = session
+        self.import_time = import_time or int(time.time())
+        self.report = {
+            kind: {'inserted': 0, 'updated': 0} for kind in self.kinds}
+        # remote id -> new id
+        self.slice_ids = {}
+        self.dashboard_ids = {}
+        # new slice id -> params, to remap the url drilldowns
+        self.slice_params = {}
+        self.datasources = {}
+
+    def count(self, kind, inserted=0, updated=0):
+        self.report[kind]['inserted'] += inserted
+        self.report[kind]['updated'] += updated
+
+    def run(self, data):
+        dashboards = data.get('dashboards', []) + data.get('dd_dashboards', [])
+        slices = OrderedDict()
+        for slc in data.get('dd_slices', []):
+            slices.setdefault(slc.id, slc)
+        for dashboard in dashboards:
+            for slc in dashboard.slices or []:
+                slices.setdefault(slc.id, slc)
+        try:
+            self.import_datasources(data.get('datasources', []))
+            self.import_slices(list(slices.values()))
+            self.import_dashboards(dashboards)
+            self.remap_drilldowns()
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        logging.info('Bulk import: {}'.format(self.report))
+        return self.report
+
+    def index_remote_ids(self, id_column, params_column):
+        """remote_id -> id of the objects imported before
+
+        Only the id and params columns are read.
+        """
+        index = {}
+        qry = self.session.query(id_column, params_column).filter(
+            params_column.like('%remote_id%'))
+        for obj_id, params in qry:
+            remote_id = loads_params(params).get('remote_id')
+            if remote_id is not None:
+                index[remote_id] = obj_id
+        return index
+
+    def import_datasources(self, datasources):
+        from superset.connectors.sqla.models import SqlaTable
+        from superset.models.core import Database
+
+        tables = []
+        for datasource in datasources:
+            if isinstance(datasource, SqlaTable):
+                tables.append(datasource)
+            else:
+                # other connectors keep their own per object import
+                type(datasource).import_obj(
+                    datasource, import_time=self.import_time)
+        if not tables:
+            return
+
+        database_names = {t.params_dict['database_name'] for t in tables}
+        databases = {
+            database.database_name: database.id for database in
+            self.session.query(Database.id, Database.database_name)
+            .filter(Database.database_name.in_(database_names))
+        }
+        missing = database_names - set(databases)
+        if missing:
+            raise SupersetException(
+                'Databases not found: {}'.format(', '.join(sorted(missing))))
+        existing = {
+            (table.database_id, table.schema, table.table_name): table
+            for table in self.session.query(SqlaTable).filter(
+                SqlaTable.database_id.in_(databases.values()),
+                SqlaTable.table_name.in_({t.table_name for t in tables}))
+        }
+
+        imported = []
+        for i_table in tables:
+            params = i_table.params_dict
+            params['import_time'] = self.import_time
+            values = export_values(i_table)
+            values.update(
+                database_id=databases[params['database_name']],
+                params=json.dumps(params))
+            key = (values['database_id'], values['schema'], values['table_name'])
+            table = existing.get(key)
+            if table is None:
+                table = existing[key] = SqlaTable(**values)
+                self.session.add(table)
+                self.count('datasources', inserted=1)
+            else:
+                for field, value in values.items():
+                    setattr(table, field, value)
+                self.count('datasources', updated=1)
+            imported.append((i_table, table))
+        # tables go through the ORM once, so their perms are still maintained
+        self.session.flush()
+
+        columns = OrderedDict()
+        metrics = OrderedDict()
+        for i_table, table in imported:
+            for column in i_table.columns:
+                columns[(table.id, column.column_name)] = column
+            for metric in i_table.metrics:
+                metrics[(table.id, metric.metric_name)] = metric
+        self.upsert_children(
+            'columns', SqlaTable.column_class, 'column_name', columns)
+        self.upsert_children(
+            'metrics', SqlaTable.metric_class, 'metric_name', metrics)
+        cache_util.bump_metadata_version_on_commit(
+            self.session, *['{}__table'.format(table.id) for _, table in imported])
+
+    def upsert_children(self, kind, model, name_field, children):
+        """Writes columns or metrics keyed by (table_id, name)"""
+        if not children:
+            return
+        table_ids = {table_id for table_id, _ in children}
+        existing = {
+            (table_id, name): obj_id for obj_id, table_id, name in
+            self.session.query(
+                model.id, model.table_id, getattr(model, name_field))
+            .filter(model.table_id.in_(table_ids))
+        }
+        inserts = []
+        updates = []
+        for (table_id, name), child in children.items():
+            values = export_values(child)
+            values['table_id'] = table_id
+            obj_id = existing.get((table_id, name))
+            if obj_id is None:
+                inserts.append(values)
+            else:
+                values['id'] = obj_id
+                updates.append(values)
+        self.session.bulk_insert_mappings(model, inserts)
+        self.session.bulk_update_mappings(model, updates)
+        self.count(kind, inserted=len(inserts), updated=len(updates))
+
+    def get_datasource(self, datasource_type, params):
+        """(id, perm) of the datasource of an imported slice"""
+        key = (datasource_type, params['database_name'], params['datasource_name'])
+        if key not in self.datasources:
+            if datasource_type == 'table':
+                self.index_tables(params['database_name'])
+            if key not in self.datasources:
+                datasource = ConnectorRegistry.get_datasource_by_name(
+                    self.session, datasource_type, params['datasource_name'],
+                    params.get('schema'), params['database_name'])
+                self.datasources[key] = (datasource.id, datasource.perm)
+        return self.datasources[key]
+
+    def index_tables(self, database_name):
+        from superset.connectors.sqla.models import SqlaTable
+        from superset.models.core import Database
+
+        qry = (
+            self.session.query(
+                SqlaTable.id, SqlaTable.perm, SqlaTable.schema,
+                SqlaTable.table_name, Database.database_name,
+                Database.verbose_name)
+            .join(Database, SqlaTable.database_id == Database.id)
+            .filter(
+                (Database.database_name == database_name) |
+                (Database.verbose_name == database_name))
+        )
+        for row in qry:
+            name = (
+                '{}.{}'.format(row.schema, row.table_name) if row.schema
+                else row.table_name)
+            key = ('table', row.verbose_name or row.database_name, name)
+            self.datasources.setdefault(key, (row.id, row.perm))
+
+    def import_slices(self, slices):
+        from superset.models.core import Slice
+
+        if not slices:
+            return
+        existing = self.index_remote_ids(Slice.id, Slice.params)
+        inserts = []
+        updates = []
+        for i_slc in slices:
+            params = i_slc.params_dict
+            params.update(remote_id=i_slc.id, import_time=self.import_time)
+            values = export_values(i_slc)
+            values['params'] = json.dumps(params)
+            values['datasource_id'], values['perm'] = self.get_datasource(
+                values['datasource_type'], params)
+            slice_id = existing.get(i_slc.id)
+            if slice_id is None:
+                inserts.append((i_slc.id, values))
+            else:
+                values['id'] = slice_id
+                updates.append((i_slc.id, values))
+        # ids of the new slices are needed by the dashboards
+        self.session.bulk_insert_mappings(
+            Slice, [values for _, values in inserts], return_defaults=True)
+        self.session.bulk_update_mappings(
+            Slice, [values for _, values in updates])
+        for remote_id, values in inserts + updates:
+            self.slice_ids[remote_id] = values['id']
+            self.slice_params[values['id']] = json.loads(values['params'])
+        self.count('slices', inserted=len(inserts), updated=len(updates))
+
+    def remap_slice_ids(self, params):
+        """Points the slice ids of the dashboard metadata to the new slices"""
+        ids = {
+            str(remote_id): str(slice_id)
+            for remote_id, slice_id in self.slice_ids.items()}
+        for field in ('filter_immune_slices', 'timed_refresh_immune_slices'):
+            new_ids = [ids[i] for i in ids if i in params.get(field, [])]
+            if new_ids:
+                params[field] = new_ids
+        expanded_slices = {
+            ids[i]: value for i, value in params.get('expanded_slices', {}).items()
+            if i in ids
+        }
+        if expanded_slices:
+            params['expanded_slices'] = expanded_slices
+
+    def dashboard_values(self, i_dash):
+        positions = i_dash.position_array
+        for position in positions:
+            if 'slice_id' not in position:
+                continue
+            slice_id = self.slice_ids.get(int(position['slice_id']))
+            if slice_id is not None:
+                position['slice_id'] = '{}'.format(slice_id)
+        params = i_dash.params_dict
+        params.update(remote_id=i_dash.id, import_time=self.import_time)
+        self.remap_slice_ids(params)
+        values = export_values(i_dash)
+        values.update(
+            position_json=json.dumps(positions), json_metadata=json.dumps(params))
+        return values
+
+    def import_dashboards(self, dashboards):
+        from superset.models.core import Dashboard, dashboard_slices
+
+        if not dashboards:
+            return
+        existing = self.index_remote_ids(Dashboard.id, Dashboard.json_metadata)
+        inserts = []
+        updates = []
+        slice_ids = OrderedDict()
+        for i_dash in dashboards:
+            if i_dash.id in slice_ids:
+                continue
+            slice_ids[i_dash.id] = [
+                self.slice_ids[slc.id] for slc in i_dash.slices or []]
+            values = self.dashboard_values(i_dash)
+            dashboard_id = existing.get(i_dash.id)
+            if dashboard_id is None:
+                inserts.append((i_dash.id, values))
+            else:
+                values['id'] = dashboard_id
+                updates.append((i_dash.id, values))
+        self.session.bulk_insert_mappings(
+            Dashboard, [values for _, values in inserts], return_defaults=True)
+        self.session.bulk_update_mappings(
+            Dashboard, [values for _, values in updates])
+        for remote_id, values in inserts + updates:
+            self.dashboard_ids[remote_id] = values['id']
+
+        if updates:
+            self.session.execute(dashboard_slices.delete().where(
+                dashboard_slices.c.dashboard_id.in_(
+                    [values['id'] for _, values in updates])))
+        rows = [
+            {'dashboard_id': self.dashboard_ids[remote_id], 'slice_id': slice_id}
+            for remote_id, ids in slice_ids.items() for slice_id in ids
+        ]
+        if rows:
+            self.session.execute(dashboard_slices.insert(), rows)
+        self.count('dashboards', inserted=len(inserts), updated=len(updates))
+
+    def remap_drilldowns(self):
+        """Points the url drilldowns of the imported slices to the new ids"""
+        from superset.models.core import Slice
+
+        ids = {'slices': self.slice_ids, 'dashboards': self.dashboard_ids}
+        updates = []
+        for slice_id, params in self.slice_params.items():
+            url_drilldowns = deepcopy(params.get('url_drilldowns', []))
+            for drilldown in url_drilldowns:
+                new_ids = ids.get(drilldown.get('type'), {})
+                if drilldown.get('url') in new_ids:
+                    drilldown['url'] = new_ids[drilldown['url']]
+            if url_drilldowns != params.get('url_drilldowns', []):
+                params['url_drilldowns'] = url_drilldowns
+                updates.append({'id': slice_id, 'params': json.dumps(params)})
+        self.session.bulk_update_mappings(Slice, updates)
@@ -4,9 +4,18 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import hashlib
+import logging
+import uuid
+
 from flask import request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from superset import cache, tables_cache
 
-from superset import tables_cache
+# session.info key of the metadata versions to bump once the session commits
+PENDING_VERSIONS_KEY = 'pending_metadata_versions'
 
 
 def view_cache_key(*unused_args, **unused_kwargs):
@@ -37,3 +46,71 @@ def memoized_func(timeout=5 * 60, key=view_cache_key):
                 return f(cls, *args, **kwargs)
         return wrapped_f
     return wrap
+
+
+def metadata_version_key(name):
+    return 'metadata_version/{}'.format(name)
+
+
+def get_metadata_version(name):
+    """Returns the current version of the metadata called `name`
+
+    The version is a random token kept in the cache, bumping it makes
+    every payload cached under the previous version unreachable.
+    """
+    key = metadata_version_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, timeout=0)
+    return version
+
+
+def bump_metadata_version(*names):
+    if not cache:
+        return
+    for name in names:
+        cache.delete(metadata_version_key(name))
+
+
+def bump_metadata_version_on_commit(session, *names):
+    """Bumps the versions once the transaction of `session` is committed
+
+    A version bumped before the commit could be picked by a concurrent
+    request still reading the old rows, which would cache the stale payload
+    under the new version.
+    """
+    if session is None:
+        bump_metadata_version(*names)
+        return
+    session.info.setdefault(PENDING_VERSIONS_KEY, set()).update(names)
+
+
+def bump_pending_metadata_versions(session):
+    bump_metadata_version(*session.info.pop(PENDING_VERSIONS_KEY, ()))
+
+
+def discard_pending_metadata_versions(session):
+    session.info.pop(PENDING_VERSIONS_KEY, None)
+
+
+event.listen(Session, 'after_commit', bump_pending_metadata_versions)
+event.listen(Session, 'after_rollback', discard_pending_metadata_versions)
+
+
+def versioned_cache(key, versions, func, timeout=None):
+    """Returns func() cached under `key` and the current metadata versions"""
+    if not cache:
+        return func()
+    parts = [key] + [get_metadata_version(name) for name in versions]
+    cache_key = 'versioned/{}'.format(
+        hashlib.md5('/'.join(parts).encode('utf-8')).hexdigest())
+    o = cache.get(cache_key)
+    if o is not None:
+        return o
+    o = func()
+    try:
+        cache.set(cache_key, o, timeout=timeout)
+    except Exception as e:
+        logging.exception(e)
+    return o
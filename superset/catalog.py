@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""Persistent catalog of the schemas, tables and columns of the databases
+
+SQL Lab browses the metadata through this catalog instead of reflecting it
+live. Entries are stored in the `catalog_entries` table and reused for
+CATALOG_TTL seconds; stale entries are still served while they are
+refreshed, in a celery task when CATALOG_BACKGROUND_REFRESH is set.
+Engines with a catalog query (see `catalog_relations_sql` in the engine
+specs) get every table and view of the database with a single query
+instead of one inspector call per schema. Columns are always reflected, so
+the table payloads keep the SQLAlchemy type strings.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import logging
+import time
+
+import sqlalchemy as sqla
+
+from superset import app, cache, db
+from superset.models.catalog import CatalogEntry, CatalogEntryKind
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+
+# max number of keys per DELETE ... IN (...)
+DELETE_CHUNK_SIZE = 500
+# stores racing with concurrent ones on the same keys are retried
+STORE_ATTEMPTS = 3
+
+
+def get_ttl():
+    return timedelta(seconds=config.get('CATALOG_TTL', 3600))
+
+
+def read(database_id, kind, schema=None, table_name=None):
+    """Returns the (payload, changed_on) of an entry, None if missing"""
+    table = CatalogEntry.__table__
+    qry = sqla.select([table.c.payload, table.c.changed_on]).where(sqla.and_(
+        table.c.database_id == database_id,
+        table.c.kind == kind,
+        table.c.schema == (schema or ''),
+        table.c.table_name == (table_name or ''),
+    ))
+    with db.engine.connect() as connection:
+        row = connection.execute(qry).first()
+    if row is None:
+        return None
+    return json.loads(row.payload), row.changed_on
+
+
+def read_changed_on(database_id, kind):
+    """Returns {schema: changed_on} of every entry of a kind"""
+    table = CatalogEntry.__table__
+    qry = sqla.select([table.c.schema, table.c.changed_on]).where(sqla.and_(
+        table.c.database_id == database_id,
+        table.c.kind == kind,
+    ))
+    with db.engine.connect() as connection:
+        return dict(connection.execute(qry).fetchall())
+
+
+def read_all(database_id, kind):
+    """Returns {schema: payload} of every entry of a kind"""
+    table = CatalogEntry.__table__
+    qry = sqla.select([table.c.schema, table.c.payload]).where(sqla.and_(
+        table.c.database_id == database_id,
+        table.c.kind == kind,
+    ))
+    with db.engine.connect() as connection:
+        return {
+            schema: json.loads(payload)
+            for schema, payload in connection.execute(qry)
+        }
+
+
+def store(database_id, kind, entries, replace_all=False):
+    """Writes {(schema, table_name): payload} entries in one transaction
+
+    Existing entries with the same keys are replaced, `replace_all` first
+    drops every entry of this kind for the database.
+    """
+    for attempt in range(STORE_ATTEMPTS):
+        try:
+            with db.engine.begin() as connection:
+                replace_entries(
+                    connection, database_id, kind, entries, replace_all)
+            break
+        except sqla.exc.IntegrityError:
+            # a concurrent store inserted some of the keys between the delete
+            # and the insert, its transaction is committed so the next attempt
+            # replaces them
+            stats_logger.incr('catalog_store_conflict')
+            if attempt == STORE_ATTEMPTS - 1:
+                raise
+    stats_logger.incr('catalog_store_{}'.format(kind))
+
+
+def replace_entries(connection, database_id, kind, entries, replace_all):
+    table = CatalogEntry.__table__
+    now = datetime.utcnow()
+    by_schema = {}
+    for schema, table_name in entries:
+        by_schema.setdefault(schema or '', []).append(table_name or '')
+    where = sqla.and_(table.c.database_id == database_id, table.c.kind == kind)
+    if replace_all:
+        connection.execute(table.delete().where(where))
+    else:
+        for schema, names in by_schema.items():
+            for i in range(0, len(names), DELETE_CHUNK_SIZE):
+                connection.execute(table.delete().where(sqla.and_(
+                    where,
+                    table.c.schema == schema,
+                    table.c.table_name.in_(names[i:i + DELETE_CHUNK_SIZE]),
+                )))
+    if entries:
+        connection.execute(table.insert(), [
+            {
+                'database_id': database_id,
+                'kind': kind,
+                'schema': schema or '',
+                'table_name': table_name or '',
+                'payload': json.dumps(payload, default=str),
+                'changed_on': now,
+            }
+            for (schema, table_name), payload in entries.items()
+        ])
+
+
+def invalidate(database_id, schema=None, table_name=None):
+    """Drops the entries of a database, of one of its schemas or tables"""
+    table = CatalogEntry.__table__
+    where = [table.c.database_id == database_id]
+    if schema is not None:
+        where.append(table.c.schema == schema)
+    if table_name is not None:
+        where.append(table.c.table_name == table_name)
+    with db.engine.begin() as connection:
+        return connection.execute(
+            table.delete().where(sqla.and_(*where))).rowcount
+
+
+def fetch_relations(database, schemas=None, inspector=None):
+    """Reflects and stores the tables and views of the schemas
+
+    Returns {schema: {'tables': [...], 'views': [...]}}. Engines with a
+    catalog query get the whole database at once (and `schemas` is only
+    used to list the schemas without any relation).
+    """
+    spec = database.db_engine_spec
+    relations = spec.fetch_catalog_relations(database)
+    replace_all = relations is not None
+    if relations is None:
+        relations = {}
+        inspector = inspector or database.inspector
+        for schema in schemas or spec.get_schema_names(inspector):
+            relations[schema] = {
+                'tables': spec.get_table_names(schema, inspector),
+                'views': reflect_view_names(inspector, schema),
+            }
+    for schema in schemas or []:
+        relations.setdefault(schema, {'tables': [], 'views': []})
+    store_relations(database.id, relations, replace_all=replace_all)
+    return relations
+
+
+def store_relations(database_id, relations, replace_all=False):
+    for kind in (CatalogEntryKind.TABLES, CatalogEntryKind.VIEWS):
+        store(database_id, kind, {
+            (schema, None): names[kind] for schema, names in relations.items()
+        }, replace_all=replace_all)
+
+
+def reflect_view_names(inspector, schema):
+    try:
+        return sorted(inspector.get_view_names(schema))
+    except Exception:
+        return []
+
+
+def fetch_table(database, table_name, schema=None, inspector=None):
+    """Reflects and stores the columns and keys of a table"""
+    spec = database.db_engine_spec
+    inspector = inspector or database.inspector
+    columns = [
+        dict(col, type='{}'.format(col['type']))
+        for col in inspector.get_columns(table_name, schema)
+    ]
+    payload = {
+        'columns': columns,
+        'indexes': [],
+        'primary_key': {},
+        'foreign_keys': [],
+    }
+    if spec.catalog_reflect_keys:
+        payload.update(
+            indexes=inspector.get_indexes(table_name, schema),
+            primary_key=inspector.get_pk_constraint(table_name, schema),
+            foreign_keys=inspector.get_foreign_keys(table_name, schema),
+        )
+    # round trip through json so fresh and stored payloads look the same
+    payload = json.loads(json.dumps(payload, default=str))
+    store(database.id, CatalogEntryKind.TABLE, {(schema, table_name): payload})
+    return payload
+
+
+def refresh(database, kind, schema=None, table_name=None):
+    """Reflects and stores one entry, returns its payload"""
+    stats_logger.incr('catalog_refresh_{}'.format(kind))
+    if kind == CatalogEntryKind.SCHEMAS:
+        spec = database.db_engine_spec
+        schemas = sorted(spec.get_schema_names(database.inspector))
+        store(database.id, kind, {(None, None): schemas})
+        return schemas
+    if kind == CatalogEntryKind.TABLE:
+        return fetch_table(database, table_name, schema)
+    relations = fetch_relations(database, schemas=[schema])
+    return relations.get(schema, {}).get(kind, [])
+
+
+def schedule_refresh(database, kind, schema=None, table_name=None):
+    """Refreshes a stale entry, in the background when possible
+
+    Returns the fresh payload when it was refreshed inline, None otherwise.
+    """
+    if not config.get('CATALOG_BACKGROUND_REFRESH'):
+        return refresh(database, kind, schema, table_name)
+    # dedupe the refreshes requested while the task is queued
+    lock_key = 'catalog_refresh/{}/{}/{}/{}'.format(
+        database.id, kind, schema, table_name)
+    if cache and not cache.add(
+            lock_key, 1, timeout=int(get_ttl().total_seconds())):
+        return None
+    from superset.tasks.catalog import refresh_catalog_entry
+    refresh_catalog_entry.delay(database.id, kind, schema, table_name)
+    return None
+
+
+def get(database, kind, schema=None, table_name=None, force=False):
+    """Returns the payload of an entry, reflecting it when missing"""
+    entry = None if force else read(database.id, kind, schema, table_name)
+    if entry is None:
+        return refresh(database, kind, schema, table_name)
+    payload, changed_on = entry
+    if changed_on is None or datetime.utcnow() - changed_on > get_ttl():
+        stats_logger.incr('catalog_stale')
+        try:
+            fresh = schedule_refresh(database, kind, schema, table_name)
+            if fresh is not None:
+                return fresh
+        except Exception as e:
+            logging.exception(e)
+    return payload
+
+
+def get_schema_names(database, force=False):
+    return get(database, CatalogEntryKind.SCHEMAS, force=force)
+
+
+def get_table_names(database, schema, force=False):
+    return get(database, CatalogEntryKind.TABLES, schema, force=force)
+
+
+def get_view_names(database, schema, force=False):
+    return get(database, CatalogEntryKind.VIEWS, schema, force=force)
+
+
+def get_table(database, table_name, schema=None, force=False):
+    return get(database, CatalogEntryKind.TABLE, schema, table_name, force)
+
+
+def get_all_names(database, kind, force=False):
+    """Full names (<schema>.<name>) of every table or view of the database
+
+    Only the schemas missing from the catalog are reflected.
+    """
+    schemas = get_schema_names(database, force=force)
+    names = {} if force else read_all(database.id, kind)
+    missing = [schema for schema in schemas if schema not in names]
+    if missing:
+        relations = fetch_relations(database, schemas=missing)
+        names.update(
+            (schema, rels[kind]) for schema, rels in relations.items())
+    return [
+        '{}.{}'.format(schema, name)
+        for schema in schemas
+        for name in names.get(schema, [])
+    ]
+
+
+def crawl_database(database, resume=True, batch_size=None):
+    """Reflects every schema, table and view of a database in the catalog
+
+    Engines with a catalog query (PostgreSQL, ClickHouse...) are crawled
+    with that single query, which has nothing to resume: every schema is
+    stored again and `skipped` stays 0. The others are reflected schema by
+    schema and stored every `batch_size` schemas; when `resume` is set, a
+    crawl interrupted by a failure restarts after the schemas already
+    stored by the failed run. Returns a report with the counts and the
+    duration of the crawl.
+    """
+    start = time.time()
+    batch_size = batch_size or config.get('CATALOG_CRAWL_BATCH_SIZE', 50)
+    state = read(database.id, CatalogEntryKind.CRAWL)
+    state = state[0] if state else {}
+    if resume and state.get('started_on') and not state.get('finished_on'):
+        started_on = datetime.strptime(state['started_on'], '%Y-%m-%dT%H:%M:%S')
+    else:
+        started_on = datetime.utcnow().replace(microsecond=0)
+    state = {'started_on': started_on.isoformat(), 'finished_on': None}
+    store(database.id, CatalogEntryKind.CRAWL, {(None, None): state})
+
+    report = {'database': database.name, 'tables': 0, 'views': 0, 'skipped': 0}
+    spec = database.db_engine_spec
+    inspector = database.inspector
+    schemas = sorted(spec.get_schema_names(inspector))
+    store(database.id, CatalogEntryKind.SCHEMAS, {(None, None): schemas})
+
+    relations = spec.fetch_catalog_relations(database)
+    if relations is not None:
+        for schema in schemas:
+            relations.setdefault(schema, {'tables': [], 'views': []})
+        store_relations(database.id, relations, replace_all=True)
+        batches = [relations]
+    else:
+        crawled = read_changed_on(database.id, CatalogEntryKind.TABLES)
+        pending = [
+            schema for schema in schemas
+            if not crawled.get(schema) or crawled[schema] < started_on
+        ]
+        report['skipped'] = len(schemas) - len(pending)
+        batches = (
+            fetch_relations(
+                database, schemas=pending[i:i + batch_size], inspector=inspector)
+            for i in range(0, len(pending), batch_size)
+        )
+    for batch in batches:
+        for names in batch.values():
+            report['tables'] += len(names['tables'])
+            report['views'] += len(names['views'])
+
+    report['schemas'] = len(schemas)
+    report['duration'] = round(time.time() - start, 3)
+    state['finished_on'] = datetime.utcnow().isoformat()
+    state['duration'] = report['duration']
+    store(database.id, CatalogEntryKind.CRAWL, {(None, None): state})
+    stats_logger.incr('catalog_crawl')
+    return report
+
+
+def crawl(database_ids, resume=True, max_workers=None):
+    """Crawls the databases in parallel, returns a report per database
+
+    Every database runs in its own thread, app context and session. A
+    failure is reported and doesn't stop the other databases.
+    """
+    from superset.models.core import Database
+
+    def run(database_id):
+        start = time.time()
+        with app.app_context():
+            try:
+                database = db.session.query(Database).filter_by(
+                    id=database_id).one()
+                report = crawl_database(database, resume=resume)
+                report['error'] = None
+            except Exception as e:
+                logging.exception(e)
+                report = {
+                    'database_id': database_id,
+                    'error': '{}'.format(e),
+                    'duration': round(time.time() - start, 3),
+                }
+            finally:
+                db.session.remove()
+        report['database_id'] = database_id
+        return report
+
+    max_workers = max_workers or config.get('CATALOG_CRAWL_WORKERS', 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run, database_ids))
@@ -16,7 +16,9 @@ from flask_script import Manager
 from pathlib2 import Path
 import yaml
 
-from superset import app, data, db, dict_import_export_util, security_manager, utils
+from superset import (
+    app, data, db, dict_import_export_util, security_manager, task_queues, utils,
+)
 
 config = app.config
 celery_app = utils.get_celery_app(config)
@@ -269,24 +271,51 @@ def export_datasource_schema(back_references):
     yaml.safe_dump(data, stdout, default_flow_style=False)
 
 
-@manager.command
-def update_datasources_cache():
+@manager.option(
+    '-d', '--database',
+    help='Name of the database to crawl, all databases if omitted')
+@manager.option(
+    '-w', '--workers', type=int,
+    default=config.get('CATALOG_CRAWL_WORKERS', 4),
+    help='Number of databases crawled in parallel')
+@manager.option(
+    '-f', '--force', action='store_true', default=False,
+    help='Restart the crawl instead of resuming an interrupted one')
+def update_datasources_cache(database, workers, force):
     """Refresh sqllab datasources cache"""
+    from superset import catalog
     from superset.models.core import Database
-    for database in db.session.query(Database).all():
-        print('Fetching {} datasources ...'.format(database.name))
-        try:
-            database.all_table_names(force=True)
-            database.all_view_names(force=True)
-        except Exception as e:
-            print('{}'.format(e.message))
+    qry = db.session.query(Database.id)
+    if database:
+        qry = qry.filter(Database.database_name == database)
+    database_ids = [database_id for database_id, in qry.all()]
+    db.session.remove()
+    print('Crawling {} databases ...'.format(len(database_ids)))
+    for report in catalog.crawl(
+            database_ids, resume=not force, max_workers=workers):
+        if report['error']:
+            print('{database_id}: failed after {duration}s: {error}'.format(
+                **report))
+        else:
+            print(
+                '{database}: {schemas} schemas ({skipped} already crawled), '
+                '{tables} tables, {views} views in {duration}s'.format(
+                    **report))
 
 
 @manager.option(
     '-w', '--workers',
     type=int,
     help='Number of celery server workers to fire up')
-def worker(workers):
+@manager.option(
+    '-q', '--queues',
+    help=('Comma separated queues to consume, only the default queue by '
+          'default: the queues of CELERY_QUERY_QUEUE and of the databases '
+          'need workers started with this option'))
+@manager.option(
+    '--prefetch-one', action='store_true', dest='prefetch_one',
+    help='Reserve one task at a time, for queues of long-running queries')
+def worker(workers, queues=None, prefetch_one=False):
     """Starts a Superset worker for async SQL query execution."""
     logging.info(
         "The 'superset worker' command is deprecated. Please use the 'celery "
@@ -297,7 +326,14 @@ def worker(workers):
         celery_app.conf.update(
             CELERYD_CONCURRENCY=config.get('SUPERSET_CELERY_WORKERS'))
 
-    worker = celery_app.Worker(optimization='fair')
+    options = {}
+    if queues:
+        queues = [q.strip() for q in queues.split(',') if q.strip()]
+        options['queues'] = queues
+    # a worker would otherwise reserve tasks stuck behind a slow query
+    if prefetch_one or task_queues.prefetches_one(queues):
+        options['prefetch_multiplier'] = 1
+    worker = celery_app.Worker(optimization='fair', **options)
     worker.start()
 
 
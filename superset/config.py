@@ -185,6 +185,31 @@ CACHE_DEFAULT_TIMEOUT = 60 * 60 * 24
 CACHE_CONFIG = {'CACHE_TYPE': 'null'}
 TABLE_NAMES_CACHE_CONFIG = {'CACHE_TYPE': 'null'}
 
+# Time-series charts cache their results per closed time bucket (see
+# superset/time_buckets.py), so that only the missing buckets and the ones
+# still open are queried. Buckets are multiples of the time grain at least
+# INCREMENTAL_CACHE_MIN_BUCKET seconds long; the incremental path is skipped when a
+# query would be split in more than INCREMENTAL_CACHE_MAX_BUCKETS pieces.
+INCREMENTAL_CACHE_ENABLED = False
+INCREMENTAL_CACHE_MIN_BUCKET = 60 * 60 * 24
+INCREMENTAL_CACHE_MAX_BUCKETS = 400
+
+# Line charts comparing with a past period (`time_compare`) read both windows
+# with a single query when they overlap and the slicing bounds fall on grain
+# boundaries; other comparisons still query the shifted window on its own.
+TIME_COMPARE_UNION = True
+
+# Schemas, tables and columns browsed in SQL Lab are kept in the metadata
+# catalog (see superset/catalog.py) for CATALOG_TTL seconds. Stale entries
+# are served while being refreshed, by a celery task when
+# CATALOG_BACKGROUND_REFRESH is True, inline otherwise.
+CATALOG_TTL = 60 * 60
+CATALOG_BACKGROUND_REFRESH = False
+# `superset update_datasources_cache` crawls this many databases at once and
+# stores the reflected relations every CATALOG_CRAWL_BATCH_SIZE schemas
+CATALOG_CRAWL_WORKERS = 4
+CATALOG_CRAWL_BATCH_SIZE = 50
+
 # CORS Options
 ENABLE_CORS = False
 CORS_OPTIONS = {}
@@ -193,6 +218,11 @@ CORS_OPTIONS = {}
 # TODO: Add processing of other spreadsheet formats (xls, xlsx etc)
 ALLOWED_EXTENSIONS = set(['csv'])
 
+# CSV uploads are streamed to the database chunk by chunk, column types are
+# inferred from the first CSV_UPLOAD_SAMPLE_ROWS rows
+CSV_UPLOAD_CHUNK_SIZE = 10000
+CSV_UPLOAD_SAMPLE_ROWS = 1000
+
 # CSV Options: key/value pairs that will be passed as argument to DataFrame.to_csv method
 # note: index option should not be overridden
 CSV_EXPORT = {
@@ -249,6 +279,12 @@ BACKUP_COUNT = 30
 
 # Set this API key to enable Mapbox visualizations
 MAPBOX_API_KEY = os.environ.get('MAPBOX_API_KEY', '')
+
+# Tiled mode of the map visualizations (`spatial_tiles` in form_data):
+# max number of tiles returned for a viewport (the zoom is lowered to fit)
+# and max number of cells per side of a tile
+SPATIAL_MAX_TILES = 16
+SPATIAL_TILE_CELLS = 32
 YANDEX_API_KEY = os.environ.get('YANDEX_API_KEY', '')
 
 # Maximum number of rows returned in the SQL editor
@@ -297,6 +333,35 @@ DEFAULT_DB_ID = None
 # Timeout duration for SQL Lab synchronous queries
 SQLLAB_TIMEOUT = 30
 
+# Format of the SQL Lab results: 'rows' (a dict per row), 'columnar' (a list
+# per column) or 'binary' (base64 typed buffers per column, with null masks).
+# Clients can ask for another format with the results_format form field of
+# /superset/sql_json/ and the format argument of /superset/results/<key>/
+SQLLAB_RESULTS_FORMAT = 'rows'
+# Format of the SQL Lab results stored in the results backend
+RESULTS_BACKEND_FORMAT = 'binary'
+
+# Charts and SQL Lab queries are explained before they run on databases with
+# `cost_thresholds` in their extra (see superset/query_cost.py), these are
+# used for the databases without any. Estimates are cached for
+# QUERY_COST_CACHE_TIMEOUT seconds.
+DEFAULT_QUERY_COST_THRESHOLDS = {}
+QUERY_COST_CACHE_TIMEOUT = 60 * 10
+
+# Admission control of the chart and SQL Lab queries (see
+# superset/admission.py). A database runs at most `max_in_flight_queries`
+# (its extra) or QUERY_ADMISSION_MAX_IN_FLIGHT queries at once, None for no
+# limit, and `max_in_flight_queries_per_user` or QUERY_ADMISSION_MAX_PER_USER
+# queries of the same user. Queries give up after waiting
+# QUERY_ADMISSION_TIMEOUT seconds, and slots are freed after
+# QUERY_ADMISSION_SLOT_TTL seconds when their process didn't free them.
+# Set QUERY_ADMISSION_REDIS_URL to share the limits between the processes.
+QUERY_ADMISSION_MAX_IN_FLIGHT = None
+QUERY_ADMISSION_MAX_PER_USER = None
+QUERY_ADMISSION_TIMEOUT = 60
+QUERY_ADMISSION_SLOT_TTL = 60 * 60
+QUERY_ADMISSION_REDIS_URL = None
+
 # SQLLAB_DEFAULT_DBID
 SQLLAB_DEFAULT_DBID = None
 
@@ -326,7 +391,63 @@ UPDATE_PENDING_QUERIES_TIME_SECONDS = int(os.environ.get('UPDATE_PENDING_QUERIES
 
 
 CELERY_CONFIG = CeleryConfig
+
+# Async dashboard and SQL Lab tasks go to the queue named in the extra of their
+# database (see superset/task_queues.py), or to this template formatted with
+# the {backend}, {database_id} and {workload} ('dashboard', 'sql_lab'), e.g.
+# '{backend}_{workload}'. None for the default queue. Workers only consume the
+# default queue, start some with `superset worker --queues` for the others.
+CELERY_QUERY_QUEUE = None
+# Workers started with `superset worker --queues` on these queues only
+# reserve one task at a time
+CELERY_PREFETCH_ONE_QUEUES = []
+
 ASYNC_DASHBOARD_CACHE_TIMEOUT = 3600
+# Async dashboard results of at least this many bytes are stored compressed
+ASYNC_DASHBOARD_COMPRESS_THRESHOLD = 16 * 1024
+# Soft time limit (in seconds) of the async dashboard tasks, their chart
+# queries still running on the databases are cancelled when it is reached
+ASYNC_DASHBOARD_TIME_LIMIT_SEC = 60 * 10
+
+# Cache warm-up (see superset/tasks/cache.py)
+# Number of threads running warm-up queries inside one warm-up run
+CACHE_WARMUP_WORKERS = 4
+# Max warm-up queries running at once against a single database,
+# can be overridden with "cache_warmup_concurrency" in Database.extra
+CACHE_WARMUP_MAX_CONCURRENCY_PER_DB = 2
+# Window (in days) of the Log table used to pick the top N viewed slices
+CACHE_WARMUP_TOP_N_DAYS = 7
+# Cache keys depend on the user, warm-ups without an explicit user
+# are run on behalf of this user id
+CACHE_WARMUP_USER_ID = None
+# Periodic warm-ups, e.g. every morning before office hours:
+# from celery.schedules import crontab
+# CACHE_WARMUP_SCHEDULES = [{
+#     'name': 'morning warm-up',
+#     'schedule': crontab(hour=7, minute=0),
+#     'kwargs': {'top_n': 100},
+# }]
+CACHE_WARMUP_SCHEDULES = []
+
+# Sink used by Log.log_this:
+# 'sync' writes the Log row in the request (one commit per request),
+# 'thread' buffers rows and bulk inserts them from a background thread,
+# 'celery' buffers rows and hands the batches to the `log.bulk_insert_logs` task
+LOG_SINK = 'sync'
+LOG_SINK_BATCH_SIZE = 100
+# seconds between two flushes of the buffer
+LOG_SINK_FLUSH_INTERVAL = 1
+# rows kept in memory at most, rows above it are dropped (and counted
+# with the `log_sink_dropped` stat)
+LOG_SINK_MAX_QUEUE_SIZE = 10000
+# 'drop' new rows when the buffer is full or 'block' the request
+# for at most LOG_SINK_BLOCK_TIMEOUT seconds before dropping
+LOG_SINK_OVERFLOW = 'drop'
+LOG_SINK_BLOCK_TIMEOUT = 0.5
+
+# Skip ChangeLog noise: updates which don't change the value once
+# normalized (None -> '', 1 -> 1.0) and empty fields of added/deleted objects
+CHANGE_LOG_COMPRESS = False
 
 # An instantiated derivative of werkzeug.contrib.cache.BaseCache
 # if enabled, it can be used to store the results of long-running queries
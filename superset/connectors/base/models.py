@@ -12,9 +12,10 @@ from sqlalchemy import (
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import foreign, relationship
 from flask_babel import lazy_gettext as _
+from flask_babel import get_locale
 from flask_babel import gettext as __
 
-from superset import utils
+from superset import cache_util, utils
 from superset.models.core import Slice
 from superset.models.helpers import AuditMixinNullable, ImportMixin
 
@@ -167,8 +168,39 @@ class BaseDatasource(AuditMixinNullable, ImportMixin):
             'creator': str(self.created_by),
         }
 
+    # whether data() payloads are cached, requires the metadata version
+    # to be bumped on every column/metric change
+    cache_data = False
+    # name of the metadata version shared by column and metric groups
+    groups_metadata_version = 'datasource_groups'
+
+    @property
+    def metadata_versions(self):
+        """Metadata versions the data payload depends on,
+        bumped on column/metric changes (see ChangeLogMixin)"""
+        return [self.uid, self.groups_metadata_version]
+
     def data(self, session=None):
-        """Data representation of the datasource sent to the frontend"""
+        """Data representation of the datasource sent to the frontend
+
+        The payload is cached until the metadata version changes.
+        """
+        if not self.cache_data:
+            return self.build_data(session=session)
+        database = getattr(self, 'database', None)
+        key = 'datasource_data/{}/{}/{}/{}'.format(
+            self.uid,
+            self.changed_on.isoformat() if self.changed_on else '',
+            database.changed_on.isoformat()
+            if getattr(database, 'changed_on', None) else '',
+            get_locale(),
+        )
+        return cache_util.versioned_cache(
+            key, self.metadata_versions,
+            lambda: self.build_data(session=session))
+
+    def build_data(self, session=None):
+        """Builds the data representation of the datasource"""
         order_by_choices = []
         if session:
             metrics = self.get_metrics_filter(session=session)
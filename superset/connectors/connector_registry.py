@@ -60,8 +60,8 @@ class ConnectorRegistry(object):
         )
 
     @classmethod
-    def get_eager_datasource(cls, session, datasource_type, datasource_id):
-        """Returns datasource with columns and metrics."""
+    def eager_datasource_query(cls, session, datasource_type):
+        """Query of datasources with columns and metrics."""
         datasource_class = ConnectorRegistry.sources[datasource_type]
 
         # в модели SqlaTable атрибуты `columns` и `metrics` являются
@@ -75,13 +75,27 @@ class ConnectorRegistry(object):
                 subqueryload(datasource_class.metrics)
             )
 
+        return session.query(datasource_class).options(*options_args)
+
+    @classmethod
+    def get_eager_datasource(cls, session, datasource_type, datasource_id):
+        """Returns datasource with columns and metrics."""
         return (
-            session.query(datasource_class)
-            .options(*options_args)
+            cls.eager_datasource_query(session, datasource_type)
             .filter_by(id=datasource_id)
             .one()
         )
 
+    @classmethod
+    def get_eager_datasources(cls, session, datasource_type, datasource_ids):
+        """Returns datasources with columns and metrics in one query."""
+        datasource_class = ConnectorRegistry.sources[datasource_type]
+        return (
+            cls.eager_datasource_query(session, datasource_type)
+            .filter(datasource_class.id.in_(datasource_ids))
+            .all()
+        )
+
     @classmethod
     def query_datasources_by_name(
             cls, session, database, datasource_name, schema=None):
@@ -29,12 +29,15 @@ from sqlalchemy import (
     and_, asc, Boolean, Column, DateTime, desc, event, ForeignKey, func,
     Integer, or_, select, String, Text, Float
 )
-from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm import backref, relationship, Session
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import column, literal_column, table, text
 from sqlalchemy.sql.expression import TextAsFrom
 
-from superset import db, import_util, security_manager, utils, config, conf
+from superset import (
+    admission, cache_util, db, import_util, query_cancel, query_cost, security_manager, utils, config,
+    conf,
+)
 from superset.connectors.base.models import BaseColumn, BaseDatasource, BaseMetric
 from superset.db_engine_specs import ClickHouseEngineSpec
 from superset.exceptions import SupersetException
@@ -48,6 +51,10 @@ from superset.utils import DTTM_ALIAS, QueryStatus
 
 ReSearch = namedtuple('ReSearch', 'field_name regex')  # @regex is a string that will be format by searching value
 INIT_PROCESS = os.environ.get('INIT_PROCESS')
+# adhoc aggregations that can run on a sampled table, the first ones are
+# scaled back by the sampling ratio
+SCALED_AGGREGATIONS = ('SUM', 'COUNT')
+SAMPLED_AGGREGATIONS = SCALED_AGGREGATIONS + ('AVG', 'MIN', 'MAX')
 
 if TYPE_CHECKING:
     from sqlalchemy.engine import Connection
@@ -101,18 +108,81 @@ class ChangeLogMixin:
         """ Определение имени логгируемого объекта """
         return getattr(self, 'real_name', None) or str(self)
 
+    # ключ session.info, в котором копятся логи изменений до конца flush
+    change_logs_key = 'change_logs'
+
     @staticmethod
-    def save_change_log(change_log: Union[Sequence['ChangeLog'], 'ChangeLog']) -> None:
-        """ Сохраняет сформированные лог(и) изменений в БД """
+    def save_change_log(
+            change_log: Union[Sequence['ChangeLog'], 'ChangeLog'], session: Optional['Session'] = None,
+    ) -> None:
+        """
+        Сохраняет сформированные лог(и) изменений в БД.
+        Если передана сессия, логи копятся до конца её flush и пишутся
+        одной вставкой (см. write_change_logs)
+        """
         if not change_log:
             return
         elif not isinstance(change_log, Sequence):
             change_log = [change_log]
 
+        if session is not None:
+            session.info.setdefault(ChangeLogMixin.change_logs_key, []).extend(change_log)
+            return
+
         session = db.create_scoped_session()
         session.add_all(change_log)
         session.commit()
 
+    @staticmethod
+    def write_change_logs(session: 'Session', flush_context) -> None:
+        """ Пишет накопленные за flush логи изменений одной вставкой """
+        change_logs = session.info.pop(ChangeLogMixin.change_logs_key, None)
+        if not change_logs:
+            return
+
+        column_attrs = [
+            (prop.key, prop.columns[0].key)
+            for prop in sa.inspect(ChangeLog).column_attrs
+            if prop.key != 'id'
+        ]
+        rows = []
+        for change_log in change_logs:
+            row = {}
+            for attr_key, column_key in column_attrs:
+                value = getattr(change_log, attr_key)
+                if value is not None:
+                    row[column_key] = value
+            rows.append(row)
+        # все строки должны иметь одинаковый набор ключей для executemany
+        keys = set(_it.chain.from_iterable(rows))
+        rows = [{key: row.get(key) for key in keys} for row in rows]
+        session.connection().execute(ChangeLog.__table__.insert(), rows)
+
+    @staticmethod
+    def discard_change_logs(session: 'Session', previous_transaction) -> None:
+        """ Выбрасывает логи flush, который откатился: их изменения не сохранены """
+        session.info.pop(ChangeLogMixin.change_logs_key, None)
+
+    @staticmethod
+    def is_noise(old_value, new_value) -> bool:
+        """ Изменение без смысла: None -> '', 1 -> 1.0 и т.п. (CHANGE_LOG_COMPRESS) """
+        if not conf.get('CHANGE_LOG_COMPRESS'):
+            return False
+
+        def normalize(value):
+            if value in (None, ''):
+                return ''
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return str(float(value))
+            return str(value)
+        return normalize(old_value) == normalize(new_value)
+
+    @staticmethod
+    def dump_changes(changes: dict) -> str:
+        if conf.get('CHANGE_LOG_COMPRESS'):
+            changes = {key: value for key, value in changes.items() if value not in (None, '')}
+        return json.dumps(changes, sort_keys=True, default=str, ensure_ascii=False)
+
     @staticmethod
     def create_change_log(
             target: 'ChangeLogMixin', action: str, obj_field: str, old_value: Optional[str], new_value: Optional[str],
@@ -136,8 +206,17 @@ class ChangeLogMixin:
             )
         return change_log
 
+    @staticmethod
+    def bump_datasource_version(target: 'ChangeLogMixin') -> None:
+        """ Сбрасывает закешированные данные таблицы (SqlaTable.data) после коммита сессии """
+        table_id = getattr(target, 'table_id', None)
+        if table_id:
+            cache_util.bump_metadata_version_on_commit(
+                sa.orm.object_session(target), '{}__table'.format(table_id))
+
     @staticmethod
     def after_insert(mapper: 'Mapper', connection: 'Connection', target: 'ChangeLogMixin') -> None:
+        target.bump_datasource_version(target)
         state = db.inspect(target)
         if not state.modified:
             return
@@ -151,10 +230,10 @@ class ChangeLogMixin:
             target=target,
             obj_field='__all__',
             old_value=None,
-            new_value=json.dumps(changes, sort_keys=True, default=str, ensure_ascii=False),
+            new_value=target.dump_changes(changes),
         )
         if change_log:
-            target.save_change_log(change_log)
+            target.save_change_log(change_log, session=state.session)
 
     @staticmethod
     def get_update_changes(target: 'ChangeLogMixin', state: 'InstanceState') -> Tuple['AttributeState', 'History']:
@@ -169,12 +248,15 @@ class ChangeLogMixin:
 
     @staticmethod
     def after_update(mapper: 'Mapper', connection: 'Connection', target: 'ChangeLogMixin') -> None:
+        target.bump_datasource_version(target)
         state = db.inspect(target)
         if not state.modified:
             return
 
         change_logs = []
         for attr, hist in target.get_update_changes(target, state):
+            if target.is_noise(hist.deleted[0] if hist.deleted else None, hist.added[0] if hist.added else None):
+                continue
             change_log = target.create_change_log(
                 action=LogAction.UPD,
                 target=target,
@@ -185,10 +267,11 @@ class ChangeLogMixin:
             if change_log:
                 change_logs.append(change_log)
 
-        target.save_change_log(change_logs)
+        target.save_change_log(change_logs, session=state.session)
 
     @staticmethod
     def after_delete(mapper: 'Mapper', connection: 'Connection', target: 'ChangeLogMixin') -> None:
+        target.bump_datasource_version(target)
         state = db.inspect(target)
         target_relationship_keys = mapper.relationships.keys()
         changes = {
@@ -200,11 +283,11 @@ class ChangeLogMixin:
             action=LogAction.DEL,
             target=target,
             obj_field='__all__',
-            old_value=json.dumps(changes, sort_keys=True, default=str, ensure_ascii=False),
+            old_value=target.dump_changes(changes),
             new_value=None,
         )
         if change_log:
-            target.save_change_log(change_log)
+            target.save_change_log(change_log, session=state.session)
 
     @classmethod
     def __declare_last__(cls) -> None:
@@ -212,6 +295,10 @@ class ChangeLogMixin:
             event.listen(cls, 'after_insert', cls.after_insert)
             event.listen(cls, 'after_update', cls.after_update)
             event.listen(cls, 'after_delete', cls.after_delete)
+            if not event.contains(Session, 'after_flush', ChangeLogMixin.write_change_logs):
+                event.listen(Session, 'after_flush', ChangeLogMixin.write_change_logs)
+            if not event.contains(Session, 'after_soft_rollback', ChangeLogMixin.discard_change_logs):
+                event.listen(Session, 'after_soft_rollback', ChangeLogMixin.discard_change_logs)
 
 
 class TableColumn(ChangeLogMixin, SliceRelatedMixin, Model, BaseColumn):
@@ -291,13 +378,14 @@ class TableColumn(ChangeLogMixin, SliceRelatedMixin, Model, BaseColumn):
         # thus the final link to change the rendered field(@auto_upd_verbose_name) value will be generated
         return '' if self.is_calculated else self.auto_upd_verbose_name
 
-    def get_time_filter(self, start_dttm, end_dttm):
+    def get_time_filter(self, start_dttm, end_dttm, exclusive_end=False):
         col = self.sqla_col.label('__time')
         l = []  # noqa: E741
         if start_dttm:
             l.append(col >= text(self.dttm_sql_literal(start_dttm)))
         if end_dttm:
-            l.append(col <= text(self.dttm_sql_literal(end_dttm)))
+            end = text(self.dttm_sql_literal(end_dttm))
+            l.append(col < end if exclusive_end else col <= end)
         return and_(*l)
 
     def get_timestamp_expression(self, time_grain):
@@ -531,6 +619,7 @@ class SqlaTable(Model, BaseDatasource):
     from_sql_lab = Column(Boolean, default=False)
 
     baselink = 'tablemodelview'
+    cache_data = True
 
     export_fields = (
         'table_name', 'main_dttm_col', 'description', 'default_endpoint',
@@ -643,8 +732,16 @@ class SqlaTable(Model, BaseDatasource):
             if col_name == col.column_name:
                 return col
 
-    def data(self, session=None):
-        d = super(SqlaTable, self).data(session=session)
+    @property
+    def metadata_versions(self):
+        versions = super(SqlaTable, self).metadata_versions
+        if self.parent_id is not None:
+            # columns and metrics may come from the parent table
+            versions.append('{}__{}'.format(self.parent_id, self.type))
+        return versions
+
+    def build_data(self, session=None):
+        d = super(SqlaTable, self).build_data(session=session)
         if self.type == 'table':
             grains = self.database.grains() or []
             if grains:
@@ -803,7 +900,7 @@ class SqlaTable(Model, BaseDatasource):
             tbl.schema = self.schema
         return tbl
 
-    def get_from_clause(self, template_processor=None, db_engine_spec=None):
+    def get_from_clause(self, template_processor=None, db_engine_spec=None, sample_ratio=None):
         # Supporting arbitrary SQL statements in place of tables
         if self.sql:
             from_sql = self.sql
@@ -811,11 +908,40 @@ class SqlaTable(Model, BaseDatasource):
                 from_sql = template_processor.process_template(from_sql)
             from_sql = sqlparse.format(from_sql, strip_comments=True)
             return TextAsFrom(sa.text(from_sql), []).alias('expr_qry')
+        if sample_ratio:
+            quote = self.database.get_dialect().identifier_preparer.quote
+            from_sql = self.database.db_engine_spec.table_sample_sql.format(
+                table='{}{}'.format(
+                    quote(self.schema) + '.' if self.schema else '', quote(self.table_name)),
+                ratio=sample_ratio,
+                percent=sample_ratio * 100)
+            return TextAsFrom(sa.text(from_sql), []).alias('sample_qry')
         return self.get_sqla_table()
 
-    def adhoc_metric_to_sa(self, metric):
+    def get_sample_ratio(self, metrics):
+        """Sampling ratio of the approximate queries, None not to sample
+
+        Only tables with an `approximate_sample` ratio in their params are
+        sampled, when all the metrics are adhoc ones that can be scaled back
+        (sums and counts) or don't need to be.
+        """
+        ratio = self.params_dict.get('approximate_sample')
+        if not ratio or self.sql or not self.database.db_engine_spec.table_sample_sql:
+            return None
+        if not metrics or not all(
+                utils.is_adhoc_metric(m) and
+                m.get('aggregate') in SAMPLED_AGGREGATIONS and
+                not m.get('cumulativeTotal')
+                for m in metrics):
+            return None
+        return float(ratio)
+
+    def adhoc_metric_to_sa(self, metric, approximate=False, sample_ratio=None):
         column_name = metric.get('column').get('column_name')
-        sa_metric = self.database.db_engine_spec.sqla_aggregations[metric.get('aggregate')](column(column_name))
+        aggregations = self.database.db_engine_spec.get_sqla_aggregations(approximate)
+        sa_metric = aggregations[metric.get('aggregate')](column(column_name))
+        if sample_ratio and metric.get('aggregate') in SCALED_AGGREGATIONS:
+            sa_metric = sa_metric / sample_ratio
         sa_metric = sa_metric.label(metric.get('label'))
         return sa_metric
 
@@ -935,11 +1061,15 @@ class SqlaTable(Model, BaseDatasource):
                 'and is required by this type of chart'))
         if not groupby and not metrics and not columns:
             raise Exception(_('Empty query?'))
+        # approximate mode: cheaper aggregations, sampled tables
+        approximate = bool((extras or {}).get('approximate'))
+        sample_ratio = self.get_sample_ratio(metrics) if approximate else None
         metrics_exprs = []
         metrics_exprs_to_metrics = dict()
         for m in metrics[:]:
             if utils.is_adhoc_metric(m):
-                metric_expr = self.adhoc_metric_to_sa(m)
+                metric_expr = self.adhoc_metric_to_sa(
+                    m, approximate=approximate, sample_ratio=sample_ratio)
                 metric_expr.key = metric_expr.key.replace('%%', ' / 100').replace('%', ' / 100')
             elif m in metrics_dict:
                 metric_expr = literal_column(
@@ -1041,12 +1171,15 @@ class SqlaTable(Model, BaseDatasource):
             #         self.main_dttm_col != dttm_col.column_name:
             #     time_filters.append(cols[self.main_dttm_col].
             #                         get_time_filter(from_dttm, to_dttm))
-            time_filters.append(dttm_col.get_time_filter(from_dttm, to_dttm))
+            time_filters.append(dttm_col.get_time_filter(
+                from_dttm, to_dttm,
+                exclusive_end=extras.get('exclusive_to_dttm', False)))
 
         select_exprs += metrics_exprs
         qry = sa.select(select_exprs)
 
-        tbl = self.get_from_clause(template_processor, db_engine_spec)
+        tbl = self.get_from_clause(
+            template_processor, db_engine_spec, sample_ratio=sample_ratio)
 
         # (columns and groupby) clause the bubble map case
         if not columns or (columns and groupby):
@@ -1511,12 +1644,21 @@ class SqlaTable(Model, BaseDatasource):
 
         return joined_table
 
-    def get_total_found(self, query_obj, session=None):
+    def get_total_found(self, query_obj, session=None, df=None):
+        # approximate queries don't count the rows when the page isn't full
+        limits = [l for l in (query_obj.get('page_length'), query_obj.get('row_limit')) if l]  # noqa: E741
+        if (
+                (query_obj.get('extras') or {}).get('approximate') and
+                df is not None and limits and len(df.index) < min(limits)):
+            return (query_obj.get('page_offset') or 0) + len(df.index)
         query_obj['is_total'] = True
         total_sql = self.get_query_str(query_obj, session=session)
         eng = self.database.get_sqla_engine()
+        tag = query_cancel.get_tag()
         try:
-            total_df = pd.read_sql_query(total_sql, eng)
+            with query_cancel.cancel_on_timeout(self.database, tag):
+                total_df = pd.read_sql_query(
+                    query_cancel.tag_sql(self.database, total_sql, tag), eng)
             records = total_df.to_dict(orient="records")
             total_found = records[0].get('total_found', 0)
         except:
@@ -1535,19 +1677,34 @@ class SqlaTable(Model, BaseDatasource):
 
         return or_(*groups)
 
-    def query(self, query_obj, session=None):
-        qry_start_dttm = datetime.now()
-        sql = self.get_query_str(query_obj, session=session)
-        status = QueryStatus.SUCCESS
-        error_message = None
-        df = None
+    def run_chart_sql(self, sql):
+        """Runs the SQL of a chart, returns (df, error_message)
+
+        The query goes through the cost check, waits for a slot of the
+        database and is tagged to be cancelled.
+        """
+        # charts can't be sent to the workers, `async` only warns here
+        cost = query_cost.check_cost(self.database, sql, self.schema, source='chart')
+        if cost and cost.action == query_cost.CostAction.REJECT:
+            return None, cost.message
+        if cost and cost.message:
+            logging.warning(cost.message)
+        # tagged to be cancelled, see superset/query_cancel.py
+        tag = query_cancel.get_tag()
         try:
-            df = self.database.get_df(sql, self.schema)
+            with admission.admitted(self.database), \
+                    query_cancel.cancel_on_timeout(self.database, tag):
+                return self.database.get_df(
+                    query_cancel.tag_sql(self.database, sql, tag), self.schema), None
         except Exception as e:
-            status = QueryStatus.FAILED
             logging.exception(e)
-            error_message = (
-                self.database.db_engine_spec.extract_error_message(e))
+            return None, self.database.db_engine_spec.extract_error_message(e)
+
+    def query(self, query_obj, session=None):
+        qry_start_dttm = datetime.now()
+        sql = self.get_query_str(query_obj, session=session)
+        df, error_message = self.run_chart_sql(sql)
+        status = QueryStatus.FAILED if error_message else QueryStatus.SUCCESS
 
         # if this is a main query with prequeries, combine them together
         if not query_obj['is_prequery']:
@@ -1558,7 +1715,7 @@ class SqlaTable(Model, BaseDatasource):
         return QueryResult(
             status=status,
             df=df,
-            total_found=self.get_total_found(query_obj, session=session),
+            total_found=self.get_total_found(query_obj, session=session, df=df),
             duration=datetime.now() - qry_start_dttm,
             query=sql,
             error_message=error_message)
@@ -1814,3 +1971,13 @@ class TableColumnGroup(Model):
 
     def get_metrics(self):
         return db.session.query(SqlMetric).filter(SqlMetric.group_id == self.id).distinct().all()
+
+
+def bump_groups_version(mapper, connection, target):
+    """Group titles are part of every SqlaTable.data payload"""
+    cache_util.bump_metadata_version_on_commit(
+        sa.orm.object_session(target), BaseDatasource.groups_metadata_version)
+
+
+event.listen(TableColumnGroup, 'after_update', bump_groups_version)
+event.listen(TableColumnGroup, 'after_delete', bump_groups_version)
@@ -11,6 +11,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import base64
 from datetime import date, datetime
 
 import numpy as np
@@ -43,26 +44,149 @@ class SupersetDataFrame(object):
     }
 
     def __init__(self, df):
-        self.__df = df.where((pd.notnull(df)), None)
+        self.__df = df
+        self._data = None
+        self._columns = None
 
     @property
     def size(self):
         return len(self.__df.index)
 
+    @staticmethod
+    def column_values(series):
+        """Python values of a column, nulls as None
+
+        Datetimes are boxed as Timestamps (see
+        https://github.com/pandas-dev/pandas/issues/18372) and ints too big
+        for JavaScript are sent as strings.
+        """
+        kind = series.dtype.kind
+        if kind in 'iu':
+            values = series.tolist()
+            if len(series) and (series.abs() > JS_MAX_INTEGER).any():
+                values = [
+                    str(v) if abs(v) > JS_MAX_INTEGER else v for v in values]
+            return values
+        if kind == 'b':
+            return series.tolist()
+        values = series.astype(object).where(series.notnull(), None).tolist()
+        if kind == 'O':
+            values = [
+                str(v) if isinstance(v, int) and abs(v) > JS_MAX_INTEGER
+                else _maybe_box_datetimelike(v)
+                for v in values
+            ]
+        return values
+
     @property
     def data(self):
-        # work around for https://github.com/pandas-dev/pandas/issues/18372
-        data = [dict((k, _maybe_box_datetimelike(v))
-                for k, v in zip(self.__df.columns, np.atleast_1d(row)))
-                for row in self.__df.values]
-        for d in data:
-            for k, v in list(d.items()):
-                # if an int is too big for Java Script to handle
-                # convert it to a string
-                if isinstance(v, int):
-                    if abs(v) > JS_MAX_INTEGER:
-                        d[k] = str(v)
-        return data
+        """Rows as dicts, computed once column by column"""
+        if self._data is None:
+            df = self.__df
+            names = list(df.columns)
+            values = [
+                self.column_values(df.iloc[:, i]) for i in range(len(names))]
+            self._data = [dict(zip(names, row)) for row in zip(*values)]
+        return self._data
+
+    @staticmethod
+    def encode_column(series, binary=False):
+        """Encodes a column for the columnar format
+
+        Numeric, boolean and datetime (as epoch ms) columns are typed, in
+        binary mode their values are a base64 little endian buffer with a
+        base64 bitmap of the nulls (numpy.packbits order). Object columns of
+        numbers are typed as well, other columns are plain lists.
+        """
+        if series.dtype == object:
+            inferred = series.infer_objects()
+            if inferred.dtype.kind in 'biufM':
+                series = inferred
+        kind = series.dtype.kind
+        column = {}
+        if kind == 'M':
+            nulls = series.isnull().values
+            series = pd.Series(
+                series.values.astype('datetime64[ms]').astype(np.int64))
+            series[nulls] = 0
+            column['type'] = 'datetime'
+        elif kind in 'biuf':
+            nulls = series.isnull().values
+            column['type'] = series.dtype.name
+        else:
+            column['type'] = 'object'
+            column['values'] = SupersetDataFrame.column_values(series)
+            return column
+
+        values = series.values
+        if kind in 'iu' and len(values) and np.abs(values).max() > JS_MAX_INTEGER:
+            column.update(
+                type='object', values=SupersetDataFrame.column_values(series))
+            return column
+        if not binary:
+            column['values'] = (
+                pd.Series(values).astype(object).where(~nulls, None).tolist())
+            return column
+        dtype = 'uint8' if kind == 'b' else 'float64'
+        if kind in 'iu' and (not len(values) or np.abs(values).max() < 2 ** 31):
+            dtype = 'int32'
+        column.update({
+            'dtype': dtype,
+            'values': base64.b64encode(
+                values.astype('<' + np.dtype(dtype).str[1:]).tobytes()
+            ).decode('ascii'),
+        })
+        if nulls.any():
+            column['nulls'] = base64.b64encode(
+                np.packbits(nulls).tobytes()).decode('ascii')
+        return column
+
+    def columnar(self, binary=False):
+        """Results as {"names": [...], "columns": [...], "size": n}"""
+        df = self.__df
+        return {
+            'names': list(df.columns),
+            'size': self.size,
+            'columns': [
+                self.encode_column(df.iloc[:, i], binary=binary)
+                for i in range(len(df.columns))
+            ],
+        }
+
+    @staticmethod
+    def decode_column(column, size):
+        if 'dtype' not in column:
+            values = pd.Series(column['values'], dtype=object)
+            if column['type'] == 'datetime':
+                values = pd.to_datetime(values, unit='ms')
+            return values
+        values = pd.Series(np.frombuffer(
+            base64.b64decode(column['values']),
+            dtype='<' + np.dtype(column['dtype']).str[1:]))
+        if column['type'] == 'datetime':
+            values = pd.to_datetime(values, unit='ms')
+        elif column['type'] == 'bool':
+            values = values.astype(bool)
+        if 'nulls' in column:
+            nulls = np.unpackbits(np.frombuffer(
+                base64.b64decode(column['nulls']), dtype=np.uint8))[:size]
+            values = pd.Series([
+                None if null else v for v, null in zip(values.tolist(), nulls)
+            ], dtype=object)
+        return values
+
+    @classmethod
+    def from_columnar(cls, columnar, limit=None):
+        """Rebuilds a SupersetDataFrame from the output of `columnar`"""
+        if not columnar['columns']:
+            return cls(pd.DataFrame(index=range(columnar['size'])))
+        df = pd.concat(
+            [cls.decode_column(c, columnar['size']) for c in columnar['columns']],
+            axis=1)
+        df.columns = columnar['names']
+        if limit:
+            df = df.head(limit)
+        return cls(df)
 
     @classmethod
     def db_type(cls, dtype):
@@ -120,6 +244,8 @@ class SupersetDataFrame(object):
         """
         if self.__df.empty:
             return None
+        if self._columns is not None:
+            return self._columns
 
         columns = []
         sample_size = min(INFER_COL_TYPES_SAMPLE_SIZE, len(self.__df.index))
@@ -138,6 +264,8 @@ class SupersetDataFrame(object):
 
             if column['type'] in ('OBJECT', None):
                 v = sample[col].iloc[0] if not sample[col].empty else None
+                if v is pd.NaT or (isinstance(v, float) and np.isnan(v)):
+                    v = None
                 if isinstance(v, basestring):
                     column['type'] = 'STRING'
                 elif isinstance(v, int):
@@ -162,4 +290,5 @@ class SupersetDataFrame(object):
             if not column['agg']:
                 column.pop('agg', None)
             columns.append(column)
+        self._columns = columns
         return columns
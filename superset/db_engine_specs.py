@@ -18,8 +18,12 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import inspect
+import io
+import json
 import logging
+import math
 import os
 import re
 import textwrap
@@ -41,6 +45,7 @@ from werkzeug.utils import secure_filename
 
 from superset import app, cache_util, conf, db, utils
 from superset.exceptions import SupersetTemplateException
+from superset.sql_parse import SupersetQuery
 from superset.utils import QueryStatus
 
 config = app.config
@@ -50,6 +55,9 @@ hive_poll_interval = conf.get('HIVE_POLL_INTERVAL')
 
 Grain = namedtuple('Grain', 'name label function duration')
 
+# prefix of the comment tagging the statements, see superset/query_cancel.py
+QUERY_TAG_PREFIX = 'superset_query_tag:'
+
 
 class LimitMethod(object):
     """Enum the ways that limits can be applied"""
@@ -69,6 +77,23 @@ class BaseEngineSpec(object):
     time_secondary_columns = False
     inner_joins = True
     row_number_column = None # Используется в MssqlEngineSpec
+    # SQL expressions of the grid cell of a point (see superset.spatial),
+    # formatted with {lon}, {lat}, {west}, {south}, {width} and {height}
+    spatial_grid_exprs = (
+        'floor(({lon} - {west}) / {width})',
+        'floor(({lat} - {south}) / {height})',
+    )
+    # SQL expression of the geohash of a point, formatted with {lon}, {lat}
+    # and {precision}, None when the engine has no geohash function
+    spatial_geohash_expr = None
+    # Catalog query listing the (schema, name, is_view) of every table and
+    # view of the database, None to reflect them schema by schema
+    catalog_relations_sql = None
+    # False for engines without primary/foreign keys nor indexes
+    catalog_reflect_keys = True
+    # True when the P1W grain truncates to Mondays, weekly queries are only
+    # split in time buckets (see superset/time_buckets.py) for those engines
+    week_starts_monday = False
 
     sqla_aggregations = {
         'COUNT_DISTINCT': lambda column_name: sqla.func.COUNT(sqla.distinct(column_name)),
@@ -86,6 +111,22 @@ class BaseEngineSpec(object):
         'MAX': lambda column_name: sqla.func.MAX(sqla.func.MAX(column_name)),
     }
 
+    # aggregations replacing `sqla_aggregations` in approximate mode
+    sqla_approx_aggregations = {}
+    # whether the statements are tagged, to be found and cancelled from any
+    # process, see `cancel_query`
+    cancel_by_tag = False
+    # query sampling the {table} of approximate queries, formatted with a
+    # {ratio} between 0 and 1 or the same {percent}, None when the engine
+    # can't sample tables
+    table_sample_sql = None
+
+    @classmethod
+    def get_sqla_aggregations(cls, approximate=False):
+        if not approximate:
+            return cls.sqla_aggregations
+        return dict(cls.sqla_aggregations, **cls.sqla_approx_aggregations)
+
     @classmethod
     def fetch_data(cls, cursor, limit):
         if cls.limit_method == LimitMethod.FETCH_MANY:
@@ -133,27 +174,160 @@ class BaseEngineSpec(object):
             )
 
     @classmethod
-    def csv_to_df(cls, **kwargs):
-        kwargs['filepath_or_buffer'] = \
-            app.config['UPLOAD_FOLDER'] + kwargs['filepath_or_buffer']
-        kwargs['encoding'] = kwargs.get('encoding') or 'utf-8'
-        kwargs['iterator'] = True
-        chunks = pandas.read_csv(**kwargs)
-        df = pandas.concat(chunk for chunk in chunks)
-        cls.validate_column_names(df)
-        return df
+    def read_csv_sample(cls, **kwargs):
+        """Reads the header and the first rows of the upload
+
+        Column names are validated on the header, before anything is
+        loaded. Column types are inferred from the sample, columns without
+        any value in the sample are read as text.
+        """
+        kwargs = dict(kwargs)
+        kwargs.pop('chunksize', None)
+        sample_rows = config.get('CSV_UPLOAD_SAMPLE_ROWS', 1000)
+        kwargs['nrows'] = min(kwargs.get('nrows') or sample_rows, sample_rows)
+        sample = pandas.read_csv(**kwargs)
+        cls.validate_column_names(sample)
+        for col in sample.columns:
+            if sample[col].isnull().all():
+                sample[col] = sample[col].astype(object)
+        return sample
+
+    @classmethod
+    def widen_csv_sample(cls, sample, **kwargs):
+        """Widens the types of the sample to hold every value of the upload
+
+        The rest of the file is scanned before the table is created: integer
+        columns with decimals further down become floats, and numeric
+        columns with text become text, rather than losing values while
+        they're loaded.
+        """
+        sample_rows = config.get('CSV_UPLOAD_SAMPLE_ROWS', 1000)
+        nrows = kwargs.get('nrows')
+        numeric = [col for col, dtype in sample.dtypes.items() if dtype.kind in 'iuf']
+        if not numeric or len(sample) < sample_rows or (nrows and nrows <= sample_rows):
+            # the sample already holds the whole upload
+            return sample
+        kwargs = dict(kwargs)
+        kwargs['chunksize'] = config.get('CSV_UPLOAD_CHUNK_SIZE', 10000)
+        kwargs['dtype'] = {col: str for col in numeric}
+        kinds = {col: sample.dtypes[col].kind for col in numeric}
+        for chunk in pandas.read_csv(**kwargs):
+            for col in numeric:
+                if kinds[col] == 'O' or col not in chunk:
+                    continue
+                raw = chunk[col]
+                values = pandas.to_numeric(raw, errors='coerce')
+                if values.isnull().sum() > raw.isnull().sum():
+                    kinds[col] = 'O'
+                elif kinds[col] in 'iu' and (values.dropna() % 1 != 0).any():
+                    kinds[col] = 'f'
+        sample = sample.copy()
+        for col, kind in kinds.items():
+            if kind == sample.dtypes[col].kind:
+                continue
+            if kind == 'f':
+                sample[col] = sample[col].astype('float64')
+            else:
+                values = sample[col].astype(object)
+                notnull = values.notnull()
+                values[notnull] = values[notnull].astype(str)
+                sample[col] = values
+            logging.info('Column {} of the upload is widened to {}'.format(
+                col, sample[col].dtype))
+        return sample
+
+    @classmethod
+    def iter_csv_chunks(cls, sample, **kwargs):
+        """Reads the upload chunk by chunk with the types of the sample"""
+        kwargs = dict(kwargs)
+        kwargs['chunksize'] = config.get('CSV_UPLOAD_CHUNK_SIZE', 10000)
+        kwargs['dtype'] = {
+            col: str for col, dtype in sample.dtypes.items()
+            if dtype == object and col not in (kwargs.get('parse_dates') or [])
+        }
+        for chunk in pandas.read_csv(**kwargs):
+            yield cls.coerce_csv_chunk(chunk, sample.dtypes)
 
     @staticmethod
-    def df_to_db(df, table, **kwargs):
-        df.to_sql(**kwargs)
-        table.user_id = g.user.id
-        table.schema = kwargs['schema']
-        table.fetch_metadata()
-        db.session.add(table)
-        db.session.commit()
+    def coerce_csv_chunk(chunk, dtypes):
+        """Casts the columns of a chunk to the types inferred from the sample
+
+        Integer columns with missing values are parsed as floats by pandas,
+        they are sent as python ints (and nulls) instead. Values the type
+        can't hold are an error, see `widen_csv_sample`.
+        """
+        for col, dtype in dtypes.items():
+            values = chunk.get(col)
+            if values is None or values.dtype == dtype or dtype.kind not in 'iuf':
+                continue
+            if values.dtype == object:
+                try:
+                    values = pandas.to_numeric(values)
+                except ValueError:
+                    raise ValueError(
+                        'Column {} holds values that are not numbers'.format(col))
+            if dtype.kind in 'iu' and values.dtype.kind == 'f':
+                notnull = values.notnull()
+                if (values[notnull] % 1 != 0).any():
+                    raise ValueError(
+                        'Column {} holds values that are not integers'.format(col))
+                ints = values[notnull].astype('int64').tolist()
+                values = values.astype(object)
+                values[notnull] = ints
+            chunk[col] = values
+        return chunk
 
     @staticmethod
-    def create_table_from_csv(form, table, encoding=None):
+    def reset_csv_index(df, index, index_label):
+        """Moves the index to a regular column when it should be loaded"""
+        if not index:
+            return df
+        df = df.reset_index()
+        if index_label:
+            df = df.rename(columns={df.columns[0]: index_label})
+        return df
+
+    @classmethod
+    def create_csv_table(cls, engine, sample, name, schema, if_exists):
+        """Creates the table of an upload from its sample"""
+        sample.head(0).to_sql(
+            name, engine, schema=schema, if_exists=if_exists, index=False)
+
+    @classmethod
+    def load_csv_chunk(cls, connection, chunk, name, schema):
+        """Appends a chunk to the table, engines override it with bulk loads"""
+        chunk.to_sql(
+            name, connection, schema=schema, if_exists='append', index=False,
+            chunksize=len(chunk))
+
+    @classmethod
+    def csv_to_db(cls, engine, name, schema=None, if_exists='fail',
+                  index=False, index_label=None, **kwargs):
+        """Streams a csv file to a table and returns the number of rows
+
+        Only one chunk is held in memory while the previous one is loaded,
+        and all the chunks are loaded in a single transaction.
+        """
+        sample = cls.widen_csv_sample(cls.read_csv_sample(**kwargs), **kwargs)
+        cls.create_csv_table(
+            engine, cls.reset_csv_index(sample, index, index_label), name,
+            schema, if_exists)
+        rows = 0
+        with engine.begin() as connection, ThreadPoolExecutor(1) as executor:
+            loading = None
+            for chunk in cls.iter_csv_chunks(sample, **kwargs):
+                chunk = cls.reset_csv_index(chunk, index, index_label)
+                if loading:
+                    loading.result()
+                loading = executor.submit(
+                    cls.load_csv_chunk, connection, chunk, name, schema)
+                rows += len(chunk)
+            if loading:
+                loading.result()
+        return rows
+
+    @classmethod
+    def create_table_from_csv(cls, form, table, encoding=None):
         def _allowed_file(filename):
             # Only allow specific file extensions as specified in the config
             extension = os.path.splitext(filename)[1]
@@ -163,7 +337,7 @@ class BaseEngineSpec(object):
         if not _allowed_file(filename):
             raise Exception('Invalid file type selected')
         kwargs = {
-            'filepath_or_buffer': filename,
+            'filepath_or_buffer': app.config['UPLOAD_FOLDER'] + filename,
             'sep': form.sep.data,
             'header': form.header.data if form.header.data else 0,
             'index_col': form.index_col.data,
@@ -174,24 +348,23 @@ class BaseEngineSpec(object):
             'skip_blank_lines': form.skip_blank_lines.data,
             'parse_dates': form.parse_dates.data,
             'infer_datetime_format': form.infer_datetime_format.data,
-            'chunksize': 10000,
-            'encoding': encoding
-        }
-        df = BaseEngineSpec.csv_to_df(**kwargs)
-
-        df_to_db_kwargs = {
-            'table': table,
-            'df': df,
-            'name': form.name.data,
-            'con': create_engine(form.con.data.sqlalchemy_uri_decrypted, echo=False),
-            'schema': form.schema.data,
-            'if_exists': form.if_exists.data,
-            'index': form.index.data,
-            'index_label': form.index_label.data,
-            'chunksize': 10000,
+            'encoding': encoding or 'utf-8',
         }
+        rows = cls.csv_to_db(
+            create_engine(form.con.data.sqlalchemy_uri_decrypted, echo=False),
+            form.name.data,
+            schema=form.schema.data,
+            if_exists=form.if_exists.data,
+            index=form.index.data,
+            index_label=form.index_label.data,
+            **kwargs)
+        logging.info('Uploaded {} rows to {}'.format(rows, form.name.data))
 
-        BaseEngineSpec.df_to_db(**df_to_db_kwargs)
+        table.user_id = g.user.id
+        table.schema = form.schema.data
+        table.fetch_metadata()
+        db.session.add(table)
+        db.session.commit()
 
     @classmethod
     def convert_dttm(cls, target_type, dttm):
@@ -224,6 +397,21 @@ class BaseEngineSpec(object):
             result_sets[''] = all_result_sets
         return result_sets
 
+    @classmethod
+    def fetch_catalog_relations(cls, database):
+        """Returns {schema: {'tables': [...], 'views': [...]}} read with one
+        catalog query, None when the engine has no such query"""
+        if not cls.catalog_relations_sql:
+            return None
+        relations = defaultdict(lambda: {'tables': [], 'views': []})
+        engine = database.get_sqla_engine()
+        for schema, name, is_view in engine.execute(text(cls.catalog_relations_sql)):
+            relations[schema]['views' if is_view else 'tables'].append(name)
+        for names in relations.values():
+            names['tables'].sort()
+            names['views'].sort()
+        return dict(relations)
+
     @classmethod
     def handle_cursor(cls, cursor, query, session):
         """Handle a live cursor between the execute and fetchall calls
@@ -233,6 +421,36 @@ class BaseEngineSpec(object):
         query object"""
         pass
 
+    @classmethod
+    def tag_sql(cls, sql, tag):
+        """Prefixes the statement with a comment holding its tag"""
+        if not cls.cancel_by_tag:
+            return sql
+        return '/* {}{} */ {}'.format(QUERY_TAG_PREFIX, tag, sql)
+
+    @classmethod
+    def cancel_query(cls, engine, tag, cursor=None):
+        """Cancels the running statements tagged with `tag`
+
+        `cursor` is the cursor running them when they run in this process,
+        engines without `cancel_by_tag` can only cancel through it. Returns
+        whether the cancellation was sent.
+        """
+        if cursor is None or not hasattr(cursor, 'cancel'):
+            return False
+        cursor.cancel()
+        return True
+
+    @classmethod
+    def estimate_query_cost(cls, database, sql, schema=None):
+        """Estimates what the query reads before running it
+
+        Returns a dict with the estimated `rows` and `bytes` (None when
+        unknown), or None when the engine can't tell, see
+        superset/query_cost.py.
+        """
+        return None
+
     @classmethod
     def extract_error_message(cls, e):
         """Extract error message for queries"""
@@ -346,6 +564,8 @@ class PostgresBaseEngineSpec(BaseEngineSpec):
     """ Abstract class for Postgres 'like' databases """
 
     engine = ''
+    # DATE_TRUNC('week') truncates to ISO weeks
+    week_starts_monday = True
 
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
@@ -386,6 +606,63 @@ class PostgresBaseEngineSpec(BaseEngineSpec):
 
 class PostgresEngineSpec(PostgresBaseEngineSpec):
     engine = 'postgresql'
+    table_sample_sql = 'SELECT * FROM {table} TABLESAMPLE SYSTEM ({percent})'
+    # requires PostGIS
+    spatial_geohash_expr = (
+        'ST_GeoHash(ST_SetSRID(ST_MakePoint({lon}, {lat}), 4326), {precision})')
+    catalog_relations_sql = textwrap.dedent("""\
+        SELECT table_schema, table_name, table_type = 'VIEW'
+        FROM information_schema.tables
+        WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+        UNION ALL
+        SELECT schemaname, matviewname, TRUE
+        FROM pg_matviews""")
+    cancel_by_tag = True
+
+    @classmethod
+    def cancel_query(cls, engine, tag, cursor=None):
+        """pg_cancel_backend on the backends running the tagged statements"""
+        cancelled = engine.execute(text(
+            'SELECT pg_cancel_backend(pid) FROM pg_stat_activity '
+            'WHERE pid <> pg_backend_pid() AND position(:marker in query) > 0'),
+            marker=QUERY_TAG_PREFIX + tag).fetchall()
+        return any(row[0] for row in cancelled)
+
+    @classmethod
+    def load_csv_chunk(cls, connection, chunk, name, schema):
+        """Appends a chunk with COPY FROM STDIN"""
+        quote = connection.dialect.identifier_preparer.quote
+        buf = io.StringIO()
+        chunk.to_csv(buf, index=False, header=False)
+        buf.seek(0)
+        sql = 'COPY {}{} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            quote(schema) + '.' if schema else '',
+            quote(name),
+            ', '.join(quote(col) for col in chunk.columns))
+        connection.connection.cursor().copy_expert(sql, buf)
+
+    @classmethod
+    def estimate_query_cost(cls, database, sql, schema=None):
+        """Rows and bytes of the scans of the EXPLAIN plan
+
+        Scans are the leaves of the plan, their rows are the planner
+        estimates once their filters are applied.
+        """
+        engine = database.get_sqla_engine(schema=schema)
+        plan = engine.execute(
+            'EXPLAIN (FORMAT JSON) {}'.format(sql.strip().rstrip(';'))).scalar()
+        if not isinstance(plan, list):
+            plan = json.loads(plan)
+        estimate = {'rows': 0, 'bytes': 0, 'cost': plan[0]['Plan']['Total Cost']}
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Plans'):
+                nodes.extend(node['Plans'])
+                continue
+            estimate['rows'] += node['Plan Rows']
+            estimate['bytes'] += node['Plan Rows'] * node['Plan Width']
+        return estimate
 
     @classmethod
     def get_table_names(cls, schema, inspector):
@@ -405,6 +682,7 @@ class RedshiftEngineSpec(PostgresBaseEngineSpec):
 
 class OracleEngineSpec(PostgresBaseEngineSpec):
     engine = 'oracle'
+    week_starts_monday = False
 
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
@@ -531,6 +809,8 @@ class SqliteEngineSpec(BaseEngineSpec):
 class MySQLEngineSpec(BaseEngineSpec):
     engine = 'mysql'
     cursor_execute_kwargs = {'args': {}}
+    # P1W is the last week grain, week_start_monday
+    week_starts_monday = True
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
         Grain('second', _('second'), 'DATE_ADD(DATE({col}), '
@@ -594,6 +874,10 @@ class MySQLEngineSpec(BaseEngineSpec):
 class PrestoEngineSpec(BaseEngineSpec):
     engine = 'presto'
     cursor_execute_kwargs = {'parameters': None}
+    sqla_approx_aggregations = {
+        'COUNT_DISTINCT': sqla.func.approx_distinct,
+    }
+    table_sample_sql = 'SELECT * FROM {table} TABLESAMPLE BERNOULLI ({percent})'
 
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
@@ -732,6 +1016,32 @@ class PrestoEngineSpec(BaseEngineSpec):
             logging.info('Polling the cursor for progress')
             polled = cursor.poll()
 
+    @classmethod
+    def estimate_query_cost(cls, database, sql, schema=None):
+        """Sums the estimates of the input tables of EXPLAIN (TYPE IO)
+
+        Presto reports NaN for the tables without statistics, the measure
+        is then unknown.
+        """
+        engine = database.get_sqla_engine(schema=schema)
+        io_plan = json.loads(engine.execute(
+            'EXPLAIN (TYPE IO, FORMAT JSON) {}'.format(
+                sql.strip().rstrip(';'))).scalar())
+        estimate = {'rows': 0, 'bytes': 0}
+        for table in io_plan.get('inputTableColumnInfos', []):
+            table_estimate = table.get('estimate') or {}
+            for measure, key in (('rows', 'outputRowCount'), ('bytes', 'outputSizeInBytes')):
+                value = table_estimate.get(key)
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    value = float('nan')
+                if estimate[measure] is None or math.isnan(value):
+                    estimate[measure] = None
+                else:
+                    estimate[measure] += value
+        return estimate
+
     @classmethod
     def extract_error_message(cls, e):
         if (
@@ -887,6 +1197,8 @@ class HiveEngineSpec(PrestoEngineSpec):
 
     engine = 'hive'
     cursor_execute_kwargs = {'async': True}
+    sqla_approx_aggregations = {}
+    table_sample_sql = 'SELECT * FROM {table} TABLESAMPLE ({percent} PERCENT)'
 
     # Scoping regex at class level to avoid recompiling
     # 17/02/07 19:36:38 INFO ql.Driver: Total jobs = 5
@@ -926,7 +1238,7 @@ class HiveEngineSpec(PrestoEngineSpec):
             db, datasource_type, force=force)
 
     @staticmethod
-    def create_table_from_csv(form, table):
+    def create_table_from_csv(form, table, encoding=None):
         """Uploads a csv file and creates a superset datasource in Hive."""
         def get_column_names(filepath):
             with open(filepath, 'rb') as f:
@@ -980,6 +1292,11 @@ class HiveEngineSpec(PrestoEngineSpec):
             uri.database = selected_schema
         return uri
 
+    @classmethod
+    def estimate_query_cost(cls, database, sql, schema=None):
+        """Hive plans have no usable estimates"""
+        return None
+
     @classmethod
     def extract_error_message(cls, e):
         try:
@@ -1224,6 +1541,10 @@ class MssqlEngineSpec(BaseEngineSpec):
 
 class AthenaEngineSpec(BaseEngineSpec):
     engine = 'awsathena'
+    sqla_approx_aggregations = {
+        'COUNT_DISTINCT': sqla.func.approx_distinct,
+    }
+    table_sample_sql = 'SELECT * FROM {table} TABLESAMPLE BERNOULLI ({percent})'
 
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
@@ -1280,6 +1601,12 @@ class ClickHouseEngineSpec(BaseEngineSpec):
 
     time_secondary_columns = True
     time_groupby_inline = True
+    spatial_geohash_expr = 'geohashEncode({lon}, {lat}, {precision})'
+    catalog_relations_sql = textwrap.dedent("""\
+        SELECT database, name, engine IN ('View', 'MaterializedView')
+        FROM system.tables
+        WHERE database != 'system' AND NOT startsWith(name, '.inner.')""")
+    catalog_reflect_keys = False
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
         Grain('minute', _('minute'),
@@ -1329,6 +1656,118 @@ class ClickHouseEngineSpec(BaseEngineSpec):
         'MAX': lambda column_name: sqla.func.MAX(sqla.func.MAX(column_name)),
     }
 
+    sqla_approx_aggregations = {
+        'COUNT_DISTINCT': lambda column_name: literal_column('uniqCombined({})'.format(column_name)).label(
+            'count_distinct({})'.format(column_name)),
+    }
+    # only tables with a SAMPLE BY key can be sampled
+    table_sample_sql = 'SELECT * FROM {table} SAMPLE {ratio}'
+    cancel_by_tag = True
+
+    @classmethod
+    def cancel_query(cls, engine, tag, cursor=None):
+        """KILL QUERY the queries of system.processes tagged with `tag`
+
+        The tag is searched in two parts, so that the KILL statement doesn't
+        match itself.
+        """
+        killed = engine.execute(text(
+            'KILL QUERY WHERE position(query, concat(:prefix, :tag)) > 0 ASYNC'),
+            prefix=QUERY_TAG_PREFIX, tag=tag).fetchall()
+        return bool(killed)
+
+    @staticmethod
+    def get_csv_column_type(dtype):
+        if dtype.kind == 'b':
+            return 'UInt8'
+        if dtype.kind in 'iu':
+            return 'Int64'
+        if dtype.kind == 'f':
+            return 'Float64'
+        if dtype.kind == 'M':
+            return 'DateTime'
+        return 'String'
+
+    @classmethod
+    def create_csv_table(cls, engine, sample, name, schema, if_exists):
+        """Creates a MergeTree table, every column is nullable"""
+        quote = engine.dialect.identifier_preparer.quote
+        full_name = '{}{}'.format(quote(schema) + '.' if schema else '', quote(name))
+        if if_exists == 'replace':
+            engine.execute('DROP TABLE IF EXISTS {}'.format(full_name))
+        engine.execute(
+            'CREATE TABLE {}{} ({}) ENGINE = MergeTree ORDER BY tuple()'.format(
+                'IF NOT EXISTS ' if if_exists == 'append' else '',
+                full_name,
+                ', '.join(
+                    '{} Nullable({})'.format(
+                        quote(col), cls.get_csv_column_type(dtype))
+                    for col, dtype in sample.dtypes.items())))
+
+    @classmethod
+    def load_csv_chunk(cls, connection, chunk, name, schema):
+        """Appends a chunk with one INSERT ... FORMAT CSV statement"""
+        quote = connection.dialect.identifier_preparer.quote
+        for col, dtype in chunk.dtypes.items():
+            if dtype.kind == 'b':
+                chunk[col] = chunk[col].astype('uint8')
+        sql = 'INSERT INTO {}{} ({}) FORMAT CSV\n{}'.format(
+            quote(schema) + '.' if schema else '',
+            quote(name),
+            ', '.join(quote(col) for col in chunk.columns),
+            chunk.to_csv(
+                index=False, header=False, na_rep='\\N',
+                date_format='%Y-%m-%d %H:%M:%S'))
+        connection.connection.cursor().execute(sql)
+
+    @classmethod
+    def estimate_query_cost(cls, database, sql, schema=None):
+        """Rows read according to EXPLAIN ESTIMATE
+
+        Bytes are prorated from the size of the active parts of the tables.
+        Servers without EXPLAIN ESTIMATE (before 21.9) get the whole size of
+        the tables the query refers to.
+        """
+        engine = database.get_sqla_engine(schema=schema)
+        sql = sql.strip().rstrip(';')
+        try:
+            estimated = {
+                (row[0], row[1]): int(row[3])
+                for row in engine.execute('EXPLAIN ESTIMATE {}'.format(sql))}
+        except Exception as e:
+            logging.info('EXPLAIN ESTIMATE failed: {}'.format(e))
+            estimated = None
+        if estimated is None:
+            tables = set()
+            for name in SupersetQuery(sql).tables:
+                table_schema, sep, table_name = name.rpartition('.')
+                tables.add((table_schema or schema or 'default', table_name))
+        else:
+            tables = set(estimated)
+        if not tables:
+            return {'rows': 0, 'bytes': 0}
+
+        params = {}
+        conditions = []
+        for i, (table_schema, table_name) in enumerate(sorted(tables)):
+            conditions.append('(database = :schema{0} AND table = :table{0})'.format(i))
+            params['schema{}'.format(i)] = table_schema
+            params['table{}'.format(i)] = table_name
+        stats = engine.execute(text(
+            'SELECT database, table, sum(rows), sum(bytes_on_disk) '
+            'FROM system.parts WHERE active AND ({}) '
+            'GROUP BY database, table'.format(' OR '.join(conditions))), **params)
+        estimate = {'rows': 0, 'bytes': 0}
+        for table_schema, table_name, rows, size in stats:
+            rows, size = int(rows), int(size)
+            read = rows if estimated is None else estimated.get((table_schema, table_name), 0)
+            estimate['bytes'] += size * read // rows if rows else 0
+            if estimated is None:
+                estimate['rows'] += rows
+        if estimated is not None:
+            estimate['rows'] = sum(estimated.values())
+        return estimate
+
     @classmethod
     def convert_dttm(cls, target_type, dttm):
         tt = target_type.upper()
@@ -1345,6 +1784,10 @@ class BQEngineSpec(BaseEngineSpec):
 
     As contributed by @mxmzdlv on issue #945"""
     engine = 'bigquery'
+    sqla_approx_aggregations = {
+        'COUNT_DISTINCT': sqla.func.APPROX_COUNT_DISTINCT,
+    }
+    table_sample_sql = 'SELECT * FROM {table} TABLESAMPLE SYSTEM ({percent} PERCENT)'
 
     time_grains = (
         Grain('Time Column', _('Time Column'), '{col}', None),
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Sinks writing the rows produced by Log.log_this
+
+With LOG_SINK = 'sync' every request commits its own Log row. The buffered
+sinks put rows in a bounded in-process queue which is flushed in batches
+with one bulk insert, either by a background thread ('thread') or by the
+`log.bulk_insert_logs` celery task ('celery'), so the request doesn't wait
+for the metadata database.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import atexit
+from datetime import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+from superset import app, db
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class LogSinkMode(object):
+    SYNC = 'sync'
+    THREAD = 'thread'
+    CELERY = 'celery'
+
+
+class LogSinkOverflow(object):
+    DROP = 'drop'
+    BLOCK = 'block'
+
+
+def bulk_insert(model, entries):
+    """Writes the entries with a single executemany insert"""
+    if not entries:
+        return
+    with db.engine.begin() as connection:
+        connection.execute(model.__table__.insert(), entries)
+
+
+class BufferedLogSink(object):
+    """Bounded queue of log entries flushed in batches by a daemon thread
+
+    When the queue is full new entries are dropped (LOG_SINK_OVERFLOW =
+    'drop') or the request waits at most LOG_SINK_BLOCK_TIMEOUT seconds
+    for room ('block') before dropping. Dropped entries are counted with
+    the `log_sink_dropped` stat, so the loss is bounded and visible.
+    """
+
+    def __init__(self, model, mode, batch_size=100, flush_interval=1,
+                 max_size=10000, overflow=LogSinkOverflow.DROP,
+                 block_timeout=0.5):
+        self.model = model
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_size)
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self.run, name='log-sink', daemon=True)
+        self.thread.start()
+
+    def put(self, entry):
+        try:
+            if self.overflow == LogSinkOverflow.BLOCK:
+                self.queue.put(entry, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(entry)
+        except queue.Full:
+            stats_logger.incr('log_sink_dropped')
+
+    def drain(self):
+        entries = []
+        while len(entries) < self.batch_size:
+            try:
+                entries.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return entries
+
+    def write(self, entries):
+        if self.mode == LogSinkMode.CELERY:
+            from superset.tasks.log import bulk_insert_logs
+            # celery payloads are json, dttm travels as utc timestamp
+            bulk_insert_logs.delay([
+                dict(entry, dttm=(entry['dttm'] - EPOCH).total_seconds())
+                for entry in entries
+            ])
+        else:
+            bulk_insert(self.model, entries)
+
+    def flush(self):
+        """Writes everything queued so far, returns the number of entries"""
+        written = 0
+        with self.lock:
+            entries = self.drain()
+            while entries:
+                try:
+                    self.write(entries)
+                    written += len(entries)
+                except Exception as e:
+                    logging.exception(e)
+                    stats_logger.incr('log_sink_dropped', len(entries))
+                entries = self.drain()
+        if written:
+            stats_logger.incr('log_sink_flushed')
+        return written
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(e)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink(model):
+    """Returns the buffered sink of the current process, None for 'sync'
+
+    The sink is created lazily and recreated after a fork, as threads
+    don't survive it (gunicorn/celery prefork workers).
+    """
+    global _sink
+    mode = config.get('LOG_SINK', LogSinkMode.SYNC)
+    if mode == LogSinkMode.SYNC:
+        return None
+    if _sink is None or _sink.pid != os.getpid():
+        with _sink_lock:
+            if _sink is None or _sink.pid != os.getpid():
+                _sink = BufferedLogSink(
+                    model,
+                    mode,
+                    batch_size=config.get('LOG_SINK_BATCH_SIZE', 100),
+                    flush_interval=config.get('LOG_SINK_FLUSH_INTERVAL', 1),
+                    max_size=config.get('LOG_SINK_MAX_QUEUE_SIZE', 10000),
+                    overflow=config.get(
+                        'LOG_SINK_OVERFLOW', LogSinkOverflow.DROP),
+                    block_timeout=config.get('LOG_SINK_BLOCK_TIMEOUT', 0.5),
+                )
+                atexit.register(_sink.flush)
+    return _sink
+
+
+def emit(model, entry, session=None):
+    """Writes a log entry (dict of model columns) with the configured sink"""
+    sink = get_sink(model)
+    if sink is None:
+        session = session or db.session()
+        session.add(model(**entry))
+        session.commit()
+        return
+    entry.setdefault('dttm', datetime.utcnow())
+    sink.put(entry)
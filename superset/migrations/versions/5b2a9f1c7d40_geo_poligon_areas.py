@@ -0,0 +1,94 @@
+"""geo_poligon_areas
+
+Precomputed PostGIS polygons of geo_poligons.content, kept in sync by a
+trigger, so area joins don't rebuild the geometries on every query.
+
+The geometries, their index and the trigger are only created on PostgreSQL
+databases having the postgis extension, the others just get the table and
+the area joins keep expanding geo_poligons.content.
+
+Revision ID: 5b2a9f1c7d40
+Revises: 8efc2c50933d
+Create Date: 2026-10-19 10:12:31.418205
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b2a9f1c7d40'
+down_revision = '8efc2c50933d'
+
+from alembic import op
+import sqlalchemy as sa
+
+FILL_AREAS_SQL = """
+INSERT INTO geo_poligon_areas (polygon_id, area_index, center_x, center_y, geom)
+SELECT
+    p.id,
+    a.n - 1,
+    (a.area -> 'center' ->> 0)::float,
+    (a.area -> 'center' ->> 1)::float,
+    ST_MakePolygon(ST_MakeLine(ARRAY(
+        SELECT ST_MakePoint((c.point ->> 0)::float, (c.point ->> 1)::float)
+        FROM json_array_elements(a.area -> 'polygon')
+            WITH ORDINALITY AS c(point, n)
+        ORDER BY c.n
+    )))
+FROM geo_poligons p,
+    json_array_elements(p.content) WITH ORDINALITY AS a(area, n)
+"""
+
+
+def has_postgis(bind):
+    if bind.dialect.name != 'postgresql':
+        return False
+    return bool(bind.execute(
+        "SELECT 1 FROM pg_extension WHERE extname = 'postgis'").scalar())
+
+
+def upgrade():
+    op.create_table(
+        'geo_poligon_areas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('polygon_id', sa.Integer(), nullable=False),
+        sa.Column('area_index', sa.Integer(), nullable=False),
+        sa.Column('center_x', sa.Float(), nullable=True),
+        sa.Column('center_y', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_geo_poligon_areas_polygon_id', 'geo_poligon_areas', ['polygon_id'])
+    if not has_postgis(op.get_bind()):
+        return
+
+    op.execute('ALTER TABLE geo_poligon_areas ADD COLUMN geom geometry(Polygon)')
+    op.execute(
+        'CREATE INDEX ix_geo_poligon_areas_geom '
+        'ON geo_poligon_areas USING GIST (geom)')
+
+    op.execute("""
+CREATE OR REPLACE FUNCTION refresh_geo_poligon_areas() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM geo_poligon_areas WHERE polygon_id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        {fill} WHERE p.id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""".format(fill=FILL_AREAS_SQL.strip()))
+    op.execute(
+        'CREATE TRIGGER geo_poligons_refresh_areas '
+        'AFTER INSERT OR UPDATE OR DELETE ON geo_poligons '
+        'FOR EACH ROW EXECUTE PROCEDURE refresh_geo_poligon_areas()')
+    op.execute(FILL_AREAS_SQL)
+
+
+def downgrade():
+    if has_postgis(op.get_bind()):
+        op.execute('DROP TRIGGER IF EXISTS geo_poligons_refresh_areas ON geo_poligons')
+        op.execute('DROP FUNCTION IF EXISTS refresh_geo_poligon_areas()')
+        op.execute('DROP INDEX IF EXISTS ix_geo_poligon_areas_geom')
+    op.drop_index('ix_geo_poligon_areas_polygon_id', 'geo_poligon_areas')
+    op.drop_table('geo_poligon_areas')
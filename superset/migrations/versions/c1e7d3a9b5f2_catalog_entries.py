@@ -0,0 +1,34 @@
+"""catalog_entries
+
+Revision ID: c1e7d3a9b5f2
+Revises: 5b2a9f1c7d40
+Create Date: 2026-10-19 11:02:47.510392
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c1e7d3a9b5f2'
+down_revision = '5b2a9f1c7d40'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'catalog_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('database_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('schema', sa.String(length=255), nullable=False),
+        sa.Column('table_name', sa.String(length=255), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('changed_on', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['database_id'], ['dbs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('database_id', 'kind', 'schema', 'table_name'),
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_entries')
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""query cost estimates
+
+Revision ID: d4b8e2f6a1c3
+Revises: c1e7d3a9b5f2
+Create Date: 2026-10-19 15:24:08.193402
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e2f6a1c3'
+down_revision = 'c1e7d3a9b5f2'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('query', sa.Column('estimated_rows', sa.BigInteger(), nullable=True))
+    op.add_column('query', sa.Column('estimated_bytes', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('query', 'estimated_bytes')
+    op.drop_column('query', 'estimated_rows')
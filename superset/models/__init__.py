@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 from . import core  # noqa
 from . import sql_lab  # noqa
+from . import catalog  # noqa
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Persistent catalog of the metadata reflected from the databases"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from flask_appbuilder import Model
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint,
+)
+
+
+class CatalogEntryKind(object):
+    SCHEMAS = 'schemas'
+    TABLES = 'tables'
+    VIEWS = 'views'
+    TABLE = 'table'
+    # state of the last crawl of the database (see catalog.crawl)
+    CRAWL = 'crawl'
+
+
+class CatalogEntry(Model):
+
+    """Reflected metadata of a database, a schema or a table
+
+    `payload` holds the json of the schema names ('schemas'), the table or
+    view names of a schema ('tables', 'views') or the columns and keys of
+    a table ('table'). Unused levels of the key are stored as ''.
+    """
+
+    __tablename__ = 'catalog_entries'
+    __table_args__ = (
+        UniqueConstraint('database_id', 'kind', 'schema', 'table_name'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    database_id = Column(Integer, ForeignKey('dbs.id'), nullable=False)
+    kind = Column(String(16), nullable=False)
+    schema = Column(String(255), nullable=False, default='')
+    table_name = Column(String(255), nullable=False, default='')
+    payload = Column(Text)
+    changed_on = Column(DateTime, default=datetime.utcnow)
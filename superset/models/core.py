@@ -27,19 +27,22 @@ from flask_babel import lazy_gettext as _
 from future.standard_library import install_aliases
 from sqlalchemy import (
     Boolean, Column, create_engine, DateTime, ForeignKey, func, Integer,
-    MetaData, String, Table, Text, JSON
+    Float, MetaData, String, Table, Text, JSON
 )
 from sqlalchemy.engine import url
 from sqlalchemy.engine.url import make_url
-from sqlalchemy.orm import relationship, subqueryload
+from sqlalchemy.orm import joinedload, relationship, subqueryload
 from sqlalchemy.orm.session import make_transient
 from sqlalchemy.pool import NullPool
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy_mptt import BaseNestedSets
 from sqlalchemy_utils import EncryptedType
 
-from superset import app, db, db_engine_specs, security_manager, utils
+from superset import (
+    app, catalog, db, db_engine_specs, log_sink, security_manager, utils,
+)
 from superset.connectors.connector_registry import ConnectorRegistry
+from superset.models.catalog import CatalogEntryKind
 from superset.models.helpers import AuditMixinNullable, ImportMixin, set_perm
 from superset.viz import viz_types
 
@@ -157,8 +160,45 @@ class Slice(Model, AuditMixinNullable, ImportMixin):
 
     @property
     def datasource(self):
+        # datasource can be preloaded in bulk, see preload_datasources
+        preloaded = getattr(self, '_preloaded_datasource', None)
+        if preloaded is not None:
+            return preloaded
         return self.get_datasource
 
+    @staticmethod
+    def preload_datasources(session, slices, eager=False):
+        """Loads the datasources of the slices with one query per datasource type
+
+        Loaded datasources are attached to the slices, so `slc.datasource`
+        doesn't hit the database for every slice. `eager` also loads their
+        columns and metrics. Returns the datasources keyed by (type, id).
+        """
+        ids_by_type = {}
+        for slc in slices:
+            if slc.datasource_type in ConnectorRegistry.sources:
+                ids_by_type.setdefault(slc.datasource_type, set()).add(
+                    slc.datasource_id)
+
+        datasources = {}
+        for datasource_type, ids in ids_by_type.items():
+            cls = ConnectorRegistry.sources[datasource_type]
+            if eager:
+                qry = ConnectorRegistry.eager_datasource_query(
+                    session, datasource_type)
+            else:
+                qry = session.query(cls)
+            if 'database' in sqla.inspect(cls).relationships:
+                qry = qry.options(joinedload(cls.database))
+            for datasource in qry.filter(cls.id.in_(ids)).all():
+                datasources[(datasource_type, datasource.id)] = datasource
+
+        for slc in slices:
+            datasource = datasources.get((slc.datasource_type, slc.datasource_id))
+            if datasource is not None:
+                slc._preloaded_datasource = datasource
+        return datasources
+
     def clone(self):
         return Slice(
             slice_name=self.slice_name,
@@ -577,67 +617,87 @@ class Dashboard(Model, AuditMixinNullable, ImportMixin):
             session.flush()
             return copied_dash.id
 
-    @classmethod
-    def _get_slices_url_drilldowns_data(cls, slices):
-        slices_data = set()
-        dashboards_data = set()
-        for s in slices:
-            for drilldown in s.params_dict.get('url_drilldowns', []):
-                if drilldown['type'] == 'dashboards':
-                    dashboards_data.add(
-                        db.session.query(Dashboard)
-                            .filter_by(id=drilldown['url']).first()
-                    )
-                elif drilldown['type'] == 'slices':
-                    slice = db.session.query(Slice).filter_by(id=drilldown['url']).first()
-
-                    if not slice:
-                        continue
-
-                    slice.alter_params(
-                        remote_id=slice.id,
-                        datasource_name=slice.datasource.name,
-                        schema=slice.datasource.name,
-                        database_name=slice.datasource.database.name,
-                    )
-                    slices_data.add(slice)
-                else:
+    @staticmethod
+    def _get_drilldown_ids(slices, drilldown_type):
+        ids = set()
+        for slc in slices:
+            for drilldown in slc.params_dict.get('url_drilldowns', []):
+                if drilldown.get('type') != drilldown_type:
+                    continue
+                try:
+                    ids.add(int(drilldown['url']))
+                except (KeyError, TypeError, ValueError):
                     continue
-        return slices_data, dashboards_data
+        return ids
 
     @classmethod
     def get_slices_url_drilldowns_data(cls, dashboards_slices, depth):
-        slices = set(dashboards_slices)
-        dashboards = set()
+        """Walks the url drilldowns of the slices breadth first
+
+        Every level looks up the new slices and dashboards with one IN query
+        each, already visited ids are never queried again. Returns the
+        slices (other than `dashboards_slices`) and the dashboards reachable
+        in at most `depth` levels.
+        """
+        session = db.session
+        visited_slices = {slc.id for slc in dashboards_slices}
+        visited_dashboards = set()
+        slices, dashboards = set(), set()
+        level = list(dashboards_slices)
         for i in range(depth):
-            slices_data, dashboards_data = cls._get_slices_url_drilldowns_data(slices)
-            slices = slices_data | slices
-            dashboards = dashboards | dashboards_data
-        slices = slices - set(dashboards_slices)
+            dashboard_ids = (
+                cls._get_drilldown_ids(level, 'dashboards') - visited_dashboards)
+            slice_ids = cls._get_drilldown_ids(level, 'slices') - visited_slices
+            visited_dashboards |= dashboard_ids
+            visited_slices |= slice_ids
+            if dashboard_ids:
+                dashboards.update(
+                    session.query(Dashboard)
+                    .filter(Dashboard.id.in_(dashboard_ids)).all())
+            if not slice_ids:
+                break
+            level = session.query(Slice).filter(Slice.id.in_(slice_ids)).all()
+            Slice.preload_datasources(session, level)
+            for slc in level:
+                slc.alter_params(
+                    remote_id=slc.id,
+                    datasource_name=slc.datasource.name,
+                    schema=slc.datasource.name,
+                    database_name=slc.datasource.database.name,
+                )
+            slices.update(level)
         return slices, dashboards
 
     @classmethod
     def export_dashboards(cls, dashboard_ids):
-        all_dashboards_slices = set()
+        return ''.join(cls.iter_export_dashboards(dashboard_ids))
 
-        def prepare_dashboards(dashboard_ids, consider_dd=False):
-            all_dd_dashboards = set()
-            all_dd_slices = set()
+    @classmethod
+    def iter_export_dashboards(cls, dashboard_ids):
+        """Exports the dashboards, their datasources and the slices and
+        dashboards reachable by url drilldowns, yielding the JSON in chunks
+        """
+        def prepare_dashboards(dashboard_ids):
+            dashboard_ids = [int(dashboard_id) for dashboard_id in dashboard_ids]
+            dashboards = {
+                dash.id: dash for dash in
+                db.session.query(Dashboard)
+                .options(subqueryload(Dashboard.slices))
+                .filter(Dashboard.id.in_(dashboard_ids)).all()
+            }
+            slices = [
+                slc for dashboard_id in dashboard_ids if dashboard_id in dashboards
+                for slc in dashboards[dashboard_id].slices
+            ]
+            datasources = Slice.preload_datasources(db.session, slices, eager=True)
 
             copied_dashboards = []
-            datasource_ids = set()
-
             for dashboard_id in dashboard_ids:
-                # make sure that dashboard_id is an integer
-                dashboard_id = int(dashboard_id)
-                copied_dashboard = (
-                    db.session.query(Dashboard)
-                        .options(subqueryload(Dashboard.slices))
-                        .filter_by(id=dashboard_id).first()
-                )
+                copied_dashboard = dashboards.get(dashboard_id)
+                if copied_dashboard is None:
+                    continue
                 make_transient(copied_dashboard)
                 for slc in copied_dashboard.slices:
-                    datasource_ids.add((slc.datasource_id, slc.datasource_type))
                     # add extra params for the import
                     slc.alter_params(
                         remote_id=slc.id,
@@ -645,47 +705,39 @@ class Dashboard(Model, AuditMixinNullable, ImportMixin):
                         schema=slc.datasource.name,
                         database_name=slc.datasource.database.name,
                     )
-                    all_dashboards_slices.add(slc)
-
                 copied_dashboard.alter_params(remote_id=dashboard_id)
                 copied_dashboards.append(copied_dashboard)
 
-                if consider_dd:
-                    dd_slices, dd_dashboards = cls.get_slices_url_drilldowns_data(copied_dashboard.slices, 3)
-                    all_dd_dashboards = all_dd_dashboards | dd_dashboards
-                    all_dd_slices = all_dd_slices | dd_slices
-
-            eager_datasources = []
-            for dashboard_id, dashboard_type in datasource_ids:
-                eager_datasource = ConnectorRegistry.get_eager_datasource(
-                    db.session, dashboard_type, dashboard_id)
+            for eager_datasource in datasources.values():
                 eager_datasource.alter_params(
                     remote_id=eager_datasource.id,
                     database_name=eager_datasource.database.name,
                 )
                 make_transient(eager_datasource)
-                eager_datasources.append(eager_datasource)
-
-            return eager_datasources, copied_dashboards, all_dd_dashboards, all_dd_slices
-
-        eager_datasources, copied_dashboards, \
-        all_dd_dashboards, all_dd_slices = prepare_dashboards(dashboard_ids, consider_dd=True)
-
-        all_dd_slices.difference(all_dashboards_slices)
-        all_dd_dashboards.difference(set(copied_dashboards))
-
-        if all_dd_dashboards:
-            dd_eager_datasources, dd_copied_dashboards, *_ = prepare_dashboards([dash.id for dash in all_dd_dashboards])
-        else:
-            dd_eager_datasources = []
-            dd_copied_dashboards = []
-
-        return json.dumps({
+            return datasources, copied_dashboards, slices
+
+        datasources, copied_dashboards, dashboards_slices = (
+            prepare_dashboards(dashboard_ids))
+        dd_slices, dd_dashboards = cls.get_slices_url_drilldowns_data(
+            dashboards_slices, 3)
+
+        exported_ids = {dash.id for dash in copied_dashboards}
+        dd_dashboard_ids = [
+            dash.id for dash in dd_dashboards if dash.id not in exported_ids]
+        dd_copied_dashboards = []
+        if dd_dashboard_ids:
+            dd_datasources, dd_copied_dashboards, _ = prepare_dashboards(
+                dd_dashboard_ids)
+            for key, datasource in dd_datasources.items():
+                datasources.setdefault(key, datasource)
+
+        payload = {
             'dashboards': copied_dashboards,
-            'datasources': list(set(eager_datasources) | set(dd_eager_datasources)),
-            'dd_slices': list(all_dd_slices),
+            'datasources': list(datasources.values()),
+            'dd_slices': list(dd_slices),
             'dd_dashboards': dd_copied_dashboards,
-        }, cls=utils.DashboardEncoder, indent=4)
+        }
+        return utils.DashboardEncoder().iterencode(payload)
 
     def get_perm(self):
         return ('[dashboard].(id:{obj.id})').format(obj=self)
@@ -882,28 +934,20 @@ class Database(Model, AuditMixinNullable, ImportMixin):
         if not schema:
             if not self.allow_multi_schema_metadata_fetch:
                 return []
-            tables_dict = self.db_engine_spec.fetch_result_sets(
-                self, 'table', force=force)
-            return tables_dict.get('', [])
-        return sorted(
-            self.db_engine_spec.get_table_names(schema, self.inspector))
+            return catalog.get_all_names(
+                self, CatalogEntryKind.TABLES, force=force)
+        return catalog.get_table_names(self, schema, force=force)
 
     def all_view_names(self, schema=None, force=False):
         if not schema:
             if not self.allow_multi_schema_metadata_fetch:
                 return []
-            views_dict = self.db_engine_spec.fetch_result_sets(
-                self, 'view', force=force)
-            return views_dict.get('', [])
-        views = []
-        try:
-            views = self.inspector.get_view_names(schema)
-        except Exception:
-            pass
-        return views
+            return catalog.get_all_names(
+                self, CatalogEntryKind.VIEWS, force=force)
+        return catalog.get_view_names(self, schema, force=force)
 
-    def all_schema_names(self):
-        return sorted(self.db_engine_spec.get_schema_names(self.inspector))
+    def all_schema_names(self, force=False):
+        return catalog.get_schema_names(self, force=force)
 
     @property
     def db_engine_spec(self):
@@ -1081,8 +1125,7 @@ class Log(Model):
             stats_logger.incr(f.__name__)
             value = f(*args, **kwargs)
             if log_event:
-                sesh = db.session()
-                log = cls(
+                log_sink.emit(cls, dict(
                     action=action_name,
                     json=params,
                     dashboard_id=d.get('dashboard_id'),
@@ -1090,9 +1133,7 @@ class Log(Model):
                     duration_ms=(
                                         datetime.now() - start_dttm).total_seconds() * 1000,
                     referrer=request.referrer[:1000] if request.referrer else None,
-                    user_id=user_id)
-                sesh.add(log)
-                sesh.commit()
+                    user_id=user_id))
             return value
 
         return wrapper
@@ -1292,3 +1333,35 @@ class GeoPoligons(Model):
 
     def __repr__(self):
         return self.name
+
+
+class Geometry(sqla.types.UserDefinedType):
+    """PostGIS geometry column"""
+
+    def get_col_spec(self, **kw):
+        return 'geometry'
+
+
+class GeoPoligonArea(Model):
+    """Area of GeoPoligons.content stored as a PostGIS polygon
+
+    Rows are (re)built by the `geo_poligons_refresh_areas` trigger whenever
+    a GeoPoligons row changes and `geom` has a GiST index, so the area joins
+    only test points against precomputed geometries. The migration only
+    creates them when the metadata database has PostGIS.
+    """
+    __tablename__ = 'geo_poligon_areas'
+
+    id = Column(Integer, primary_key=True)
+    polygon_id = Column(Integer, nullable=False, index=True)
+    area_index = Column(Integer, nullable=False)
+    center_x = Column(Float)
+    center_y = Column(Float)
+    geom = Column(Geometry)
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def has_geometries(cls):
+        """Whether the migration created the `geom` column"""
+        columns = sqla.inspect(db.engine).get_columns(cls.__tablename__)
+        return any(c['name'] == 'geom' for c in columns)
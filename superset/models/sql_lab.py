@@ -13,7 +13,8 @@ from flask_appbuilder import Model
 from future.standard_library import install_aliases
 import sqlalchemy as sqla
 from sqlalchemy import (
-    Boolean, Column, DateTime, ForeignKey, Integer, Numeric, String, Text,
+    BigInteger, Boolean, Column, DateTime, ForeignKey, Integer, Numeric, String,
+    Text,
 )
 from sqlalchemy.orm import backref, relationship
 from wtforms import BooleanField
@@ -66,6 +67,9 @@ class Query(Model):
     end_time = Column(Numeric(precision=20, scale=6))
     end_result_backend_time = Column(Numeric(precision=20, scale=6))
     tracking_url = Column(Text)
+    # pre-flight estimates of the engine, see superset/query_cost.py
+    estimated_rows = Column(BigInteger)
+    estimated_bytes = Column(BigInteger)
 
     changed_on = Column(
         DateTime,
@@ -114,6 +118,8 @@ class Query(Model):
             'limit_reached': self.limit_reached,
             'resultsKey': self.results_key,
             'trackingUrl': self.tracking_url,
+            'estimatedRows': self.estimated_rows,
+            'estimatedBytes': self.estimated_bytes,
         }
 
     @property
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Cancellation of the queries running on the databases
+
+The statements of a SQL Lab query or of a chart request share a tag. On
+engines with `cancel_by_tag` the tag is a comment leading the statements,
+which lets any process find and cancel them on the database (KILL QUERY,
+pg_cancel_backend). Other engines can only cancel through the cursor running
+the statement, the cursors of this process are kept by tag while they run.
+
+Queries are cancelled when SQL Lab stops them, when a Celery task reaches its
+soft time limit, and when the browser gives up on a chart request.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from contextlib import contextmanager
+import logging
+import re
+import threading
+
+from celery.exceptions import SoftTimeLimitExceeded
+from flask import g, has_app_context
+
+from superset import app, utils
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+
+# tags end up in SQL comments, only plain identifiers are accepted
+TAG_RE = re.compile(r'^[\w-]{1,64}$')
+
+_cursors = {}
+_cursors_lock = threading.Lock()
+
+
+def is_valid_tag(tag):
+    return bool(tag and TAG_RE.match(tag))
+
+
+def sql_lab_tag(query):
+    return 'sqllab-{}'.format(query.client_id)
+
+
+def set_tag(tag):
+    """Tags the chart queries of the current request or task"""
+    g.query_tag = tag if is_valid_tag(tag) else None
+
+
+def get_tag():
+    if not has_app_context():
+        return None
+    return getattr(g, 'query_tag', None)
+
+
+def tag_sql(database, sql, tag):
+    if not tag:
+        return sql
+    return database.db_engine_spec.tag_sql(sql, tag)
+
+
+@contextmanager
+def running(tag, cursor):
+    """Keeps the cursor running the tagged statements, to cancel them"""
+    with _cursors_lock:
+        _cursors[tag] = cursor
+    try:
+        yield
+    finally:
+        with _cursors_lock:
+            _cursors.pop(tag, None)
+
+
+def cancel(database, tag):
+    """Cancels the statements tagged with `tag` on the database
+
+    Returns whether a cancellation was sent, failures are only logged.
+    """
+    if database is None or not is_valid_tag(tag):
+        return False
+    with _cursors_lock:
+        cursor = _cursors.get(tag)
+    try:
+        cancelled = database.db_engine_spec.cancel_query(
+            database.get_sqla_engine(), tag, cursor=cursor)
+    except Exception as e:
+        logging.warning('Could not cancel the query {}: {}'.format(
+            tag, utils.error_msg_from_exception(e)))
+        cancelled = False
+    stats_logger.incr('query_cancelled' if cancelled else 'query_cancel_failed')
+    return cancelled
+
+
+@contextmanager
+def cancel_on_timeout(database, tag):
+    """Cancels the tagged statements when the soft time limit of the task is
+    reached while they run, the database would go on running them"""
+    try:
+        yield
+    except SoftTimeLimitExceeded:
+        cancel(database, tag)
+        raise
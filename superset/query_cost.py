@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Pre-flight cost checks of the queries sent to the databases
+
+Engine specs estimate the rows and bytes a query reads before it runs (see
+`BaseEngineSpec.estimate_query_cost`). The estimates are compared with the
+thresholds set in the extra of the database:
+
+    "cost_thresholds": {
+        "warn": {"rows": 100000000},
+        "async": {"bytes": 10000000000},
+        "reject": {"rows": 10000000000, "bytes": 1000000000000}
+    }
+
+Databases without thresholds are not checked at all. Estimates are cached
+by the hash of the normalized SQL, so a query run again is not explained
+again, and every check is written to the logs.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import namedtuple
+import hashlib
+import json
+import logging
+
+from flask import g, has_request_context
+import sqlparse
+
+from superset import app, cache, log_sink, utils
+
+config = app.config
+stats_logger = config.get('STATS_LOGGER')
+
+QueryCost = namedtuple('QueryCost', ['estimate', 'action', 'message'])
+
+
+class CostAction(object):
+    """What to do with a query, by increasing severity"""
+    ALLOW = 'allow'
+    WARN = 'warn'
+    ASYNC = 'async'
+    REJECT = 'reject'
+    ALL = (ALLOW, WARN, ASYNC, REJECT)
+
+
+def normalize_sql(sql):
+    """SQL without comments, keyword case and whitespace differences"""
+    sql = sqlparse.format(sql, strip_comments=True, keyword_case='upper')
+    return ' '.join(sql.split()).rstrip(';').strip()
+
+
+def get_cache_key(database, sql, schema=None):
+    sql_hash = hashlib.md5(normalize_sql(sql).encode('utf-8')).hexdigest()
+    return 'query_cost:{}:{}:{}'.format(database.id, schema or '', sql_hash)
+
+
+def get_thresholds(database):
+    return (
+        database.get_extra().get('cost_thresholds') or
+        config.get('DEFAULT_QUERY_COST_THRESHOLDS') or {})
+
+
+def estimate_cost(database, sql, schema=None):
+    """{'rows': ..., 'bytes': ...} the query should read, None if unknown"""
+    cache_key = get_cache_key(database, sql, schema)
+    if cache:
+        estimate = cache.get(cache_key)
+        if estimate is not None:
+            stats_logger.incr('query_cost_from_cache')
+            return estimate or None
+    try:
+        estimate = database.db_engine_spec.estimate_query_cost(
+            database, sql, schema=schema)
+        stats_logger.incr('query_cost_estimated')
+    except Exception as e:
+        logging.warning('Could not estimate the cost of the query: {}'.format(
+            utils.error_msg_from_exception(e)))
+        estimate = None
+    if cache:
+        # failures are cached too, not to explain the query every time
+        cache.set(
+            cache_key, estimate or {},
+            timeout=config.get('QUERY_COST_CACHE_TIMEOUT'))
+    return estimate
+
+
+def get_action(estimate, thresholds):
+    """Most severe action with a threshold exceeded by the estimate"""
+    action = CostAction.ALLOW
+    for candidate in CostAction.ALL[1:]:
+        for measure, limit in (thresholds.get(candidate) or {}).items():
+            value = (estimate or {}).get(measure)
+            if value is not None and limit is not None and value > limit:
+                action = candidate
+    return action
+
+
+def get_message(estimate, action):
+    if action == CostAction.ALLOW:
+        return None
+    measures = ', '.join(
+        '{:,} {}'.format(int(value), measure)
+        for measure, value in sorted(estimate.items()) if value is not None)
+    if action == CostAction.REJECT:
+        return (
+            'This query is estimated to read {}, over the limits set for '
+            'this database. Add filters or aggregate less data.'.format(measures))
+    return 'This query is estimated to read {}, it may be slow.'.format(measures)
+
+
+def set_query_estimate(query, estimate):
+    """Records the estimate on a SQL Lab query"""
+    for measure in ('rows', 'bytes'):
+        value = (estimate or {}).get(measure)
+        setattr(query, 'estimated_' + measure, None if value is None else int(value))
+
+
+def expected_action(database, sql, schema=None):
+    """Action for the query without logging it, to pick the way it runs"""
+    thresholds = get_thresholds(database)
+    if not thresholds:
+        return CostAction.ALLOW
+    return get_action(estimate_cost(database, sql, schema), thresholds)
+
+
+def check_cost(database, sql, schema=None, user_id=None, slice_id=None,
+               source=None):
+    """Estimates the query and checks it against the database thresholds
+
+    Returns a QueryCost, or None when the database has no thresholds.
+    """
+    thresholds = get_thresholds(database)
+    if not thresholds:
+        return None
+    estimate = estimate_cost(database, sql, schema)
+    action = get_action(estimate, thresholds)
+    if action != CostAction.ALLOW:
+        stats_logger.incr('query_cost_{}'.format(action))
+
+    from superset.models.core import Log
+    if user_id is None and has_request_context():
+        user_id = getattr(getattr(g, 'user', None), 'id', None)
+    log_sink.emit(Log, dict(
+        action='query_cost',
+        user_id=user_id,
+        slice_id=slice_id,
+        json=json.dumps({
+            'database_id': database.id,
+            'schema': schema,
+            'source': source,
+            'estimate': estimate,
+            'cost_action': action,
+        })))
+    return QueryCost(estimate, action, get_message(estimate or {}, action))
@@ -467,7 +467,31 @@ class SupersetSecurityManager(SecurityManager):
                         result = True
         return result if not denied else False
 
-    def item_has_access(self, item, permission_str=CAN_EXPLORE, user=None, view_name=None):
+    def get_permission_set(self, user=None):
+        """
+            Returns the (permission, view_menu) pairs granted to the user,
+            so that a lot of items can be checked without walking
+            the roles every time (see item_has_access).
+        """
+        if not user:
+            user = g.user
+        if user.is_anonymous():
+            permissions = self.get_public_permissions() or []
+        else:
+            permissions = [p for role in user.roles for p in role.permissions]
+        return frozenset(
+            (p.permission.name, p.view_menu.name) for p in permissions
+            if p.permission and p.view_menu
+        )
+
+    def item_has_access(self, item, permission_str=CAN_EXPLORE, user=None, view_name=None,
+                        perm_set=None):
+        if perm_set is not None:
+            view_names = (view_name, item.get_perm())
+            if any((DENIED, name) in perm_set for name in view_names):
+                return False
+            return any((permission_str, name) in perm_set for name in view_names)
+
         result = denied = False
         if not user:
             user = g.user
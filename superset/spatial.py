@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""Spatial helpers for the map visualizations
+
+Viewports are split in web mercator tiles addressed by quadkeys, each tile
+is aggregated in a bounded grid of cells, either in SQL (see the
+`spatial_*` attributes of the engine specs) or with NumPy.
+
+Coordinates are decoded column-wise (geohashes, delimited strings) and can
+be sent to the browser as columnar arrays, optionally base64 encoded.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import base64
+import math
+
+import numpy as np
+import pandas as pd
+
+MAX_LATITUDE = 85.05112878
+MAX_ZOOM = 22
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_GEOHASH_LOOKUP = np.full(256, -1, dtype=np.int16)
+for _i, _c in enumerate(GEOHASH_BASE32):
+    _GEOHASH_LOOKUP[ord(_c)] = _i
+
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+DELIMITED_RE = r'^\s*({n})\s*[,;\s]\s*({n})\s*$'.format(n=_NUMBER)
+
+
+def clip(value, low, high):
+    return min(max(value, low), high)
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """Web mercator tile (x, y) containing the point"""
+    n = 2 ** zoom
+    lat = math.radians(clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = int((clip(lon, -180, 180) + 180) / 360 * n)
+    y = int((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * n)
+    return clip(x, 0, n - 1), clip(y, 0, n - 1)
+
+
+def tile_to_bounds(x, y, zoom):
+    """Returns the [west, south, east, north] bounds of the tile"""
+    n = 2 ** zoom
+
+    def lat(y):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return [x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)]
+
+
+def tile_to_quadkey(x, y, zoom):
+    digits = []
+    for i in range(zoom, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def quadkey_to_tile(quadkey):
+    x = y = 0
+    zoom = len(quadkey)
+    for i, digit in enumerate(quadkey):
+        mask = 1 << (zoom - i - 1)
+        if digit not in '0123':
+            raise ValueError('Invalid quadkey {}'.format(quadkey))
+        if digit in '13':
+            x |= mask
+        if digit in '23':
+            y |= mask
+    return x, y, zoom
+
+
+def quadkey_to_bounds(quadkey):
+    return tile_to_bounds(*quadkey_to_tile(quadkey))
+
+
+def tiles_for_bounds(bounds, zoom, max_tiles=64):
+    """Quadkeys of the tiles covering the [west, south, east, north] bounds
+
+    The zoom is lowered until the viewport fits in `max_tiles` tiles,
+    so the number of tiles (and cells) per request stays bounded.
+    """
+    west, south, east, north = bounds
+    zoom = int(clip(zoom, 0, MAX_ZOOM))
+    while True:
+        x0, y0 = lonlat_to_tile(west, north, zoom)
+        x1, y1 = lonlat_to_tile(east, south, zoom)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= max_tiles or zoom == 0:
+            break
+        zoom -= 1
+    return [
+        tile_to_quadkey(x, y, zoom)
+        for y in range(y0, y1 + 1)
+        for x in range(x0, x1 + 1)
+    ]
+
+
+def geohash_precision(cell_width):
+    """Largest geohash precision whose cells are at least `cell_width` degrees wide"""
+    precision = 1
+    while precision < 12:
+        lon_bits = math.ceil(5 * (precision + 1) / 2)
+        if 360 / 2 ** lon_bits < cell_width:
+            break
+        precision += 1
+    return precision
+
+
+def grid_aggregate(lons, lats, bounds, cells, weights=None):
+    """Aggregates points of the bounds in a `cells` x `cells` grid
+
+    Returns columnar arrays: mean position, number of points and the sum
+    of `weights` for every non empty cell.
+    """
+    west, south, east, north = bounds
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    mask = (
+        (lons >= west) & (lons < east) & (lats >= south) & (lats < north))
+    lons, lats = lons[mask], lats[mask]
+    cx = ((lons - west) / (east - west) * cells).astype(np.int64)
+    cy = ((lats - south) / (north - south) * cells).astype(np.int64)
+    cell_ids, inverse = np.unique(cy * cells + cx, return_inverse=True)
+    count = np.bincount(inverse, minlength=len(cell_ids))
+    result = {
+        'lon': np.bincount(inverse, lons, len(cell_ids)) / np.maximum(count, 1),
+        'lat': np.bincount(inverse, lats, len(cell_ids)) / np.maximum(count, 1),
+        'count': count,
+    }
+    if weights is not None:
+        weights = np.nan_to_num(np.asarray(weights, dtype=float)[mask])
+        result['weight'] = np.bincount(inverse, weights, len(cell_ids))
+    return {k: v.tolist() for k, v in result.items()}
+
+
+def tile_aggregate_sql(database, sql, lon, lat, bounds, cells,
+                       weight=None, cell_type='grid'):
+    """Wraps `sql` in a query aggregating its points per cell of the tile
+
+    `lon`, `lat` and `weight` are labels of the inner query. Cell
+    expressions come from the engine spec, geohash cells fall back to the
+    grid when the engine has no geohash function.
+    """
+    spec = database.db_engine_spec
+    quote = database.get_dialect().identifier_preparer.quote
+    west, south, east, north = bounds
+    params = {
+        'lon': 'inner_qry.' + quote(lon),
+        'lat': 'inner_qry.' + quote(lat),
+        'west': repr(float(west)),
+        'south': repr(float(south)),
+        'width': repr((east - west) / cells),
+        'height': repr((north - south) / cells),
+    }
+    if cell_type == 'geohash' and spec.spatial_geohash_expr:
+        params['precision'] = geohash_precision((east - west) / cells)
+        cell_exprs = [spec.spatial_geohash_expr.format(**params)]
+    else:
+        cell_exprs = [expr.format(**params) for expr in spec.spatial_grid_exprs]
+
+    select_exprs = [
+        'AVG({lon}) AS lon'.format(**params),
+        'AVG({lat}) AS lat'.format(**params),
+        'COUNT(*) AS count',
+    ]
+    if weight:
+        select_exprs.append(
+            'SUM(inner_qry.{}) AS weight'.format(quote(weight)))
+    where = (
+        '{lon} >= {west} AND {lon} < {east} AND '
+        '{lat} >= {south} AND {lat} < {north}').format(
+            east=repr(float(east)), north=repr(float(north)), **params)
+    return (
+        'SELECT {select}\nFROM ({sql}) AS inner_qry\nWHERE {where}\n'
+        'GROUP BY {groupby}\nLIMIT {limit}').format(
+            select=', '.join(select_exprs),
+            sql=sql.rstrip().rstrip(';'),
+            where=where,
+            groupby=', '.join(cell_exprs),
+            limit=cells * cells,
+        )
+
+
+def geohash_decode(hashes):
+    """Decodes geohashes to the (latitudes, longitudes) arrays of their centers
+
+    Bits of all the hashes are consumed position by position, so the
+    Python loop runs over the hash length (12 at most), not the rows.
+    """
+    hashes = pd.Series(hashes).fillna('').astype(str).str.lower()
+    if hashes.empty:
+        return np.array([]), np.array([])
+    raw = np.array(
+        [h.encode('ascii', 'ignore') for h in hashes],
+        dtype='S{}'.format(max(int(hashes.str.len().max()), 1)))
+    codes = _GEOHASH_LOOKUP[
+        np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(len(raw), -1)]
+
+    lat = np.array([[-90.0, 90.0]]).repeat(len(raw), axis=0)
+    lon = np.array([[-180.0, 180.0]]).repeat(len(raw), axis=0)
+    is_lon = True
+    for position in range(codes.shape[1]):
+        code = codes[:, position]
+        valid = code >= 0
+        for bit in (16, 8, 4, 2, 1):
+            interval = lon if is_lon else lat
+            mid = interval.mean(axis=1)
+            on = (code & bit) > 0
+            interval[valid & on, 0] = mid[valid & on]
+            interval[valid & ~on, 1] = mid[valid & ~on]
+            is_lon = not is_lon
+    return lat.mean(axis=1), lon.mean(axis=1)
+
+
+def parse_delimited(values):
+    """Splits "a,b" strings in two float arrays
+
+    Values not made of two plain numbers (e.g. degrees/minutes notation)
+    are parsed one by one with geopy.
+    """
+    values = pd.Series(values)
+    parts = values.astype(str).str.extract(DELIMITED_RE, expand=True)
+    first = np.array(pd.to_numeric(parts[0], errors='coerce'), dtype=float)
+    second = np.array(pd.to_numeric(parts[1], errors='coerce'), dtype=float)
+    unmatched = np.isnan(first) & values.notnull().values
+    if unmatched.any():
+        from geopy.point import Point
+        for i in np.flatnonzero(unmatched):
+            point = Point(values.iloc[i])
+            first[i], second[i] = point.latitude, point.longitude
+    return first, second
+
+
+def encode_column(values, binary=False):
+    """Encodes a column for the columnar feature format
+
+    Numeric columns are sent as base64 little endian buffers in binary
+    mode ({"dtype": ..., "data": ...}), everything else as a plain list.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        values = values.astype('datetime64[ms]').astype(np.int64)
+    if not binary or values.dtype.kind not in 'biuf':
+        return values.tolist()
+    dtype = '<i4' if values.dtype.kind in 'biu' and (
+        not len(values) or np.abs(values).max() < 2 ** 31) else '<f8'
+    return {
+        'dtype': 'int32' if dtype == '<i4' else 'float64',
+        'data': base64.b64encode(values.astype(dtype).tobytes()).decode('ascii'),
+    }
+
+
+def encode_columns(columns, binary=False):
+    return {
+        name: encode_column(values, binary=binary)
+        for name, values in columns.items()
+    }
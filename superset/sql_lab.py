@@ -20,7 +20,10 @@ import sqlalchemy
 import sqlparse
 from sqlalchemy.pool import NullPool
 
-from superset import app, dataframe, db, results_backend, security_manager, utils
+from superset import (
+    admission, app, dataframe, db, query_cancel, query_cost, results_backend,
+    security_manager, utils,
+)
 from superset.db_engine_specs import LimitMethod
 from superset.models.sql_lab import Query
 from superset.sql_parse import SupersetQuery
@@ -112,14 +115,51 @@ def convert_results_to_df(cursor_description, data, db_engine_spec):
     return cdf
 
 
+class ResultsFormat(object):
+    ROWS = 'rows'
+    COLUMNAR = 'columnar'
+    BINARY = 'binary'
+
+
+def encode_results(cdf, results_format):
+    """'data' of a payload, with the 'columnar' results when requested"""
+    if results_format in (ResultsFormat.COLUMNAR, ResultsFormat.BINARY):
+        return {
+            'data': [],
+            'columnar': cdf.columnar(binary=results_format == ResultsFormat.BINARY),
+            'results_format': results_format,
+        }
+    return {'data': cdf.data, 'results_format': ResultsFormat.ROWS}
+
+
+def convert_results(payload, results_format, limit=None):
+    """Converts a stored payload to another results format, keeping `limit` rows"""
+    stored_format = payload.get('results_format', ResultsFormat.ROWS)
+    if stored_format == ResultsFormat.ROWS:
+        if limit:
+            payload['data'] = payload['data'][:limit]
+        if results_format == ResultsFormat.ROWS:
+            return payload
+        cdf = dataframe.SupersetDataFrame(pd.DataFrame(
+            payload['data'], columns=[c['name'] for c in payload['columns']]))
+    else:
+        if results_format == stored_format and not limit:
+            return payload
+        cdf = dataframe.SupersetDataFrame.from_columnar(
+            payload.pop('columnar'), limit=limit)
+    payload.update(encode_results(cdf, results_format))
+    return payload
+
+
 @celery_app.task(bind=True, soft_time_limit=SQLLAB_TIMEOUT)
 def get_sql_results(
         ctask, query_id, rendered_query, return_results=True, store_results=False,
-        user_name=None, limit=None, offset=None):
+        user_name=None, limit=None, offset=None, results_format=None):
     """Executes the sql query returns the results."""
     try:
         return execute_sql(
-            ctask, query_id, rendered_query, return_results, store_results, user_name, limit=limit, offset=offset)
+            ctask, query_id, rendered_query, return_results, store_results, user_name, limit=limit, offset=offset,
+            results_format=results_format)
     except Exception as e:
         logging.exception(e)
         stats_logger.incr('error_sqllab_unhandled')
@@ -134,7 +174,7 @@ def get_sql_results(
 
 def execute_sql(
     ctask, query_id, rendered_query, return_results=True, store_results=False,
-    user_name=None, limit=None, offset=None,
+    user_name=None, limit=None, offset=None, results_format=None,
 ):
     """Executes the sql query returns the results."""
     session = get_session(not ctask.request.called_directly)
@@ -162,12 +202,24 @@ def execute_sql(
         })
         return payload
 
+    def handle_stopped():
+        """Local method answering for a query stopped while it ran"""
+        return json.dumps(
+            {
+                'query_id': query.id,
+                'status': query.status,
+                'query': query.to_dict(),
+            },
+            default=utils.json_iso_dttm_ser)
+
     if store_results and not results_backend:
         return handle_error("Results backend isn't configured.")
 
     is_select = sqlparse.parse(rendered_query)[0].get_type() == 'SELECT'
     run_as_written = rendered_query.find("/*raw_sql*/") > -1
 
+    # estimated before paging, as SQL Lab estimates it to pick sync or async
+    cost_sql = rendered_query
     if limit is not None and offset is not None and is_select and not run_as_written:
         rendered_query = database.wrap_sql_limit(rendered_query, limit, offset)
 
@@ -176,6 +228,16 @@ def execute_sql(
     if not superset_query.is_select() and not database.allow_dml:
         return handle_error(
             'Only `SELECT` statements are allowed against this database')
+    if superset_query.is_select():
+        cost = query_cost.check_cost(
+            database, cost_sql, query.schema,
+            user_id=query.user_id, source='sql_lab')
+        if cost:
+            query_cost.set_query_estimate(query, cost.estimate)
+            if cost.action == query_cost.CostAction.REJECT:
+                return handle_error(cost.message)
+            if cost.message:
+                payload['warning'] = cost.message
     if query.select_as_cta:
         if not superset_query.is_select():
             return handle_error(
@@ -205,6 +267,7 @@ def execute_sql(
     session.commit()
     logging.info("Set query to 'running'")
     conn = None
+    tag = query_cancel.sql_lab_tag(query)
     try:
         engine = database.get_sqla_engine(
             schema=query.schema,
@@ -218,21 +281,29 @@ def execute_sql(
 
         total_count = 0
 
-        if is_select:
-            count_qry = select([func.count()]).select_from(TextAsFrom(text(query.sql), ['*']).alias('inner_qry'))
-            count_qry_ = database.compile_sqla_query(count_qry)
-
-            logging.info("Count query %s" % count_qry_)
-
-            cursor.execute(database.compile_sqla_query(count_qry), **db_engine_spec.cursor_execute_kwargs)
-            total_count = db_engine_spec.fetch_data(cursor, 1)[0][0]
-
-        cursor.execute(query.executed_sql,
-                       **db_engine_spec.cursor_execute_kwargs)
-        logging.info('Handling cursor')
-        db_engine_spec.handle_cursor(cursor, query, session)
-        logging.info('Fetching data: {}'.format(query.to_dict()))
-        data = db_engine_spec.fetch_data(cursor, query.limit)
+        # the queries of the workers give way to the interactive ones
+        priority = (
+            admission.Priority.INTERACTIVE if ctask.request.called_directly
+            else admission.Priority.EXPORT)
+        with admission.admitted(database, priority=priority, user_id=query.user_id), \
+                query_cancel.running(tag, cursor), query_cancel.cancel_on_timeout(database, tag):
+            if is_select:
+                count_qry = select([func.count()]).select_from(TextAsFrom(text(query.sql), ['*']).alias('inner_qry'))
+                count_qry_ = database.compile_sqla_query(count_qry)
+
+                logging.info("Count query %s" % count_qry_)
+
+                cursor.execute(
+                    db_engine_spec.tag_sql(count_qry_, tag),
+                    **db_engine_spec.cursor_execute_kwargs)
+                total_count = db_engine_spec.fetch_data(cursor, 1)[0][0]
+
+            cursor.execute(db_engine_spec.tag_sql(query.executed_sql, tag),
+                           **db_engine_spec.cursor_execute_kwargs)
+            logging.info('Handling cursor')
+            db_engine_spec.handle_cursor(cursor, query, session)
+            logging.info('Fetching data: {}'.format(query.to_dict()))
+            data = db_engine_spec.fetch_data(cursor, query.limit)
     except SoftTimeLimitExceeded as e:
         logging.exception(e)
         if conn is not None:
@@ -244,6 +315,10 @@ def execute_sql(
         logging.exception(e)
         if conn is not None:
             conn.close()
+        # the statement fails on the database when stop_query cancels it
+        session.refresh(query)
+        if query.status == QueryStatus.STOPPED:
+            return handle_stopped()
         return handle_error(db_engine_spec.extract_error_message(e))
 
     logging.info('Fetching cursor description')
@@ -254,13 +329,7 @@ def execute_sql(
         conn.close()
 
     if query.status == utils.QueryStatus.STOPPED:
-        return json.dumps(
-            {
-                'query_id': query.id,
-                'status': query.status,
-                'query': query.to_dict(),
-            },
-            default=utils.json_iso_dttm_ser)
+        return handle_stopped()
 
     cdf = convert_results_to_df(cursor_description, data, db_engine_spec)
 
@@ -281,14 +350,15 @@ def execute_sql(
 
     payload.update({
         'status': query.status,
-        'data': cdf.data if cdf.data else [],
-        'columns': cdf.columns if cdf.columns else [],
+        'columns': cdf.columns or [],
         'query': query.to_dict(),
         'total_count': total_count
     })
     if store_results:
         key = '{}'.format(uuid.uuid4())
-        json_payload = json.dumps(payload, default=utils.json_iso_dttm_ser)
+        stored_payload = dict(payload, **encode_results(
+            cdf, config.get('RESULTS_BACKEND_FORMAT', ResultsFormat.ROWS)))
+        json_payload = json.dumps(stored_payload, default=utils.json_iso_dttm_ser)
         utils.set_cache(key, json_payload, database.cache_timeout)
         query.results_key = key
         query.end_result_backend_time = utils.now_as_float()
@@ -297,4 +367,6 @@ def execute_sql(
     session.commit()
 
     if return_results:
+        payload.update(encode_results(
+            cdf, results_format or config.get('SQLLAB_RESULTS_FORMAT', ResultsFormat.ROWS)))
         return payload
@@ -1,3 +1,4 @@
+import { v4 as uuidv4 } from "uuid"
 import {
   getExploreUrlAndPayload,
   getAnnotationJsonUrl,
@@ -20,6 +21,31 @@ import {
 
 const $ = (window.$ = require("jquery"))
 
+// datasources of the chart requests in flight, by the query_identity
+// tagging their queries
+const runningQueries = {}
+
+function cancelChartQuery(id) {
+  const datasource = runningQueries[id]
+  if (!datasource) {
+    return
+  }
+  delete runningQueries[id]
+  const data = new FormData()
+  data.append("query_identity", id)
+  data.append("datasource", datasource)
+  const token = document.getElementById("csrf_token")
+  if (token) {
+    data.append("csrf_token", token.value)
+  }
+  // a beacon still goes out when the page is being closed
+  navigator.sendBeacon("/superset/cancel_chart_query/", data)
+}
+
+window.addEventListener("pagehide", () => {
+  Object.keys(runningQueries).forEach(cancelChartQuery)
+})
+
 export const CHART_UPDATE_STARTED = "CHART_UPDATE_STARTED"
 export function chartUpdateStarted(queryRequest, latestQueryFormData, key, drilldown) {
   return { type: CHART_UPDATE_STARTED, queryRequest, latestQueryFormData, key, drilldown }
@@ -161,6 +187,8 @@ export function runQuery(
       endpointType: "json",
       force,
       isStopAsync,
+      // tags the queries of the request, to cancel them
+      requestParams: { query_identity: uuidv4() },
     })
     const logStart = Logger.getTimestamp()
     const state = getState()
@@ -253,6 +281,16 @@ export function runQuery(
           })
       }
     } else {
+      if (id) {
+        runningQueries[id] = formData.datasource
+        queryRequest.always((data, textStatus) => {
+          // the server goes on running the queries the browser gave up on
+          if (textStatus === "abort" || textStatus === "timeout") {
+            cancelChartQuery(id)
+          }
+          delete runningQueries[id]
+        })
+      }
       queryPromise = Promise.resolve(
         dispatch(chartUpdateStarted(queryRequest, payload, key))
       )
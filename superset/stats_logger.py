@@ -20,7 +20,7 @@ class BaseStatsLogger(object):
             return self.prefix + key
         return key
 
-    def incr(self, key):
+    def incr(self, key, count=1):
         """Increment a counter"""
         raise NotImplementedError()
 
@@ -28,15 +28,16 @@ class BaseStatsLogger(object):
         """Decrement a counter"""
         raise NotImplementedError()
 
-    def gauge(self, key):
+    def gauge(self, key, value):
         """Setup a gauge"""
         raise NotImplementedError()
 
 
 class DummyStatsLogger(BaseStatsLogger):
-    def incr(self, key):
-        logging.debug(
-            Fore.CYAN + '[stats_logger] (incr) ' + key + Style.RESET_ALL)
+    def incr(self, key, count=1):
+        logging.debug((
+            Fore.CYAN + '[stats_logger] (incr) '
+            '{key} | {count}' + Style.RESET_ALL).format(**locals()))
 
     def decr(self, key):
         logging.debug((
@@ -56,15 +57,14 @@ try:
         def __init__(self, host, port, prefix='superset'):
             self.client = StatsClient(host=host, port=port, prefix=prefix)
 
-        def incr(self, key):
-            self.client.incr(key)
+        def incr(self, key, count=1):
+            self.client.incr(key, count)
 
         def decr(self, key):
             self.client.decr(key)
 
-        def gauge(self, key):
-            # pylint: disable=no-value-for-parameter
-            self.client.gauge(key)
+        def gauge(self, key, value):
+            self.client.gauge(key, value)
 
 except Exception as e:
     pass
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Celery queues of the tasks running queries
+
+Async dashboard charts and async SQL Lab queries are routed to a queue of
+their database and workload, so that a pool of workers can be run for each
+backend and a slow Hive query doesn't hold the workers serving ClickHouse
+dashboards. The extra of a database names its queues:
+
+    "celery_queues": {"sql_lab": "hive_sql_lab", "dashboard": "hive"}
+
+or one `celery_queue` for all its workloads. The other databases use the
+CELERY_QUERY_QUEUE template, e.g. '{backend}_{workload}', and the default
+queue when it isn't set.
+
+A worker only consumes the default queue unless it is started on some
+queues with `superset worker --queues` (`celery worker -Q`), so every
+queue named by the databases or by the template needs its own workers,
+otherwise its tasks are never run. The workers of long-running queues
+should only prefetch one task at a time (`--prefetch-one`, or
+CELERY_PREFETCH_ONE_QUEUES).
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from superset import app
+
+config = app.config
+
+
+class Workload(object):
+    SQL_LAB = 'sql_lab'
+    DASHBOARD = 'dashboard'
+
+
+def get_queue(database, workload):
+    """Name of the queue of the tasks of this workload on the database, None
+    for the default queue"""
+    if database is None:
+        return None
+    extra = database.get_extra()
+    queue = (extra.get('celery_queues') or {}).get(workload) or extra.get('celery_queue')
+    if queue:
+        return queue
+    template = config.get('CELERY_QUERY_QUEUE')
+    if not template:
+        return None
+    return template.format(
+        backend=database.backend, database_id=database.id, workload=workload)
+
+
+def get_options(database, workload):
+    """apply_async options routing the task to its queue"""
+    queue = get_queue(database, workload)
+    return {'queue': queue} if queue else {}
+
+
+def prefetches_one(queues):
+    """Whether a worker consuming `queues` should prefetch one task at a time"""
+    long_running = set(config.get('CELERY_PREFETCH_ONE_QUEUES') or ())
+    return bool(queues) and set(queues) <= long_running
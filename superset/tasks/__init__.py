@@ -1 +1,4 @@
 from .tasks import async_dashboard
+from .cache import warm_up_cache
+from .log import bulk_insert_logs
+from .catalog import refresh_catalog_entry
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Celery driven cache warm-up for slices
+
+Slices are selected by dashboard, by datasource or as the top N most viewed
+slices according to the ``Log`` table. Identical query objects are deduped by
+their cache key, keys still present in the cache are skipped and the
+remaining queries run in a thread pool with a per-database concurrency limit.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+
+from flask import g
+from sqlalchemy import desc, func
+
+from superset import admission, app, cache, db, security_manager, utils
+from superset.utils import get_celery_app
+
+config = app.config
+celery_app = get_celery_app(config)
+stats_logger = config.get('STATS_LOGGER')
+
+
+class WarmUpStatus(object):
+    WARMED = 'warmed'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+
+def get_slices(
+        session, slice_ids=None, dashboard_id=None, datasource_type=None,
+        datasource_id=None, top_n=None, since_days=None):
+    """Returns the slices that should be warmed up, most important first"""
+    from superset.models.core import Dashboard, Log, Slice
+
+    if slice_ids:
+        return session.query(Slice).filter(Slice.id.in_(slice_ids)).all()
+    if dashboard_id:
+        dash = session.query(Dashboard).filter_by(id=dashboard_id).first()
+        return list(dash.slices) if dash else []
+    if datasource_id and datasource_type:
+        return session.query(Slice).filter_by(
+            datasource_id=datasource_id,
+            datasource_type=datasource_type,
+        ).all()
+    if top_n:
+        views = func.count(Log.id).label('views')
+        qry = session.query(Log.slice_id, views).filter(Log.slice_id > 0)
+        since_days = since_days or config.get('CACHE_WARMUP_TOP_N_DAYS')
+        if since_days:
+            qry = qry.filter(
+                Log.dttm >= datetime.utcnow() - timedelta(days=since_days))
+        qry = qry.group_by(Log.slice_id).order_by(desc(views)).limit(top_n)
+        ranked_ids = [slice_id for slice_id, _ in qry.all()]
+        slices = {
+            slc.id: slc for slc in
+            session.query(Slice).filter(Slice.id.in_(ranked_ids)).all()
+        }
+        return [slices[i] for i in ranked_ids if i in slices]
+    return []
+
+
+def get_database_limit(database):
+    """Max number of warm-up queries allowed to run at once on a database"""
+    limit = database.get_extra().get('cache_warmup_concurrency')
+    return int(limit or config.get('CACHE_WARMUP_MAX_CONCURRENCY_PER_DB', 2))
+
+
+def plan_jobs(slices, force=False):
+    """Builds the deduplicated list of warm-up jobs
+
+    Every job is a dict keyed by cache key. Slices sharing the same query
+    object are attached to the same job, and keys still present in the cache
+    are flagged as skipped unless ``force`` is set.
+    """
+    jobs = OrderedDict()
+    for slc in slices:
+        entry = {'slice_id': slc.id, 'slice_name': slc.slice_name}
+        try:
+            viz_obj = slc.get_viz(force=True)
+            query_obj = viz_obj.query_obj()
+            cache_key = viz_obj.cache_key(query_obj) if query_obj else None
+            database = getattr(slc.datasource, 'database', None)
+        except Exception as e:
+            logging.exception(e)
+            entry.update(
+                status=WarmUpStatus.FAILED,
+                error=utils.error_msg_from_exception(e))
+            jobs['error_{}'.format(slc.id)] = dict(
+                slices=[entry], database_id=None, status=WarmUpStatus.FAILED)
+            continue
+
+        key = cache_key or 'slice_{}'.format(slc.id)
+        if key in jobs:
+            jobs[key]['slices'].append(entry)
+            continue
+        is_fresh = bool(
+            cache_key and cache and not force and cache.get(cache_key))
+        jobs[key] = {
+            'cache_key': cache_key,
+            'slices': [entry],
+            'slice_id': slc.id,
+            'database_id': database.id if database else None,
+            'limit': get_database_limit(database) if database else 1,
+            'status': WarmUpStatus.SKIPPED if is_fresh else None,
+        }
+    return list(jobs.values())
+
+
+def run_job(job, semaphore, user_id=None):
+    """Runs a single warm-up job inside its own app context and session
+
+    Cache keys depend on the user, so the job impersonates ``user_id``
+    to warm the same keys this user will read.
+    """
+    from superset.models.core import Slice
+
+    with semaphore, app.app_context():
+        start = time.time()
+        try:
+            if user_id:
+                g.user = security_manager.get_user_by_id(user_id)
+            admission.set_priority(admission.Priority.WARM_UP)
+            slc = db.session.query(Slice).filter_by(id=job['slice_id']).one()
+            payload = slc.get_viz(force=True).get_payload()
+            error = payload.get('error')
+            if payload.get('status') == utils.QueryStatus.FAILED or error:
+                job['status'] = WarmUpStatus.FAILED
+                job['error'] = str(error)
+            else:
+                job['status'] = WarmUpStatus.WARMED
+        except Exception as e:
+            logging.exception(e)
+            job['status'] = WarmUpStatus.FAILED
+            job['error'] = utils.error_msg_from_exception(e)
+        finally:
+            db.session.remove()
+        job['duration'] = round(time.time() - start, 3)
+    return job
+
+
+def warm_up(slices, force=False, user_id=None, max_workers=None):
+    """Warms up the cache for the given slices and returns a per slice report"""
+    jobs = plan_jobs(slices, force=force)
+    pending = [job for job in jobs if job['status'] is None]
+
+    semaphores = {}
+    for job in pending:
+        if job['database_id'] not in semaphores:
+            semaphores[job['database_id']] = threading.BoundedSemaphore(
+                job['limit'])
+
+    max_workers = max_workers or config.get('CACHE_WARMUP_WORKERS', 4)
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    run_job, job, semaphores[job['database_id']], user_id)
+                for job in pending
+            ]
+            for future in futures:
+                future.result()
+
+    report = []
+    for job in jobs:
+        stats_logger.incr('cache_warmup_{}'.format(job['status']))
+        for entry in job['slices']:
+            entry.setdefault('status', job['status'])
+            entry.setdefault('error', job.get('error'))
+            entry['duration'] = job.get('duration', 0)
+            report.append(entry)
+    logging.info('Cache warm-up: {} slices, {} queries run'.format(
+        len(report), len(pending)))
+    return report
+
+
+@celery_app.task(name='cache.warm_up_cache')
+def warm_up_cache(
+        slice_ids=None, dashboard_id=None, datasource_type=None,
+        datasource_id=None, top_n=None, since_days=None, force=False,
+        user_id=None):
+    """Celery task warming up the cache outside of the web workers"""
+    with app.app_context():
+        user_id = user_id or config.get('CACHE_WARMUP_USER_ID')
+        if user_id:
+            g.user = security_manager.get_user_by_id(user_id)
+        slices = get_slices(
+            db.session,
+            slice_ids=slice_ids,
+            dashboard_id=dashboard_id,
+            datasource_type=datasource_type,
+            datasource_id=datasource_id,
+            top_n=top_n,
+            since_days=since_days,
+        )
+        report = warm_up(slices, force=force, user_id=user_id)
+        db.session.remove()
+    failed = [r for r in report if r['status'] == WarmUpStatus.FAILED]
+    for entry in failed:
+        logging.warning('Cache warm-up failed for slice {}: {}'.format(
+            entry['slice_id'], entry['error']))
+    return report
+
+
+for schedule in config.get('CACHE_WARMUP_SCHEDULES', []):
+    celery_app.add_periodic_task(
+        schedule['schedule'],
+        warm_up_cache.s(**schedule.get('kwargs', {})),
+        name=schedule.get('name'),
+    )
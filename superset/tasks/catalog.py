@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+
+from superset import app, catalog, db
+from superset.utils import get_celery_app
+
+config = app.config
+celery_app = get_celery_app(config)
+
+
+@celery_app.task(name='catalog.refresh_catalog_entry', ignore_result=True)
+def refresh_catalog_entry(database_id, kind, schema=None, table_name=None):
+    """Refreshes a stale metadata catalog entry (CATALOG_BACKGROUND_REFRESH)"""
+    from superset.models.core import Database
+    with app.app_context():
+        try:
+            database = db.session.query(Database).filter_by(id=database_id).first()
+            if database:
+                catalog.refresh(database, kind, schema, table_name)
+        except Exception as e:
+            logging.exception(e)
+        finally:
+            db.session.remove()
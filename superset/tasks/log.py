@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from superset import app
+from superset.log_sink import bulk_insert
+from superset.utils import get_celery_app
+
+config = app.config
+celery_app = get_celery_app(config)
+
+
+@celery_app.task(name='log.bulk_insert_logs', ignore_result=True)
+def bulk_insert_logs(entries):
+    """Bulk inserts Log rows buffered by the web workers (LOG_SINK = 'celery')"""
+    from superset.models.core import Log
+    for entry in entries:
+        entry['dttm'] = datetime.utcfromtimestamp(entry['dttm'])
+    bulk_insert(Log, entries)
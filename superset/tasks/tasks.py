@@ -3,12 +3,16 @@ import logging
 import traceback
 import json
 
+from celery.signals import worker_process_init
 from flask_appbuilder.security.sqla.models import User
 from flask.wrappers import Response
+import sqlalchemy
+from sqlalchemy.orm import scoped_session, sessionmaker
 
-from superset import app
+from superset import app, async_payloads, query_cancel
 from superset.config import UPDATE_PENDING_QUERIES_TIME_SECONDS
-from superset.utils import get_celery_app, set_cache, error_msg_from_exception
+from superset.exceptions import SupersetException
+from superset.utils import get_celery_app, error_msg_from_exception
 from superset.views.base import json_error_response
 from superset.sql_lab import get_session
 
@@ -39,29 +43,69 @@ def update_invalid_queries():
 celery_app.add_periodic_task(UPDATE_PENDING_QUERIES_TIME_SECONDS, update_invalid_queries, name='test periodic task')
 
 
-@celery_app.task()
-def async_dashboard(datasource_type, datasource_id, form_data, csv, excel, query, force, user_id, query_identity):
-    from superset.views.core import Superset
+_worker_session = None
+_view = None
+
+
+@worker_process_init.connect
+def reset_worker_state(**kwargs):
+    """Forked worker processes don't share the connections of their parent"""
+    global _worker_session, _view
+    _worker_session = None
+    _view = None
+
+
+def get_worker_session():
+    """Session of this worker process, over a pooled engine"""
+    global _worker_session
+    if _worker_session is None:
+        engine = sqlalchemy.create_engine(config.get('SQLALCHEMY_DATABASE_URI'))
+        _worker_session = scoped_session(sessionmaker(bind=engine))
+    return _worker_session
+
+
+def get_view():
+    global _view
+    if _view is None:
+        from superset.views.core import Superset
+        _view = Superset()
+    return _view
+
+
+@celery_app.task(soft_time_limit=config.get('ASYNC_DASHBOARD_TIME_LIMIT_SEC'))
+def async_dashboard(datasource_type, datasource_id, slice_id, form_data_hash, force, user_id, query_identity):
+    """Runs a chart and stores its payload under `query_identity`
+
+    The form_data waits in the results backend under its hash, see
+    superset/async_payloads.py.
+    """
+    session = get_worker_session()
     try:
         with app.app_context():
-            session = get_session(True)
+            # the chart queries are cancelled on the soft time limit
+            query_cancel.set_tag(query_identity)
+            form_data = async_payloads.load_form_data(form_data_hash)
+            if form_data is None:
+                raise SupersetException(
+                    'The request of the chart expired, refresh the dashboard')
             user = session.query(User).filter_by(id=user_id).one()
-            data = Superset().generate_json(datasource_type=datasource_type,
-                                                    datasource_id=datasource_id,
-                                                    form_data=form_data,
-                                                    csv=csv,
-                                                    excel=excel,
-                                                    query=query,
-                                                    force=force,
-                                                    user=user,
-                                                    session=session,
-                                                    async_mode=True)
+            data = get_view().generate_json(datasource_type=datasource_type,
+                                            datasource_id=datasource_id,
+                                            form_data=form_data,
+                                            force=force,
+                                            user=user,
+                                            session=session,
+                                            async_mode=True)
         if isinstance(data, Response):
             data = data.data
-        set_cache(query_identity, data, config.get('ASYNC_DASHBOARD_CACHE_TIMEOUT', 0))
+        async_payloads.store_result(query_identity, data)
     except Exception as e:
-        set_cache(query_identity, json.dumps(dict(error=error_msg_from_exception(e))),
-                  config.get('ASYNC_DASHBOARD_CACHE_TIMEOUT', 0))
+        async_payloads.store_result(
+            query_identity, json.dumps(dict(error=error_msg_from_exception(e))))
+        logging.error('Async dashboard chart {} failed'.format(slice_id))
         logging.exception(e)
         stats_logger.incr('error_async_dashboard')
         raise
+    finally:
+        # gives the connection back to the pool
+        session.remove()
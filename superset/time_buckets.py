@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Time buckets for the incremental caching of time-series queries
+
+A time range is split at bucket boundaries aligned with the time grain of
+the query, so that every row of a grain falls in exactly one bucket. Buckets
+covering a whole, closed, period can be cached on their own and reused by
+any later query whose range contains them.
+
+Fixed grains are aligned on 1970-01-05, a Monday, which keeps all the
+grains shorter than a week on the boundaries the databases truncate to.
+Weeks only match the engines truncating them to Mondays (see
+`week_starts_monday` in the engine specs), others start them on Sundays
+or on the first day of the year, so weekly grains are not supported for
+them. Months, quarters and years are aligned on calendar months.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+import math
+import re
+
+from dateutil.relativedelta import relativedelta
+
+ORIGIN = datetime(1970, 1, 5)
+
+# grain duration -> number of months
+CALENDAR_GRAINS = {
+    'P1M': 1,
+    'P0.25Y': 3,
+    'P1Y': 12,
+}
+
+FIXED_GRAIN_RE = re.compile(
+    r'^P(?:(?P<weeks>\d+)W|(?P<days>\d+)D|'
+    r'T(?:(?P<hours>[\d.]+)H|(?P<minutes>[\d.]+)M|(?P<seconds>[\d.]+)S))$')
+
+Bucket = namedtuple('Bucket', ['start', 'end', 'whole'])
+
+
+def fixed_grain(grain):
+    """timedelta of a fixed grain duration, None when it is a calendar one"""
+    match = FIXED_GRAIN_RE.match(grain or '')
+    if not match:
+        return None
+    return timedelta(**{
+        unit: float(value) for unit, value in match.groupdict().items()
+        if value is not None})
+
+
+def is_weekly(grain):
+    match = FIXED_GRAIN_RE.match(grain or '')
+    return bool(match and match.group('weeks'))
+
+
+def is_supported(grain, week_starts_monday=False):
+    """Whether ranges can be split for this grain, None being no grain
+
+    Weekly grains need an engine truncating weeks to Mondays.
+    """
+    if is_weekly(grain) and not week_starts_monday:
+        return False
+    return not grain or grain in CALENDAR_GRAINS or fixed_grain(grain) is not None
+
+
+class Splitter(object):
+    """Floors datetimes to the buckets of a grain and steps through them"""
+
+    def __init__(self, grain, min_bucket):
+        self.months = CALENDAR_GRAINS.get(grain)
+        if self.months:
+            self.length = None
+            return
+        grain = fixed_grain(grain) or timedelta(seconds=1)
+        self.length = grain * max(1, int(math.ceil(min_bucket / grain)))
+
+    def floor(self, dttm):
+        if self.months:
+            index = dttm.year * 12 + dttm.month - 1
+            index -= index % self.months
+            return datetime(index // 12, index % 12 + 1, 1)
+        return ORIGIN + ((dttm - ORIGIN) // self.length) * self.length
+
+    def next(self, dttm):
+        if self.months:
+            return dttm + relativedelta(months=self.months)
+        return dttm + self.length
+
+
+def split(from_dttm, to_dttm, grain, min_bucket, now=None):
+    """Splits [from_dttm, to_dttm] in buckets
+
+    Only the last bucket includes its end. `whole` buckets cover a complete
+    period that ended before `now`, the partial ones at the edges of the
+    range and the ones still open are not.
+    """
+    now = now or datetime.utcnow()
+    splitter = Splitter(grain, min_bucket)
+    boundaries = [from_dttm]
+    boundary = splitter.floor(from_dttm)
+    if boundary <= from_dttm:
+        boundary = splitter.next(boundary)
+    while boundary < to_dttm:
+        boundaries.append(boundary)
+        boundary = splitter.next(boundary)
+    boundaries.append(to_dttm)
+
+    buckets = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        whole = (
+            splitter.floor(start) == start and
+            splitter.next(start) == end and
+            end <= now)
+        buckets.append(Bucket(start, end, whole))
+    return buckets
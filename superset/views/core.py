@@ -12,18 +12,18 @@ import re
 import tempfile
 import time
 import traceback
-from copy import deepcopy
 from datetime import datetime, timedelta, timezone
 from io import BytesIO
 from urllib import parse
 
 import chardet
+import pandas as pd
 import requests
 import sqlalchemy as sqla
 from babel.support import LazyProxy
 from flask import (
     flash, g, Markup, redirect, render_template, request, Response, url_for,
-    send_file)
+    send_file, stream_with_context)
 from flask_appbuilder import expose, SimpleFormView
 from flask_appbuilder.actions import action
 from flask_appbuilder.models.sqla.interface import SQLAInterface
@@ -35,17 +35,18 @@ from sqlalchemy import create_engine, or_, text, String
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.sql import select, func
+from sqlalchemy.sql import column, func, select
 from unidecode import unidecode
 from werkzeug.routing import BaseConverter
 from werkzeug.utils import secure_filename
 
 import superset.models.core as models
 from superset import (
-    app, appbuilder, cache, db, results_backend, security_manager, sql_lab,
-    utils,
+    admission, app, appbuilder, async_payloads, cache, catalog, db, query_cancel, query_cost,
+    results_backend, security_manager, sql_lab, task_queues, utils,
     viz, conf
 )
+from superset.bulk_import import BulkImport
 from superset.config import PATH_TO_CHROME_EXE, URL_TO_RENDER_PDF
 from superset.connectors.base.models import BaseColumn
 from superset.connectors.connector_registry import ConnectorRegistry
@@ -68,12 +69,16 @@ from superset.utils import (
 from superset.views.folders import FoldersApiMixin, FoldersMixin
 from superset.views.permissions import PermissionMixin
 from superset.tasks import async_dashboard
+from superset.tasks import cache as cache_warmup
 from .base import (
     api, BaseSupersetView, CsvResponse, DeleteMixin,
     generate_download_headers, get_error_msg, get_user_roles,
     json_error_response, SupersetFilter, SupersetModelView, YamlExportMixin,
 )
-from .utils import bootstrap_user_data, create_perm, get_metric_expr
+from .utils import (
+    bootstrap_user_data, create_perm, get_datasource_data, get_metric_expr,
+    load_dashboard, preload_datasources,
+)
 from ..models.helpers import get_query_result
 from ..utils import has_access
 
@@ -320,7 +325,17 @@ class DatabaseView(PermissionMixin, SupersetModelView, DeleteMixin, YamlExportMi
             'sqlalchemy.create_engine) call, while the ``metadata_params`` '
             'gets unpacked into the [sqlalchemy.MetaData]'
             '(http://docs.sqlalchemy.org/en/rel_1_0/core/metadata.html'
-            '#sqlalchemy.schema.MetaData) call.'), True)),
+            '#sqlalchemy.schema.MetaData) call.') + ' ' + _(
+            'The ``cost_thresholds`` object, e.g. ``{"warn": {"rows": 1000000}, '
+            '"async": {"rows": 100000000}, "reject": {"bytes": 1000000000000}}``, '
+            'sets the estimated rows or bytes over which queries are flagged, '
+            'sent to the workers or rejected before they run.') + ' ' + _(
+            'The ``max_in_flight_queries`` and ``max_in_flight_queries_per_user`` '
+            'integers limit the queries running at once on the database, the '
+            'others wait for their turn.') + ' ' + _(
+            'The ``celery_queues`` object, e.g. ``{"sql_lab": "hive_sql_lab", '
+            '"dashboard": "hive"}``, or the ``celery_queue`` string routes the '
+            'async queries of the database to their own Celery queues.'), True)),
         'impersonate_user': _(
             'If Presto, all the queries in SQL Lab are going to be executed as the '
             'currently logged on user who must have permission to run them.<br/>'
@@ -764,7 +779,7 @@ class DashboardModelView(
         if request.args.get('action') == 'go':
             ids = request.args.getlist('id')
             return Response(
-                models.Dashboard.export_dashboards(ids),
+                stream_with_context(models.Dashboard.iter_export_dashboards(ids)),
                 headers=generate_download_headers('json'),
                 mimetype='application/text')
         return self.render_template(
@@ -1417,10 +1432,19 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             form_data = self.get_form_data()[0]
             datasource_id, datasource_type = self.datasource_info(datasource_id, datasource_type, form_data)
             if async_mode and not (csv or excel or query):
-                async_dashboard.delay(datasource_type, datasource_id, form_data, csv, excel, query, force, g.user.id,
-                                      query_identity)
+                datasource = ConnectorRegistry.get_datasource(datasource_type, datasource_id, db.session)
+                # the form_data waits in the results backend, see superset/async_payloads.py
+                async_dashboard.apply_async(
+                    args=[datasource_type, datasource_id, form_data.get('slice_id'),
+                          async_payloads.store_form_data(form_data), force, g.user.id, query_identity],
+                    **task_queues.get_options(
+                        getattr(datasource, 'database', None), task_queues.Workload.DASHBOARD))
                 resp = json_success(None, status=202)
             else:
+                # lets cancel_chart_query find the queries of the request
+                query_cancel.set_tag(query_identity)
+                if csv or excel:
+                    admission.set_priority(admission.Priority.EXPORT)
                 resp = self.generate_json(datasource_type=datasource_type,
                                           datasource_id=datasource_id,
                                           form_data=form_data,
@@ -1436,6 +1460,28 @@ class Superset(FoldersApiMixin, BaseSupersetView):
                 stacktrace=traceback.format_exc())
         return resp
 
+    @has_access_api
+    @expose('/cancel_chart_query/', methods=['POST'])
+    def cancel_chart_query(self):
+        """Cancels the queries of a chart request the browser gave up on
+
+        Takes the `datasource` of the chart and the `query_identity` its
+        request to explore_json was sent with.
+        """
+        try:
+            datasource_id, datasource_type = self.datasource_info(
+                None, None, {'datasource': request.form.get('datasource')})
+            datasource = ConnectorRegistry.get_datasource(
+                datasource_type, datasource_id, db.session)
+        except Exception as e:
+            return json_error_response(utils.error_msg_from_exception(e))
+        if not security_manager.datasource_access(datasource, g.user):
+            return json_error_response(DATASOURCE_ACCESS_ERR, status=404)
+        cancelled = query_cancel.cancel(
+            getattr(datasource, 'database', None),
+            request.form.get('query_identity'))
+        return json_success(json.dumps({'cancelled': cancelled}))
+
     @log_this
     @has_access_api
     @expose('/aggregate_by_area/<datasource_type>/<datasource_id>/', methods=['GET', 'POST'])
@@ -1500,34 +1546,36 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             datasource.get_col(c).inner_sqla_col for c in query_obj["groupby"]
             if c not in [form_data["latitude"], form_data["longitude"]]
         ] + [text(main_metric_alias)]
-        aggregate_result = dict()
 
-        for aggregate in aggregates:
-            wherecondition = []
-            for point in aggregate["points"]:
-                wherecondition.append(
-                    func.concat(
-                        str(point["latitude"]["value"]),
-                        str(point["longitude"]["value"]),
-                        str(point["pointName"]["value"])
-                    )
-                )
+        # every point key is mapped to the index of its area, so all the
+        # areas are aggregated by one grouped query
+        areas = viz_obj.get_area_points(aggregates)
+        values = dict()
+
+        if areas is not None:
+            area_index = column('area_index')
             inner_qry = datasource.get_sqla_query(**query_obj)
             inner_qry = inner_qry.alias('inner')
             subq = (
-                select(columns=select_cols, from_obj=inner_qry)
-                .where(wherecls.in_(wherecondition))
-                .group_by(*select_cols).alias("subq")
+                select(
+                    columns=select_cols + [areas.c.area_index],
+                    from_obj=inner_qry.join(areas, wherecls == areas.c.point_key))
+                .group_by(*(select_cols + [areas.c.area_index])).alias("subq")
             )
-            qry = select(columns=[aggregate_expr], from_obj=subq)
-
+            qry = select(columns=[area_index, aggregate_expr], from_obj=subq).group_by(area_index)
             result = get_query_result(query=qry, datasource=datasource, engine=engine)
 
             if result.error_message:
                 return json_error_response(result.error_message, status=400)
 
-            viz_obj.metrics = [aggregation_name]
-            payload = viz_obj.get_payload_df(result.df)
+            values = dict(zip(result.df['area_index'], result.df[aggregation_name]))
+
+        viz_obj.metrics = [aggregation_name]
+        aggregate_result = dict()
+
+        for index, aggregate in enumerate(aggregates):
+            df = pd.DataFrame({aggregation_name: [values.get(index)]})
+            payload = viz_obj.get_payload_df(df)
 
             result = dict(metric=payload["data"]["features"][0]["metric"][0])
             result["metric"]["name"] = main_metric.name
@@ -1635,43 +1683,12 @@ class Superset(FoldersApiMixin, BaseSupersetView):
         """Overrides the dashboards using json instances from the file."""
         f = request.files.get('file')
         if request.method == 'POST' and f:
-            current_tt = int(time.time())
             data = json.loads(f.stream.read().decode('utf-8'), object_hook=utils.decode_dashboards)
-            # TODO: import DRUID datasources
-            for table in data['datasources']:
-                type(table).import_obj(table, import_time=current_tt)
-            db.session.commit()
-            old_to_new_dashboard_id_dict = {}
-            dashboard_slices = []
-            for dashboard in data['dashboards'] + data['dd_dashboards']:
-                if isinstance(dashboard.slices, list):
-                    dashboard_slices += dashboard.slices
-                new_dashboard_id = models.Dashboard.import_obj(
-                    dashboard, import_time=current_tt)
-                old_to_new_dashboard_id_dict[dashboard.id] = new_dashboard_id
-            db.session.commit()
-            old_to_new_slc_id_dict, *_ = models.Dashboard.import_slices(
-                import_time=current_tt,
-                import_slices=data['dd_slices'] + dashboard_slices
-            )
-            db.session.commit()
-
-            new_dd_slices = db.session.query(models.Slice).filter(
-                models.Slice.id.in_(old_to_new_slc_id_dict.values())).all()
-            for slc in new_dd_slices:
-                url_drilldowns = deepcopy(slc.params_dict.get('url_drilldowns', []))
-                for index, index_dd_data in enumerate(url_drilldowns):
-                    # в силу ограничении вложенности до 3-х уровней вложенности ссылок url_drilldowns,
-                    # необходима проверка есть ли в импортируемых данных отчет
-                    if index_dd_data['type'] == 'slices' and index_dd_data['url'] in old_to_new_slc_id_dict:
-                        url_drilldowns[index]['url'] = old_to_new_slc_id_dict[index_dd_data['url']]
-                    if index_dd_data['type'] == 'dashboards' and index_dd_data['url'] in old_to_new_dashboard_id_dict:
-                        url_drilldowns[index]['url'] = old_to_new_dashboard_id_dict[index_dd_data['url']]
-                if url_drilldowns:
-                    slc.alter_params(
-                        url_drilldowns=url_drilldowns,
-                    )
-            db.session.commit()
+            report = BulkImport(db.session, import_time=int(time.time())).run(data)
+            flash(', '.join(
+                '{}: {} inserted, {} updated'.format(
+                    kind, report[kind]['inserted'], report[kind]['updated'])
+                for kind in BulkImport.kinds), 'info')
             return redirect('/dashboardmodelview/list/')
         return self.render_template('superset/import_dashboards.html')
 
@@ -1881,6 +1898,8 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             slc = models.Slice(owners=[g.user] if g.user else [])
 
         # column_formats = form_data.pop('column_formats', dict())
+        # saved charts always run exact queries
+        form_data.pop('approximate', None)
         slc.params = json.dumps(form_data)
         slc.datasource_name = datasource_name
         slc.viz_type = form_data['viz_type']
@@ -2009,12 +2028,28 @@ class Superset(FoldersApiMixin, BaseSupersetView):
                 .filter_by(id=db_id)
                 .one()
         )
-        schemas = database.all_schema_names()
+        schemas = database.all_schema_names(
+            force=request.args.get('force') == 'true')
         schemas = security_manager.schemas_accessible_by_user(database, schemas)
         return Response(
             json.dumps({'schemas': schemas}),
             mimetype='application/json')
 
+    @api
+    @has_access_api
+    @expose('/invalidate_catalog/<db_id>/', methods=['POST'])
+    def invalidate_catalog(self, db_id):
+        """Drops the catalog entries of a database, or of one of its
+        schemas (`schema`) or tables (`schema` and `table_name`)"""
+        database = db.session.query(models.Database).filter_by(id=int(db_id)).one()
+        schema = request.form.get('schema') or None
+        table_name = request.form.get('table_name') or None
+        if schema and not security_manager.schemas_accessible_by_user(
+                database, [schema]):
+            return json_error_response(DATASOURCE_ACCESS_ERR, status=403)
+        count = catalog.invalidate(database.id, schema, table_name)
+        return json_success(json.dumps({'invalidated': count}))
+
     @api
     @has_access_api
     @expose('/tables/<db_id>/<schema>/<substr>/')
@@ -2023,11 +2058,12 @@ class Superset(FoldersApiMixin, BaseSupersetView):
         db_id = int(db_id)
         schema = utils.js_string_to_python(schema)
         substr = utils.js_string_to_python(substr)
+        force = request.args.get('force') == 'true'
         database = db.session.query(models.Database).filter_by(id=db_id).one()
         table_names = security_manager.accessible_by_user(
-            database, database.all_table_names(schema), schema)
+            database, database.all_table_names(schema, force=force), schema)
         view_names = security_manager.accessible_by_user(
-            database, database.all_view_names(schema), schema)
+            database, database.all_view_names(schema, force=force), schema)
 
         if substr:
             table_names = [tn for tn in table_names if substr in tn]
@@ -2471,25 +2507,39 @@ class Superset(FoldersApiMixin, BaseSupersetView):
     @has_access_api
     @expose('/warm_up_cache/', methods=['GET'])
     def warm_up_cache(self):
-        """Warms up the cache for the slice or table.
+        """Warms up the cache for the slice, table, dashboard or top slices.
 
-        Note for slices a force refresh occurs.
+        Note for slices a force refresh occurs, identical queries run once and
+        keys still present in the cache are skipped unless `force=true`.
+        With `async=true` the warm-up is handed over to a celery worker.
         """
         slices = None
         session = db.session()
         slice_id = request.args.get('slice_id')
         table_name = request.args.get('table_name')
         db_name = request.args.get('db_name')
+        dashboard_id = request.args.get('dashboard_id', type=int)
+        top_n = request.args.get('top_n', type=int)
+        force = request.args.get('force') == 'true'
+        async_mode = request.args.get('async') == 'true'
 
-        if not slice_id and not (table_name and db_name):
+        if not (slice_id or dashboard_id or top_n) and not (table_name and db_name):
             return json_error_response(__(
-                'Malformed request. slice_id or table_name and db_name '
-                'arguments are expected'), status=400)
+                'Malformed request. slice_id, dashboard_id, top_n or table_name '
+                'and db_name arguments are expected'), status=400)
+        task_kwargs = dict(force=force, user_id=g.user.get_id())
         if slice_id:
             slices = session.query(models.Slice).filter_by(id=slice_id).all()
             if not slices:
                 return json_error_response(__(
                     'Slice %(id)s not found', id=slice_id), status=404)
+            task_kwargs['slice_ids'] = [slc.id for slc in slices]
+        elif dashboard_id:
+            slices = cache_warmup.get_slices(session, dashboard_id=dashboard_id)
+            task_kwargs['dashboard_id'] = dashboard_id
+        elif top_n:
+            slices = cache_warmup.get_slices(session, top_n=top_n)
+            task_kwargs['top_n'] = top_n
         elif table_name and db_name:
             SqlaTable = ConnectorRegistry.sources['table']
             table = (
@@ -2506,16 +2556,18 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             slices = session.query(models.Slice).filter_by(
                 datasource_id=table.id,
                 datasource_type=table.type).all()
+            task_kwargs.update(
+                datasource_id=table.id, datasource_type=table.type)
 
-        for slc in slices:
-            try:
-                obj = slc.get_viz(force=True)
-                obj.get_json()
-            except Exception as e:
-                return json_error_response(utils.error_msg_from_exception(e))
-        return json_success(json.dumps(
-            [{'slice_id': slc.id, 'slice_name': slc.slice_name}
-             for slc in slices]))
+        if async_mode:
+            cache_warmup.warm_up_cache.delay(**task_kwargs)
+            return json_success(json.dumps(
+                [{'slice_id': slc.id, 'slice_name': slc.slice_name}
+                 for slc in slices]), status=202)
+
+        report = cache_warmup.warm_up(
+            slices, force=force, user_id=g.user.get_id())
+        return json_success(json.dumps(report))
 
     @has_access
     @expose('/favstar/<class_name>/<obj_id>/<action>/')
@@ -2580,23 +2632,8 @@ class Superset(FoldersApiMixin, BaseSupersetView):
     def dashboard(self, dashboard_id):
         """Server side rendering for a dashboard"""
         session = db.session()
-        qry = session.query(models.Dashboard)
-
-        if dashboard_id.isdigit():
-            qry = qry.filter_by(id=int(dashboard_id))
-        else:
-            qry = qry.filter_by(slug=dashboard_id)
-
-        dash = qry.one()
-        datasources = set()
-        # viz_type = None
-        for slc in dash.slices:
-            # slc_viz_type = slc.form_data.get('viz_type')
-            # if slc_viz_type in YANDEX_MAP_VISUALIZATIONS:
-            #     viz_type = slc_viz_type
-            datasource = slc.datasource
-            if datasource:
-                datasources.add(datasource)
+        dash = load_dashboard(session, dashboard_id)
+        datasources = preload_datasources(session, dash.slices)
 
         if config.get('ENABLE_ACCESS_REQUEST'):
             for datasource in datasources:
@@ -2618,19 +2655,23 @@ class Superset(FoldersApiMixin, BaseSupersetView):
         dash_edit_perm = check_ownership(dash, raise_if_false=False)
 
         standalone_mode = request.args.get('standalone') == 'true'
+        perm_set = security_manager.get_permission_set()
         dash_save_perm = security_manager.item_has_access(
-            dash, CAN_EDIT, view_name='DashboardModelView'
+            dash, CAN_EDIT, view_name='DashboardModelView', perm_set=perm_set
         )
         dashboard_can_edit = security_manager.can_access(CAN_EDIT, 'DashboardModelView')
         dashboard_can_edit |= dash_save_perm
         dash_favstar_perm = security_manager.can_access(CAN_FAVSTAR, 'Superset')
-        dash_force_update_perm = security_manager.item_has_access(dash, CAN_FORCE_UPDATE)
+        dash_force_update_perm = security_manager.item_has_access(
+            dash, CAN_FORCE_UPDATE, perm_set=perm_set)
 
         if not dash_edit_perm:
-            dash_edit_perm = security_manager.item_has_access(dash, CAN_CONFIG)
+            dash_edit_perm = security_manager.item_has_access(
+                dash, CAN_CONFIG, perm_set=perm_set)
 
         if not dash_favstar_perm:
-            dash_favstar_perm = security_manager.item_has_access(dash, CAN_FAVSTAR)
+            dash_favstar_perm = security_manager.item_has_access(
+                dash, CAN_FAVSTAR, perm_set=perm_set)
 
         dashboard_data = dash.data
         dashboard_data.update({
@@ -2645,7 +2686,7 @@ class Superset(FoldersApiMixin, BaseSupersetView):
         slices_perms = [
             dict(
                 id=slice.id,
-                perms=self.get_available_slice_perms(slice)
+                perms=self.get_available_slice_perms(slice, perm_set=perm_set)
             ) for slice in dash.slices
         ]
 
@@ -2657,7 +2698,7 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             'user_id': g.user.get_id(),
             'user_name': g.user.get_full_name() if not g.user.is_anonymous() else '',
             'dashboard_data': dashboard_data,
-            'datasources': {ds.uid: ds.data if isinstance(ds.data, property) else ds.data() for ds in datasources},
+            'datasources': {ds.uid: get_datasource_data(ds) for ds in datasources},
             'common': self.common_bootsrap_payload(),
             'editMode': request.args.get('edit') == 'true',
         }
@@ -2864,10 +2905,13 @@ class Superset(FoldersApiMixin, BaseSupersetView):
         primary_key = []
         foreign_keys = []
         try:
-            columns = mydb.get_columns(table_name, schema)
-            indexes = mydb.get_indexes(table_name, schema)
-            primary_key = mydb.get_pk_constraint(table_name, schema)
-            foreign_keys = mydb.get_foreign_keys(table_name, schema)
+            metadata = catalog.get_table(
+                mydb, table_name, schema,
+                force=request.args.get('force') == 'true')
+            columns = metadata['columns']
+            indexes = metadata['indexes']
+            primary_key = metadata['primary_key']
+            foreign_keys = metadata['foreign_keys']
         except Exception as e:
             return json_error_response(utils.error_msg_from_exception(e))
         keys = []
@@ -2979,11 +3023,10 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             return json_error_response(get_datasource_access_error_msg(
                 '{}'.format(rejected_tables)))
 
-        payload = utils.zlib_decompress_to_string(blob)
-        display_limit = app.config.get('DISPLAY_SQL_MAX_ROW', None)
-        if display_limit:
-            payload_json = json.loads(payload)
-            payload_json['data'] = payload_json['data'][:display_limit]
+        payload_json = sql_lab.convert_results(
+            json.loads(utils.zlib_decompress_to_string(blob)),
+            request.args.get('format', sql_lab.ResultsFormat.ROWS),
+            limit=app.config.get('DISPLAY_SQL_MAX_ROW', None))
         return json_success(
             json.dumps(payload_json, default=utils.json_iso_dttm_ser))
 
@@ -2998,7 +3041,7 @@ class Superset(FoldersApiMixin, BaseSupersetView):
         for identity in request.json:
             blob = results_backend.get(identity)
             if blob:
-                data[identity] = json.loads(utils.zlib_decompress_to_string(blob))
+                data[identity] = json.loads(async_payloads.load_result(blob))
                 results_backend.delete(identity)
         if not data:
             return json_error_response(
@@ -3018,8 +3061,11 @@ class Superset(FoldersApiMixin, BaseSupersetView):
                 db.session.query(Query)
                     .filter_by(client_id=client_id).one()
             )
+            was_running = query.status == utils.QueryStatus.RUNNING
             query.status = utils.QueryStatus.STOPPED
             db.session.commit()
+            if was_running:
+                query_cancel.cancel(query.database, query_cancel.sql_lab_tag(query))
         except Exception:
             pass
         return self.json_response('OK')
@@ -3092,19 +3138,32 @@ class Superset(FoldersApiMixin, BaseSupersetView):
             return json_error_response(
                 'Template rendering failed: {}'.format(utils.error_msg_from_exception(e)))
 
+        # Expensive queries go to the workers when the database allows it,
+        # only SELECTs are estimated: EXPLAIN could run the other statements
+        # before sql_lab refuses them
+        if (
+                not async and mydb.allow_run_async and results_backend and
+                SupersetQuery(rendered_query).is_select() and
+                query_cost.expected_action(mydb, rendered_query, schema) ==
+                query_cost.CostAction.ASYNC):
+            logging.info('Running an expensive query asynchronously')
+            async = True
+            query.status = QueryStatus.PENDING
+
         # Async request.
         if async:
             logging.info('Running query on a Celery worker')
             # Ignore the celery future object and the request may time out.
             try:
-                sql_lab.get_sql_results.delay(
-                    query_id,
-                    rendered_query,
-                    return_results=False,
-                    store_results=not query.select_as_cta,
-                    user_name=g.user.username,
-                    limit=limit,
-                    offset=offset)
+                sql_lab.get_sql_results.apply_async(
+                    args=[query_id, rendered_query],
+                    kwargs=dict(
+                        return_results=False,
+                        store_results=not query.select_as_cta,
+                        user_name=g.user.username,
+                        limit=limit,
+                        offset=offset),
+                    **task_queues.get_options(mydb, task_queues.Workload.SQL_LAB))
             except Exception as e:
                 logging.exception(e)
                 msg = (
@@ -3137,7 +3196,8 @@ class Superset(FoldersApiMixin, BaseSupersetView):
                     rendered_query,
                     return_results=True,
                     limit=limit,
-                    offset=offset)
+                    offset=offset,
+                    results_format=request.form.get('results_format'))
             payload = json.dumps(
                 data, default=utils.pessimistic_json_iso_dttm_ser)
         except Exception as e:
@@ -3520,13 +3580,14 @@ class Superset(FoldersApiMixin, BaseSupersetView):
 
         return json_error_response(f'Set in config `URL_TO_RENDER_PDF` or `PATH_TO_CHROME_EXE`', status=500)
 
-    def get_available_slice_perms(self, slice):
+    def get_available_slice_perms(self, slice, perm_set=None):
         return [
             perm_name for perm_name in SLICE_DASH_PERMISSIONS
             if security_manager.item_has_access(
                 slice, perm_name, view_name=SliceModelView.__name__
                 if perm_name not in (CAN_EXPLORE, CAN_FORCE_UPDATE)
-                else Superset.__name__
+                else Superset.__name__,
+                perm_set=perm_set,
             )]
 
 
@@ -8,6 +8,7 @@ from collections import defaultdict
 
 from flask import g
 from flask_appbuilder.security.sqla import models as ab_models
+from sqlalchemy.orm import subqueryload
 
 from superset import db, security_manager
 from superset.connectors.sqla.models import SqlaTable
@@ -95,3 +96,31 @@ def create_perm(obj):
 
 def get_metric_expr(metric):
     return str(metric)
+
+
+def load_dashboard(session, dashboard_id):
+    """Loads the dashboard by id or slug together with its slices"""
+    qry = session.query(Dashboard).options(subqueryload(Dashboard.slices))
+    if str(dashboard_id).isdigit():
+        qry = qry.filter_by(id=int(dashboard_id))
+    else:
+        qry = qry.filter_by(slug=dashboard_id)
+    return qry.one()
+
+
+def preload_datasources(session, slices):
+    """Loads the datasources of the slices with one query per datasource type
+
+    Loaded datasources are attached to the slices, so `slc.datasource`
+    doesn't hit the database for every slice.
+    """
+    return set(Slice.preload_datasources(session, slices).values())
+
+
+def get_datasource_data(datasource):
+    """Returns the frontend payload of the datasource
+
+    SqlaTable payloads are cached by the datasource itself under its
+    metadata version (see BaseDatasource.data).
+    """
+    return datasource.data() if callable(datasource.data) else datasource.data
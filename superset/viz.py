@@ -24,7 +24,6 @@ from io import BytesIO
 from itertools import product
 from functools import lru_cache
 
-import geohash
 import numpy as np
 import pandas as pd
 import polyline
@@ -33,7 +32,6 @@ from dateutil import relativedelta as rdelta
 from flask import escape, request, g
 from flask_babel import gettext as __
 from flask_babel import lazy_gettext as _
-from geopy.point import Point
 from markdown import markdown
 from openpyxl.styles.borders import BORDER_THIN, Border
 from openpyxl.utils import get_column_letter
@@ -44,7 +42,9 @@ from six import string_types
 from six.moves import cPickle as pkl, reduce
 
 from sqlalchemy import func, Float, ARRAY, String, text, case, column, Text
-from superset import app, cache, get_css_manifest_files, utils
+from sqlalchemy.sql import literal, select, union_all
+from sqlalchemy.dialects import postgresql
+from superset import app, cache, get_css_manifest_files, spatial, time_buckets, utils
 from superset.formatters import ExtendedHTMLFormatter
 from superset.utils import DTTM_ALIAS, JS_MAX_INTEGER, merge_extra_filters, merge_where
 
@@ -64,6 +64,8 @@ class BaseViz(object):
     is_timeseries = False
     default_fillna = 0
     cache_type = 'df'
+    # whether the results can be cached per time bucket, see `get_incremental_df`
+    incremental_cache = False
 
     def __init__(self, datasource, form_data, force=False):
         if not datasource:
@@ -208,13 +210,10 @@ class BaseViz(object):
         timestamp_format = self.get_timestamp_format(query_obj, session)
 
         # The datasource here can be different backend but the interface is common
-        self.results = self.datasource.query(query_obj, session=session)
-        self.query = self.results.query
-        self.status = self.results.status
-        self.total_found = self.results.total_found
-        self.error_message = self.results.error_message
-
-        df = self.results.df
+        if self.use_incremental_cache(query_obj):
+            df = self.get_incremental_df(query_obj, session=session)
+        else:
+            df = self.query_df(query_obj, session=session)
         # Transform the timestamp we received from database to pandas supported
         # datetime format. If no python_date_format is specified, the pattern will
         # be considered as the default ISO date format
@@ -231,6 +230,148 @@ class BaseViz(object):
 
         return df
 
+    def query_df(self, query_obj, session=None):
+        """Runs the query on the datasource, returns the raw dataframe"""
+        self.results = self.datasource.query(query_obj, session=session)
+        self.query = self.results.query
+        self.status = self.results.status
+        self.total_found = self.results.total_found
+        self.error_message = self.results.error_message
+        return self.results.df
+
+    def use_incremental_cache(self, query_obj):
+        """Whether the query can be answered bucket by bucket
+
+        Series limits, paging and cumulative metrics depend on the whole
+        range, those queries are never split. Row limits are checked once
+        the buckets are read (see `get_incremental_df`).
+        """
+        if not (
+                self.incremental_cache and
+                config.get('INCREMENTAL_CACHE_ENABLED') and
+                cache and
+                not self.force and
+                self.datasource.type == 'table'):
+            return False
+        if not (
+                query_obj.get('is_timeseries') and
+                query_obj.get('granularity') and
+                query_obj.get('from_dttm') and
+                query_obj.get('to_dttm')):
+            return False
+        if (
+                query_obj.get('timeseries_limit') or
+                query_obj.get('page_length') or
+                query_obj.get('prequeries') or
+                query_obj.get('is_prequery')):
+            return False
+        if self.has_cumulative_total(query_obj):
+            return False
+        return time_buckets.is_supported(
+            (query_obj.get('extras') or {}).get('time_grain_sqla'),
+            self.week_starts_monday())
+
+    def week_starts_monday(self):
+        database = getattr(self.datasource, 'database', None)
+        return bool(database and database.db_engine_spec.week_starts_monday)
+
+    @staticmethod
+    def has_cumulative_total(query_obj):
+        return any(
+            utils.is_adhoc_metric(m) and m.get('cumulativeTotal')
+            for m in query_obj.get('metrics') or [])
+
+    def get_time_buckets(self, query_obj):
+        """Query objects of the time buckets of `query_obj`
+
+        Returns (query_obj, whole) pairs, or None when the range would be
+        split in too many buckets.
+        """
+        extras = query_obj.get('extras') or {}
+        buckets = time_buckets.split(
+            query_obj['from_dttm'],
+            query_obj['to_dttm'],
+            extras.get('time_grain_sqla'),
+            timedelta(seconds=config.get('INCREMENTAL_CACHE_MIN_BUCKET')))
+        if len(buckets) > config.get('INCREMENTAL_CACHE_MAX_BUCKETS'):
+            return None
+        pieces = []
+        for i, bucket in enumerate(buckets):
+            piece = dict(query_obj, from_dttm=bucket.start, to_dttm=bucket.end)
+            # rows on a boundary belong to the next bucket
+            piece['extras'] = dict(
+                extras, exclusive_to_dttm=i < len(buckets) - 1)
+            pieces.append((piece, bucket.whole))
+        return pieces
+
+    def bucket_cache_key(self, query_obj):
+        """Cache key of a time bucket, made of its absolute bounds"""
+        cache_dict = dict(query_obj)
+        # only used by series limits, buckets are shared with shifted queries
+        for k in ['inner_from_dttm', 'inner_to_dttm']:
+            cache_dict.pop(k, None)
+        cache_dict['user_id'] = getattr(getattr(g, 'user', None), 'id', None)
+        cache_dict['datasource'] = self.datasource.uid
+        cache_dict['time_bucket'] = True
+        json_data = self.json_dumps(cache_dict, sort_keys=True)
+        return hashlib.md5(json_data.encode('utf-8')).hexdigest()
+
+    def get_incremental_df(self, query_obj, session=None):
+        """Raw dataframe of `query_obj` assembled from its time buckets
+
+        Whole buckets are read from the cache, the missing ones and the
+        ones still open are queried, whole buckets are then cached. When
+        the buckets reach the row limit the query is run unsplit.
+        """
+        pieces = self.get_time_buckets(query_obj)
+        if pieces is None:
+            return self.query_df(query_obj, session=session)
+
+        keys = [self.bucket_cache_key(piece) if whole else None for piece, whole in pieces]
+        cached_keys = [key for key in keys if key]
+        cached = dict(zip(cached_keys, cache.get_many(*cached_keys))) if cached_keys else {}
+
+        frames = []
+        queries = []
+        for (piece, _), key in zip(pieces, keys):
+            if cached.get(key):
+                try:
+                    frames.append(pkl.loads(cached[key]))
+                    stats_logger.incr('loaded_bucket_from_cache')
+                    continue
+                except Exception as e:
+                    logging.exception(e)
+            df = self.query_df(piece, session=session)
+            if self.status == utils.QueryStatus.FAILED:
+                return None
+            queries.append(self.query)
+            if df is None:
+                df = pd.DataFrame()
+            if key:
+                try:
+                    stats_logger.incr('set_bucket_cache_key')
+                    cache.set(
+                        key,
+                        pkl.dumps(df, protocol=pkl.HIGHEST_PROTOCOL),
+                        timeout=self.cache_timeout)
+                except Exception as e:
+                    logging.warning('Could not cache key {}'.format(key))
+                    logging.exception(e)
+            frames.append(df)
+
+        frames = [f for f in frames if not f.empty]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        self.query = ';\n\n'.join(queries)
+        self.status = utils.QueryStatus.SUCCESS
+        self.total_found = len(df)
+        row_limit = query_obj.get('row_limit')
+        if row_limit and len(df.index) >= row_limit:
+            # the whole query would be cut by its limit, after its ORDER BY,
+            # which picks other rows than the limits of the buckets
+            stats_logger.incr('incremental_cache_row_limit')
+            return self.query_df(query_obj, session=session)
+        return df
+
     @staticmethod
     def df_metrics_to_num(df, metrics):
         """Converting metrics to numeric when pandas.read_sql cannot"""
@@ -325,6 +466,9 @@ class BaseViz(object):
             'time_grain_sqla': form_data.get('time_grain_sqla', ''),
             'druid_time_origin': form_data.get('druid_time_origin', ''),
         }
+        if self.is_approximate:
+            # also keeps approximate results apart in the cache
+            extras['approximate'] = True
         filters = form_data.get('filters', [])
         d = {
             'granularity': granularity,
@@ -542,8 +686,17 @@ class BaseViz(object):
             'status': self.status,
             'stacktrace': stacktrace,
             'rowcount': len(df.index) if df is not None else 0,
+            'is_approximate': self.is_approximate,
         }
 
+    @property
+    def is_approximate(self):
+        """Whether the request asked for fast, approximate results
+
+        Only tables have an approximate mode, see SqlaTable.get_sqla_query.
+        """
+        return bool(self.form_data.get('approximate')) and self.datasource.type == 'table'
+
     def json_dumps(self, obj, sort_keys=False):
         return json.dumps(
             obj,
@@ -742,6 +895,7 @@ class TimeTableViz(BaseViz):
     verbose_name = _('Time Table View')
     credits = 'a <a href="https://github.com/airbnb/superset">Superset</a> original'
     is_timeseries = True
+    incremental_cache = True
 
     def query_obj(self):
         d = super(TimeTableViz, self).query_obj()
@@ -1255,13 +1409,34 @@ class TreemapViz(BaseViz):
     is_timeseries = False
 
     def _nest(self, metric, df):
+        """Builds the tree in one pass over the rows sorted by their parents
+
+        Parents are sorted like the index levels, leaves keep the order
+        of the rows.
+        """
         nlevels = df.index.nlevels
         if nlevels == 1:
-            result = [{'name': n, 'value': v}
-                      for n, v in zip(df.index, df[metric])]
-        else:
-            result = [{'name': l, 'children': self._nest(metric, df.loc[l])}
-                      for l in df.index.levels[0]]
+            return [{'name': n, 'value': v}
+                    for n, v in zip(df.index, df[metric])]
+        codes = [
+            pd.factorize(df.index.get_level_values(i), sort=True)[0]
+            for i in range(nlevels - 1)
+        ]
+        keys = list(df.index)
+        values = df[metric].values
+        result = []
+        nodes = {}
+        for pos in np.lexsort(codes[::-1]):
+            key = keys[pos]
+            children = result
+            for depth in range(1, nlevels):
+                node = nodes.get(key[:depth])
+                if node is None:
+                    node = nodes[key[:depth]] = {
+                        'name': key[depth - 1], 'children': []}
+                    children.append(node)
+                children = node['children']
+            children.append({'name': key[-1], 'value': values[pos]})
         return result
 
     def get_data(self, df, session=None):
@@ -1279,6 +1454,7 @@ class CalHeatmapViz(BaseViz):
     credits = (
         '<a href=https://github.com/wa0x6e/cal-heatmap>cal-heatmap</a>')
     is_timeseries = True
+    incremental_cache = True
 
     def get_data(self, df, session=None):
         form_data = self.form_data
@@ -1335,84 +1511,89 @@ class BoxPlotViz(NVD3Viz):
     sort_series = False
     is_timeseries = True
 
-    def to_series(self, df, classed='', title_suffix=''):
+    def to_series(self, index, stats):
+        """NVD3 boxes of every group and metric
+
+        `stats` maps the metrics to their Q1, Q2, Q3, whisker_high,
+        whisker_low and outliers lists, aligned with the groups of `index`.
+        """
         label_sep = ' - '
+        multiple_metrics = len(self.form_data.get('metrics')) > 1
         chart_data = []
-        for index_value, row in zip(df.index, df.to_dict(orient='records')):
+        for i, index_value in enumerate(index):
             if isinstance(index_value, tuple):
                 index_value = label_sep.join(index_value)
-            boxes = defaultdict(dict)
-            for (label, key), value in row.items():
-                if key == 'median':
-                    key = 'Q2'
-                boxes[label][key] = value
-            for label, box in boxes.items():
-                if len(self.form_data.get('metrics')) > 1:
-                    # need to render data labels with metrics
-                    chart_label = label_sep.join([index_value, label])
-                else:
-                    chart_label = index_value
+            for label, box in stats.items():
                 chart_data.append({
-                    'label': chart_label,
-                    'values': box,
+                    # need to render data labels with metrics
+                    'label': (
+                        label_sep.join([index_value, label])
+                        if multiple_metrics else index_value),
+                    'values': {key: values[i] for key, values in box.items()},
                 })
         return chart_data
 
     def get_data(self, df, session=None):
+        """Quantiles are computed once for all the groups, whiskers and
+        outliers with masks over the raw values of the groups"""
         form_data = self.form_data
         df = df.fillna(0)
+        groupby = form_data.get('groupby')
+        value_columns = utils.get_metric_names(form_data.get('metrics'))
 
-        # conform to NVD3 names
-        def Q1(series):  # need to be named functions - can't use lambdas
-            return np.percentile(series, 25)
-
-        def Q3(series):
-            return np.percentile(series, 75)
-
+        percentiles = [25, 50, 75]
         whisker_type = form_data.get('whisker_options')
-        if whisker_type == 'Tukey':
-
-            def whisker_high(series):
-                upper_outer_lim = Q3(series) + 1.5 * (Q3(series) - Q1(series))
-                series = series[series <= upper_outer_lim]
-                return series[np.abs(series - upper_outer_lim).argmin()]
-
-            def whisker_low(series):
-                lower_outer_lim = Q1(series) - 1.5 * (Q3(series) - Q1(series))
-                # find the closest value above the lower outer limit
-                series = series[series >= lower_outer_lim]
-                return series[np.abs(series - lower_outer_lim).argmin()]
-
-        elif whisker_type == 'Min/max (no outliers)':
-
-            def whisker_high(series):
-                return series.max()
-
-            def whisker_low(series):
-                return series.min()
-
-        elif ' percentiles' in whisker_type:
+        if whisker_type and ' percentiles' in whisker_type:
             low, high = whisker_type.replace(' percentiles', '').split('/')
-
-            def whisker_high(series):
-                return np.percentile(series, int(high))
-
-            def whisker_low(series):
-                return np.percentile(series, int(low))
-
-        else:
+            low, high = int(low), int(high)
+            percentiles = sorted(set(percentiles + [low, high]))
+        elif whisker_type not in ('Tukey', 'Min/max (no outliers)'):
             raise ValueError('Unknown whisker type: {}'.format(whisker_type))
 
-        def outliers(series):
-            above = series[series > whisker_high(series)]
-            below = series[series < whisker_low(series)]
-            # pandas sometimes doesn't like getting lists back here
-            return set(above.tolist() + below.tolist())
-
-        aggregate = [Q1, np.median, Q3, whisker_high, whisker_low, outliers]
-        df = df.groupby(form_data.get('groupby')).agg(aggregate)
-        chart_data = self.to_series(df, session=session)
-        return chart_data
+        gb = df.groupby(groupby)
+        codes = gb.ngroup().values
+        quantiles = gb[value_columns].quantile(
+            [p / 100 for p in percentiles]).unstack()
+        groups = range(len(quantiles.index))
+
+        stats = {}
+        for col in value_columns:
+            q = {p: quantiles[(col, p / 100)].values for p in percentiles}
+            values = df[col].values
+            if whisker_type == 'Tukey':
+                iqr = q[75] - q[25]
+                upper = (q[75] + 1.5 * iqr)[codes]
+                lower = (q[25] - 1.5 * iqr)[codes]
+                # closest values inside the limits
+                whisker_high = pd.Series(
+                    np.where(values <= upper, values, np.nan)
+                ).groupby(codes).max().reindex(groups).values
+                whisker_low = pd.Series(
+                    np.where(values >= lower, values, np.nan)
+                ).groupby(codes).min().reindex(groups).values
+            elif whisker_type == 'Min/max (no outliers)':
+                whisker_high = df[col].groupby(codes).max().reindex(groups).values
+                whisker_low = df[col].groupby(codes).min().reindex(groups).values
+            else:
+                whisker_high, whisker_low = q[high], q[low]
+
+            mask = (values > whisker_high[codes]) | (values < whisker_low[codes])
+            outliers = (
+                pd.DataFrame({'group': codes[mask], 'value': values[mask]})
+                .drop_duplicates()
+                .sort_values(['group', 'value'])
+                .groupby('group')['value']
+                .apply(lambda group_values: group_values.tolist())
+            )
+            stats[col] = {
+                'Q1': q[25].tolist(),
+                'Q2': q[50].tolist(),
+                'Q3': q[75].tolist(),
+                'whisker_high': whisker_high.tolist(),
+                'whisker_low': whisker_low.tolist(),
+                'outliers': [outliers.get(i, []) for i in groups],
+            }
+        return self.to_series(quantiles.index, stats)
 
 
 class BubbleViz(NVD3Viz):
@@ -1573,6 +1754,9 @@ class NVD3TimeSeriesViz(NVD3Viz):
     verbose_name = _('Time Series - Line Chart')
     sort_series = False
     is_timeseries = True
+    incremental_cache = True
+    # main payload, read along with the `time_compare` one
+    _time_compare_payload = None
 
     def to_series(self, df, classed='', title_suffix=''):
         cols = []
@@ -1629,21 +1813,23 @@ class NVD3TimeSeriesViz(NVD3Viz):
             chart_data.append(d)
         return chart_data
 
-    def process_data(self, df, aggregate=False):
+    def process_data(self, df, aggregate=False, groupby=None):
         fd = self.form_data
         if fd.get('granularity') == 'all':
             raise Exception(_('Pick a time granularity for your time series'))
+        if groupby is None:
+            groupby = fd.get('groupby')
         if not aggregate:
             df = df.pivot_table(
                 index=DTTM_ALIAS,
-                columns=fd.get('groupby'),
+                columns=groupby,
                 values=utils.get_metric_names(fd.get('metrics', [])),
                 margins_name=__('All')
             )
         else:
             df = df.pivot_table(
                 index=DTTM_ALIAS,
-                columns=fd.get('groupby'),
+                columns=groupby,
                 values=utils.get_metric_names(fd.get('metrics', [])),
                 fill_value=0,
                 aggfunc=sum,
@@ -1714,6 +1900,10 @@ class NVD3TimeSeriesViz(NVD3Viz):
                 raise Exception(_(
                     '`Since` and `Until` time bounds should be specified '
                     'when using the `Time Shift` feature.'))
+            if (
+                    self.can_union_time_compare(query_object, delta) and
+                    self.run_time_compare_union(query_object, delta)):
+                return
             query_object['from_dttm'] -= delta
             query_object['to_dttm'] -= delta
 
@@ -1724,6 +1914,78 @@ class NVD3TimeSeriesViz(NVD3Viz):
                 self._extra_chart_data = self.to_series(
                     df2, classed='superset', title_suffix='---')
 
+    def can_union_time_compare(self, query_obj, delta):
+        """Whether the main and the shifted windows can be read in one query
+
+        The windows have to overlap, and the bounds the union is sliced at
+        have to fall on grain boundaries, so no grain is split between them.
+        """
+        from_dttm = query_obj['from_dttm']
+        shifted_to_dttm = query_obj['to_dttm'] - delta
+        if not (
+                config.get('TIME_COMPARE_UNION') and
+                self.datasource.type == 'table' and
+                timedelta(0) < delta and
+                from_dttm < shifted_to_dttm):
+            return False
+        if (
+                query_obj.get('timeseries_limit') or
+                query_obj.get('page_length') or
+                self.has_cumulative_total(query_obj)):
+            return False
+        grain = query_obj['extras'].get('time_grain_sqla')
+        if not grain:
+            return True
+        # weeks are aligned on Mondays, which only some engines truncate to
+        if not time_buckets.is_supported(grain, self.week_starts_monday()):
+            return False
+        splitter = time_buckets.Splitter(grain, timedelta(0))
+        return all(
+            splitter.floor(dttm) == dttm for dttm in (from_dttm, shifted_to_dttm))
+
+    def run_time_compare_union(self, query_obj, delta):
+        """Queries the union of the main and the shifted windows
+
+        The main frame is kept for `get_df_payload`, the shifted one is
+        processed right away. The shifted window excludes its end. Returns
+        False when the union hit its row limit: the windows may then have
+        lost rows unevenly and have to be queried on their own.
+        """
+        from_dttm = query_obj['from_dttm']
+        shifted_to_dttm = query_obj['to_dttm'] - delta
+        row_limit = query_obj.get('row_limit')
+        union_obj = dict(query_obj, from_dttm=from_dttm - delta)
+        if row_limit:
+            # both windows come from the same rows
+            union_obj['row_limit'] = row_limit * 2
+        payload = self.get_df_payload(union_obj)
+        df = payload.get('df')
+        if row_limit and df is not None and len(df.index) >= row_limit * 2:
+            return False
+        self._time_compare_payload = payload
+        if df is None or df.empty:
+            return True
+
+        offset = timedelta(hours=self.datasource.offset or 0)
+        df2 = df[df[DTTM_ALIAS] < shifted_to_dttm + offset].copy()
+        payload['df'] = df[df[DTTM_ALIAS] >= from_dttm + offset].reset_index(drop=True)
+        if row_limit:
+            payload['df'] = payload['df'].head(row_limit)
+            df2 = df2.head(row_limit)
+        payload['rowcount'] = len(payload['df'].index)
+        if not df2.empty:
+            df2[DTTM_ALIAS] += delta
+            df2 = self.process_data(df2)
+            self._extra_chart_data = self.to_series(
+                df2, classed='superset', title_suffix='---')
+        return True
+
+    def get_df_payload(self, query_obj=None, session=None):
+        if query_obj is None and self._time_compare_payload is not None:
+            payload, self._time_compare_payload = self._time_compare_payload, None
+            return payload
+        return super(NVD3TimeSeriesViz, self).get_df_payload(query_obj, session=session)
+
     def get_data(self, df, session=None):
         for column in df.columns:
             if is_datetime64_any_dtype(df[column]):
@@ -2380,21 +2642,43 @@ class HeatmapViz(BaseViz):
         if norm == 'heatmap':
             overall = True
         else:
-            gb = df.groupby(norm, group_keys=False)
+            gb = df.groupby(norm)
             if len(gb) <= 1:
                 overall = True
             else:
-                df['perc'] = (
-                    gb.apply(
-                        lambda x: (x.v - x.v.min()) / (x.v.max() - x.v.min()))
-                )
+                group_min = gb.v.transform('min')
+                group_max = gb.v.transform('max')
+                df['perc'] = (df.v - group_min) / (group_max - group_min)
         if overall:
             df['perc'] = (df.v - min_) / (max_ - min_)
+        if fd.get('heatmap_format') == 'matrix':
+            return self.get_matrix(df, [min_, max_])
         return {
             'records': df.to_dict(orient='records'),
             'extents': [min_, max_],
         }
 
+    @staticmethod
+    def get_matrix(df, extents):
+        """Dense format: sorted x and y labels, `values` and `perc` are
+        len(y) x len(x) matrices with nulls for the missing cells"""
+        x_codes, x_labels = pd.factorize(df.x, sort=True)
+        y_codes, y_labels = pd.factorize(df.y, sort=True)
+        shape = (len(y_labels), len(x_labels))
+        values = np.full(shape, np.nan)
+        perc = np.full(shape, np.nan)
+        valid = (x_codes >= 0) & (y_codes >= 0)
+        cells = (y_codes[valid], x_codes[valid])
+        values[cells] = pd.to_numeric(df.v, errors='coerce').values[valid]
+        perc[cells] = df.perc.values[valid]
+        return {
+            'x': x_labels.tolist(),
+            'y': y_labels.tolist(),
+            'values': values.tolist(),
+            'perc': perc.tolist(),
+            'extents': extents,
+        }
+
 
 class HorizonViz(NVD3TimeSeriesViz):
     """Horizon chart
@@ -2409,7 +2693,116 @@ class HorizonViz(NVD3TimeSeriesViz):
         'd3-horizon-chart</a>')
 
 
-class MapboxViz(BaseViz):
+class SpatialTilesMixin(object):
+    """Tiled spatial aggregation for the map visualizations
+
+    Enabled by `spatial_tiles` in form_data:
+    {"bounds": [west, south, east, north], "zoom": 10,
+     "cells": "grid" | "geohash", "known_tiles": [quadkey, ...]}
+
+    The viewport is split in quadkey tiles, points of every tile are
+    aggregated in at most SPATIAL_TILE_CELLS x SPATIAL_TILE_CELLS cells
+    in SQL (NumPy for non SQL datasources) and every tile is cached on its
+    own under the viz cache key. Tiles listed in `known_tiles` are already
+    on the client and are not returned.
+    """
+
+    def get_spatial_columns(self):
+        """Returns the (longitude, latitude) columns of the query"""
+        raise NotImplementedError()
+
+    def get_spatial_weight(self):
+        """Returns the column summed in every cell, if any"""
+        return None
+
+    def get_payload(self, query_obj=None, session=None):
+        if self.form_data.get('spatial_tiles'):
+            return self.get_tiles_payload(query_obj, session=session)
+        return super(SpatialTilesMixin, self).get_payload(query_obj, session=session)
+
+    def get_tiles_payload(self, query_obj=None, session=None):
+        tiles_fd = self.form_data.get('spatial_tiles') or {}
+        if not query_obj:
+            query_obj = self.query_obj()
+        cache_key = self.cache_key(query_obj)
+        cells = int(tiles_fd.get('cells_per_tile') or config.get('SPATIAL_TILE_CELLS', 32))
+        cells = min(cells, config.get('SPATIAL_TILE_CELLS', 32))
+        cell_type = tiles_fd.get('cells') or 'grid'
+        known_tiles = set(tiles_fd.get('known_tiles') or [])
+        tiles = {}
+        quadkeys = []
+        stacktrace = None
+        try:
+            quadkeys = spatial.tiles_for_bounds(
+                [float(v) for v in tiles_fd['bounds']],
+                float(tiles_fd.get('zoom') or 0),
+                max_tiles=config.get('SPATIAL_MAX_TILES', 16))
+            for quadkey in quadkeys:
+                if quadkey not in known_tiles:
+                    tiles[quadkey] = self.get_tile(
+                        quadkey, query_obj, cache_key, cells, cell_type, session=session)
+            self.status = utils.QueryStatus.SUCCESS
+        except Exception as e:
+            logging.exception(e)
+            self.error_message = escape('{}'.format(e))
+            self.status = utils.QueryStatus.FAILED
+            stacktrace = traceback.format_exc()
+        return {
+            'cache_key': cache_key,
+            'cache_timeout': self.cache_timeout,
+            'error': self.error_message,
+            'form_data': self.form_data,
+            'query': self.query,
+            'status': self.status,
+            'stacktrace': stacktrace,
+            'quadkeys': quadkeys,
+            'tiles': tiles,
+            'data': {'mapboxApiKey': config.get('MAPBOX_API_KEY')},
+        }
+
+    def get_tile(self, quadkey, query_obj, cache_key, cells, cell_type, session=None):
+        tile_key = '{}_tile_{}_{}_{}'.format(cache_key, cell_type, cells, quadkey)
+        if cache and not self.force:
+            data = cache.get(tile_key)
+            if data is not None:
+                stats_logger.incr('loaded_tile_from_cache')
+                return data
+
+        bounds = spatial.quadkey_to_bounds(quadkey)
+        lon, lat = self.get_spatial_columns()
+        weight = self.get_spatial_weight()
+        if self.datasource.type == 'table':
+            query_obj = dict(query_obj, row_limit=None)
+            sql = spatial.tile_aggregate_sql(
+                self.datasource.database,
+                self.datasource.get_query_str(query_obj, session=session),
+                lon, lat, bounds, cells, weight=weight, cell_type=cell_type)
+            self.query = sql
+            # same guardrails as the chart queries
+            df, error_message = self.datasource.run_chart_sql(sql)
+            if error_message:
+                raise Exception(error_message)
+            data = {col: df[col].tolist() for col in df.columns}
+        else:
+            if getattr(self, '_spatial_df', None) is None:
+                self._spatial_df = self.get_df(query_obj, session=session)
+            df = self._spatial_df
+            data = spatial.grid_aggregate(
+                pd.to_numeric(df[lon], errors='coerce'),
+                pd.to_numeric(df[lat], errors='coerce'),
+                bounds, cells, df[weight] if weight else None)
+        stats_logger.incr('loaded_tile_from_source')
+
+        if cache:
+            try:
+                cache.set(tile_key, data, timeout=self.cache_timeout)
+            except Exception as e:
+                logging.warning('Could not cache key {}'.format(tile_key))
+                logging.exception(e)
+        return data
+
+
+class MapboxViz(SpatialTilesMixin, BaseViz):
     """Rich maps made with Mapbox"""
 
     viz_type = 'mapbox'
@@ -2514,6 +2907,9 @@ class MapboxViz(BaseViz):
             'color': fd.get('mapbox_color'),
         }
 
+    def get_spatial_columns(self):
+        return self.form_data.get('all_columns_x'), self.form_data.get('all_columns_y')
+
 
 class DeckGLMultiLayer(BaseViz):
     """Pile on multiple DeckGL layers"""
@@ -2540,7 +2936,7 @@ class DeckGLMultiLayer(BaseViz):
         }
 
 
-class BaseDeckGLViz(BaseViz):
+class BaseDeckGLViz(SpatialTilesMixin, BaseViz):
     """Base class for deck.gl visualizations"""
 
     is_timeseries = False
@@ -2565,34 +2961,53 @@ class BaseDeckGLViz(BaseViz):
             group_by += [spatial.get('geohashCol')]
 
     def process_spatial_data_obj(self, key, df):
-        spatial = self.form_data.get(key)
-        if spatial is None:
+        spatial_fd = self.form_data.get(key)
+        if spatial_fd is None:
             raise ValueError(_('Bad spatial key'))
-        if spatial.get('type') == 'latlong':
-            df[key] = list(zip(
-                pd.to_numeric(df[spatial.get('lonCol')], errors='coerce'),
-                pd.to_numeric(df[spatial.get('latCol')], errors='coerce'),
-            ))
-        elif spatial.get('type') == 'delimited':
+        if spatial_fd.get('type') == 'latlong':
+            first = pd.to_numeric(df[spatial_fd.get('lonCol')], errors='coerce').values
+            second = pd.to_numeric(df[spatial_fd.get('latCol')], errors='coerce').values
+        elif spatial_fd.get('type') == 'delimited':
+            first, second = spatial.parse_delimited(df[spatial_fd.get('lonlatCol')])
+            if spatial_fd.get('reverseCheckbox'):
+                first, second = second, first
+            del df[spatial_fd.get('lonlatCol')]
+        elif spatial_fd.get('type') == 'geohash':
+            first, second = spatial.geohash_decode(df[spatial_fd.get('geohashCol')])
+            del df[spatial_fd.get('geohashCol')]
+        else:
+            return df
+        self.spatial_arrays[key] = (first, second)
+        if not self.is_columnar_format:
+            df[key] = list(zip(first, second))
+        return df
 
-            def tupleify(s):
-                p = Point(s)
-                return (p.latitude, p.longitude)
+    @property
+    def is_columnar_format(self):
+        return self.form_data.get('feature_format') in ('columnar', 'binary')
 
-            df[key] = df[spatial.get('lonlatCol')].apply(tupleify)
+    def get_columnar_data(self, df):
+        """Opt-in columnar features (`feature_format` in form_data)
 
-            if spatial.get('reverseCheckbox'):
-                df[key] = [
-                    tuple(reversed(o)) if isinstance(o, (list, tuple)) else (0, 0)
-                    for o in df[key]
-                ]
-            del df[spatial.get('lonlatCol')]
-        elif spatial.get('type') == 'geohash':
-            latlong = df[spatial.get('geohashCol')].map(geohash.decode)
-            df[key] = list(zip(latlong.apply(lambda x: x[0]),
-                               latlong.apply(lambda x: x[1])))
-            del df[spatial.get('geohashCol')]
-        return df
+        Positions and the other columns are sent as arrays of the same
+        length instead of a dict per feature, with `binary` numeric
+        arrays are base64 encoded typed buffers.
+        """
+        binary = self.form_data.get('feature_format') == 'binary'
+        columns = {
+            col: df[col] for col in df.columns
+            if col not in self.spatial_arrays
+        }
+        return {
+            'format': self.form_data.get('feature_format'),
+            'length': len(df.index),
+            'positions': {
+                key: spatial.encode_columns({'x': first, 'y': second}, binary=binary)
+                for key, (first, second) in self.spatial_arrays.items()
+            },
+            'columns': spatial.encode_columns(columns, binary=binary),
+            'mapboxApiKey': config.get('MAPBOX_API_KEY'),
+        }
 
     def query_obj(self):
         d = super(BaseDeckGLViz, self).query_obj()
@@ -2623,9 +3038,13 @@ class BaseDeckGLViz(BaseViz):
     def get_data(self, df, session=None):
         if df is None:
             return None
+        self.spatial_arrays = {}
         for key in self.spatial_control_keys:
             df = self.process_spatial_data_obj(key, df)
 
+        if self.is_columnar_format:
+            return self.get_columnar_data(df)
+
         features = []
         for d in df.to_dict(orient='records'):
             feature = self.get_properties(d)
@@ -2642,6 +3061,20 @@ class BaseDeckGLViz(BaseViz):
     def get_properties(self, d):
         raise NotImplementedError()
 
+    def get_spatial_columns(self):
+        spatial_keys = self.spatial_control_keys or ['spatial']
+        spatial_fd = self.form_data.get(spatial_keys[0]) or {}
+        if spatial_fd.get('type') != 'latlong':
+            raise ValueError(_(
+                'Tiled mode requires separate longitude and latitude columns'))
+        return spatial_fd.get('lonCol'), spatial_fd.get('latCol')
+
+    def get_spatial_weight(self):
+        metric = getattr(self, 'metric', None)
+        if isinstance(metric, dict):
+            return metric.get('label')
+        return metric
+
 
 class DeckScatterViz(BaseDeckGLViz):
     """deck.gl's ScatterLayer"""
@@ -2749,13 +3182,78 @@ class BubbleMapVisualization(DeckScatterViz):
         return query_obj
 
     def get_area_join(self, query_columns):
+        from superset.models.core import GeoPoligonArea
+
+        lat_field = '{' + self.lat_field + '}'
+        lng_field = '{' + self.lng_field + '}'
+
+        # without PostGIS in the metadata database the polygons are built
+        # from the JSON content by every query
+        if GeoPoligonArea.has_geometries():
+            polygons_with_center_coords = self.get_area_polygons()
+        else:
+            polygons_with_center_coords = self.get_content_polygons()
+
+        onclause = func.st_contains(
+            text(polygons_with_center_coords.c.polygon.name),
+            func.st_makepoint(text(lat_field), text(lng_field))
+        )
+        replace_lat = case(
+            [(column('center_coords')==None, text(lat_field))],
+            else_=column('center_coords', type_=ARRAY(item_type=String))[1].cast(Float))
+        replace_lng = case(
+            [(column('center_coords')==None, text(lng_field))],
+            else_=column('center_coords', type_=ARRAY(item_type=String))[2].cast(Float))
+
+        return {
+            'join_with': str(polygons_with_center_coords.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})),
+            'on': str(onclause.compile(compile_kwargs={"literal_binds": True})),
+            'columns': ['center_coords', 'polygon'],
+            'query_columns': query_columns,
+            'replace_query_columns': {
+                self.lat_field: str(replace_lat.compile(compile_kwargs={'literal_binds': True})),
+                self.lng_field: str(replace_lng.compile(compile_kwargs={'literal_binds': True}))
+            }
+        }
+
+    @staticmethod
+    def get_area_points(aggregates):
+        """Derived table mapping the key of every point of the aggregates to
+        the index of its area, None without points"""
+        area_points = [
+            select([
+                literal(''.join([
+                    str(point["latitude"]["value"]),
+                    str(point["longitude"]["value"]),
+                    str(point["pointName"]["value"]),
+                ])).label('point_key'),
+                literal(index).label('area_index'),
+            ])
+            for index, aggregate in enumerate(aggregates)
+            for point in aggregate["points"]
+        ]
+        if not area_points:
+            return None
+        return union_all(*area_points).alias('areas')
+
+    def get_area_polygons(self):
+        """Areas of the polygon precomputed (and GiST indexed) in geo_poligon_areas"""
+        from superset import db
+        from superset.models.core import GeoPoligonArea
+
+        return db.session.query(
+            postgresql.array([GeoPoligonArea.center_x, GeoPoligonArea.center_y]).label('center_coords'),
+            GeoPoligonArea.geom.label('polygon')
+        ).filter(GeoPoligonArea.polygon_id == self.polygon_id).subquery('polygons_with_center_coords')
+
+    def get_content_polygons(self):
+        """Areas of the polygon built from GeoPoligons.content by the query"""
         from superset import db
         from superset.models.core import GeoPoligons
         session = db.session
 
         coords_separator = ','
-        lat_field = '{' + self.lat_field + '}'
-        lng_field = '{' + self.lng_field + '}'
 
         areas_subq = session.query(
             func.json_array_elements(GeoPoligons.content).op('->')('center').op('->>')(0).label('center_x'),
@@ -2783,33 +3281,11 @@ class BubbleMapVisualization(DeckScatterViz):
             ).label('polygon')
         ).group_by(areas_with_coordinates_subq.c.center).subquery('area_polygons')
 
-        polygons_with_center_coords = session.query(
+        return session.query(
             func.string_to_array(areas_with_polygons.c.center, coords_separator).label('center_coords'),
             areas_with_polygons.c.polygon
         ).subquery('polygons_with_center_coords')
 
-        onclause = func.st_contains(
-            text(polygons_with_center_coords.c.polygon.name),
-            func.st_makepoint(text(lat_field), text(lng_field))
-        )
-        replace_lat = case(
-            [(column('center_coords')==None, text(lat_field))],
-            else_=column('center_coords', type_=ARRAY(item_type=String))[1].cast(Float))
-        replace_lng = case(
-            [(column('center_coords')==None, text(lng_field))],
-            else_=column('center_coords', type_=ARRAY(item_type=String))[2].cast(Float))
-
-        return {
-            'join_with': str(polygons_with_center_coords.compile(compile_kwargs={"literal_binds": True})),
-            'on': str(onclause.compile(compile_kwargs={"literal_binds": True})),
-            'columns': ['center_coords', 'polygon'],
-            'query_columns': query_columns,
-            'replace_query_columns': {
-                self.lat_field: str(replace_lat.compile(compile_kwargs={'literal_binds': True})),
-                self.lng_field: str(replace_lng.compile(compile_kwargs={'literal_binds': True}))
-            }
-        }
-
     def get_metrics(self):
         return self.form_data.get('metrics', list())
 
@@ -2857,6 +3333,15 @@ class BubbleMapVisualization(DeckScatterViz):
     def get_icon_path(icon):
         return f'{YANDEX_ICONS}{icon}' if icon else None
 
+    def get_spatial_columns(self):
+        return self.form_data.get('longitude'), self.form_data.get('latitude')
+
+    def get_spatial_weight(self):
+        metrics = self.get_metrics()
+        if not metrics:
+            return None
+        return metrics[0].get('label') if isinstance(metrics[0], dict) else metrics[0]
+
     def process_long_lat_query_obj(self) -> list:
         latitude = self.form_data.get('latitude')
         longitude = self.form_data.get('longitude')
@@ -2870,10 +3355,11 @@ class BubbleMapVisualization(DeckScatterViz):
         if latitude is None or longitude is None:
             raise ValueError(_('Bad longitude or latitude key'))
         if latitude in df.keys() and longitude in df.keys():
-            df[key] = list(zip(
-                pd.to_numeric(df[longitude], errors='coerce'),
-                pd.to_numeric(df[latitude], errors='coerce'),
-            ))
+            first = pd.to_numeric(df[longitude], errors='coerce').values
+            second = pd.to_numeric(df[latitude], errors='coerce').values
+            self.spatial_arrays[key] = (first, second)
+            if not self.is_columnar_format:
+                df[key] = list(zip(first, second))
         return df
 
     def get_data(self, df, session=None, with_polygons=True):
@@ -3282,14 +3768,21 @@ class PartitionViz(NVD3TimeSeriesViz):
     def levels_for(self, time_op, groups, df):
         """
         Compute the partition at each `level` from the dataframe.
+
+        The deepest level is aggregated once, every other level is rolled
+        up from the level below it (means from rolled up sums and counts).
         """
-        levels = {}
-        for i in range(0, len(groups) + 1):
-            agg_df = df.groupby(groups[:i]) if i else df
-            levels[i] = (
-                agg_df.mean() if time_op == 'agg_mean'
-                else agg_df.sum(numeric_only=True))
-        return levels
+        grouped = df.groupby(groups)
+        sums = {len(groups): grouped.sum(numeric_only=True)}
+        counts = {len(groups): grouped.count()[sums[len(groups)].columns]}
+        for i in range(len(groups) - 1, 0, -1):
+            sums[i] = sums[i + 1].groupby(level=groups[:i]).sum()
+            counts[i] = counts[i + 1].groupby(level=groups[:i]).sum()
+        sums[0] = sums[1].sum()
+        counts[0] = counts[1].sum()
+        if time_op == 'agg_mean':
+            return {i: sums[i] / counts[i] for i in sums}
+        return sums
 
     def levels_for_diff(self, time_op, groups, df):
         # Obtain a unique list of the time grains
@@ -3312,72 +3805,82 @@ class PartitionViz(NVD3TimeSeriesViz):
                 lambda a, b, fill_value: a / float(b) - 1,
             ],
         }[time_op]
-        agg_df = df.groupby(DTTM_ALIAS).sum()
+        # aggregated once by time and every group, rolled up per level
+        deepest = df.groupby([DTTM_ALIAS] + groups).sum()
+        agg_df = deepest.groupby(level=DTTM_ALIAS).sum()
         levels = {0: pd.Series({
             m: func[1](agg_df[m][until], agg_df[m][since], 0)
             for m in agg_df.columns})}
         for i in range(1, len(groups) + 1):
-            agg_df = df.groupby([DTTM_ALIAS] + groups[:i]).sum()
+            agg_df = (
+                deepest if i == len(groups)
+                else deepest.groupby(level=[DTTM_ALIAS] + groups[:i]).sum())
             levels[i] = pd.DataFrame({
                 m: func[0](agg_df[m][until], agg_df[m][since], fill_value=0)
                 for m in agg_df.columns})
         return levels
 
     def levels_for_time(self, groups, df):
+        """Pivots every level from sums rolled up from the deepest level"""
+        metrics = utils.get_metric_names(self.form_data.get('metrics', []))
+        metrics = [m for m in metrics if m in df.columns] or None
+        grouped = df.groupby([DTTM_ALIAS] + groups)
+        level_df = grouped.sum() if metrics is None else grouped[metrics].sum()
         procs = {}
-        for i in range(0, len(groups) + 1):
-            self.form_data['groupby'] = groups[:i]
-            df_drop = df.drop(groups[i:], 1)
-            procs[i] = self.process_data(df_drop, aggregate=True).fillna(0)
-        self.form_data['groupby'] = groups
+        for i in range(len(groups), -1, -1):
+            if i < len(groups):
+                level_df = level_df.groupby(
+                    level=[DTTM_ALIAS] + groups[:i]).sum()
+            procs[i] = self.process_data(
+                level_df.reset_index(), aggregate=True,
+                groupby=groups[:i]).fillna(0)
         return procs
 
-    def nest_values(self, levels, level=0, metric=None, dims=()):
+    def nest_values(self, levels):
         """
         Nest values at each level on the back-end with
         access and setting, instead of summing from the bottom.
+
+        Every level is walked once, nodes are attached to their parent
+        looked up by the tuple of group keys.
         """
-        if not level:
-            return [{
-                'name': m,
-                'val': levels[0][m],
-                'children': self.nest_values(levels, 1, m),
-            } for m in levels[0].index]
-        if level == 1:
-            return [{
-                'name': i,
-                'val': levels[1][metric][i],
-                'children': self.nest_values(levels, 2, metric, (i,)),
-            } for i in levels[1][metric].index]
-        if level >= len(levels):
-            return []
-        return [{
-            'name': i,
-            'val': levels[level][metric][dims][i],
-            'children': self.nest_values(
-                levels, level + 1, metric, dims + (i,),
-            ),
-        } for i in levels[level][metric][dims].index]
-
-    def nest_procs(self, procs, level=-1, dims=(), time=None):
-        if level == -1:
-            return [{
-                'name': m,
-                'children': self.nest_procs(procs, 0, (m,)),
-            } for m in procs[0].columns]
-        if not level:
-            return [{
-                'name': t,
-                'val': procs[0][dims[0]][t],
-                'children': self.nest_procs(procs, 1, dims, t),
-            } for t in procs[0].index]
-        if level >= len(procs):
-            return []
-        return [{
-            'name': i,
-            'val': procs[level][dims][i][time],
-            'children': self.nest_procs(procs, level + 1, dims + (i,), time),
-        } for i in procs[level][dims].columns]
+        nest = []
+        for m in levels[0].index:
+            root = {'name': m, 'val': levels[0][m], 'children': []}
+            nodes = {(): root}
+            for level in range(1, len(levels)):
+                for key, val in levels[level][m].items():
+                    key = key if isinstance(key, tuple) else (key,)
+                    parent = nodes.get(key[:-1])
+                    if parent is None:
+                        continue
+                    node = nodes[key] = {
+                        'name': key[-1], 'val': val, 'children': []}
+                    parent['children'].append(node)
+            nest.append(root)
+        return nest
+
+    def nest_procs(self, procs):
+        """Nests metric > time > groups, walking every pivot column once"""
+        nest = []
+        nodes = {}
+        for m in procs[0].columns:
+            metric_node = {'name': m, 'children': []}
+            for t, val in procs[0][m].items():
+                node = nodes[(m, t)] = {'name': t, 'val': val, 'children': []}
+                metric_node['children'].append(node)
+            nest.append(metric_node)
+        for level in range(1, len(procs)):
+            for col, series in procs[level].items():
+                m, dims = col[0], tuple(col[1:])
+                for t, val in series.items():
+                    parent = nodes.get((m, t) + dims[:-1])
+                    if parent is None:
+                        continue
+                    node = nodes[(m, t) + dims] = {
+                        'name': dims[-1], 'val': val, 'children': []}
+                    parent['children'].append(node)
+        return nest
 
     def get_data(self, df, session=None):
         fd = self.form_data
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+from mock import Mock, patch
+
+from superset import admission
+from superset.admission import AdmissionController, LocalBackend, Priority
+from superset.exceptions import SupersetTimeoutException
+from superset.stats_logger import StatsdStatsLogger
+
+
+class AdmissionTestCase(unittest.TestCase):
+
+    def get_state(self, slots=(), queue=()):
+        state = admission.new_state()
+        for ticket, user_id in slots:
+            state['slots'][ticket] = [user_id, 10 ** 10]
+        for ticket, user_id, priority, enqueued in queue:
+            state['queue'][ticket] = [user_id, priority, enqueued, 10 ** 10]
+        return state
+
+    def test_pick_by_priority_then_user_then_arrival(self):
+        state = self.get_state(
+            slots=[('s1', 'alice'), ('s2', 'alice')],
+            queue=[
+                ('alice_early', 'alice', Priority.INTERACTIVE, 1),
+                ('bob_late', 'bob', Priority.INTERACTIVE, 2),
+                ('warm_up', None, Priority.WARM_UP, 0),
+            ])
+        self.assertEqual('bob_late', admission.pick(state, limit=3))
+        self.assertIsNone(admission.pick(state, limit=2))
+        del state['queue']['bob_late']
+        self.assertEqual('alice_early', admission.pick(state, limit=3))
+        self.assertEqual('warm_up', admission.pick(state, limit=3, user_limit=2))
+
+    def test_expire(self):
+        state = self.get_state(slots=[('s1', 'alice')])
+        state['queue']['gone'] = ['bob', Priority.INTERACTIVE, 0, 5]
+        admission.expire(state, now=10)
+        self.assertEqual({}, state['queue'])
+        self.assertIn('s1', state['slots'])
+
+    @patch.dict(admission.config, {'QUERY_ADMISSION_SLOT_TTL': 60})
+    def test_acquire_and_leave(self):
+        controller = AdmissionController(LocalBackend())
+        first = controller.acquire('db', 'alice', Priority.INTERACTIVE, limit=1)
+        self.assertEqual(
+            (False, 1, 1),
+            controller.try_admit('db', 'waiting', 'bob', Priority.INTERACTIVE, 1, None))
+        controller.leave('db', first)
+        self.assertEqual(
+            (True, 0, 1),
+            controller.try_admit('db', 'waiting', 'bob', Priority.INTERACTIVE, 1, None))
+
+    @patch('superset.admission.POLL_INTERVAL', 0)
+    @patch.dict(admission.config, {'QUERY_ADMISSION_SLOT_TTL': 60})
+    def test_timeout_leaves_the_queue(self):
+        backend = LocalBackend()
+        controller = AdmissionController(backend)
+        controller.acquire('db', 'alice', Priority.INTERACTIVE, limit=1)
+        with self.assertRaises(SupersetTimeoutException):
+            controller.acquire(
+                'db', 'bob', Priority.INTERACTIVE, limit=1, timeout=0.01)
+        self.assertEqual({}, backend.states['db']['queue'])
+
+    @patch('superset.admission.POLL_INTERVAL', 0)
+    @patch.dict(admission.config, {'QUERY_ADMISSION_SLOT_TTL': 60})
+    def test_load_is_gauged_through_statsd(self):
+        stats_logger = StatsdStatsLogger('localhost', 8125)
+        stats_logger.client = Mock()
+        controller = AdmissionController(LocalBackend())
+        with patch('superset.admission.stats_logger', stats_logger):
+            first = controller.acquire('db', 'alice', Priority.INTERACTIVE, limit=1)
+            with self.assertRaises(SupersetTimeoutException):
+                controller.acquire(
+                    'db', 'bob', Priority.INTERACTIVE, limit=1, timeout=0.05)
+            controller.leave('db', first)
+        gauges = [c[0] for c in stats_logger.client.gauge.call_args_list]
+        # once per outcome, however many polls the timed out query waited
+        self.assertEqual(
+            [('db_queue_depth', 0), ('db_in_flight', 1),
+             ('db_queue_depth', 1), ('db_in_flight', 1)],
+            [g for g in gauges if not g[0].startswith('db_wait_ms')])
+        stats_logger.client.incr.assert_called_once_with('db_timeout', 1)
+
+    def test_databases_without_limit_are_not_queued(self):
+        database = Mock()
+        database.get_extra.return_value = {}
+        with patch.dict(admission.config, {'QUERY_ADMISSION_MAX_IN_FLIGHT': None}):
+            with patch('superset.admission.get_controller') as get_controller:
+                with admission.admitted(database):
+                    pass
+        get_controller.assert_not_called()
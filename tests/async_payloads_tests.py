@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import unittest
+import zlib
+
+from mock import patch
+
+from superset import async_payloads
+
+
+class FakeBackend(object):
+
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value, timeout=None):
+        self.store[key] = value
+
+    def get(self, key):
+        return self.store.get(key)
+
+
+class AsyncPayloadsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeBackend()
+        patcher = patch('superset.async_payloads.results_backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_form_data_round_trip(self):
+        form_data = {'slice_id': 1, 'metrics': ['count'], 'viz_type': 'table'}
+        form_data_hash = async_payloads.store_form_data(form_data)
+        self.assertEqual(
+            form_data_hash,
+            async_payloads.get_form_data_hash(
+                {'viz_type': 'table', 'metrics': ['count'], 'slice_id': 1}))
+        self.assertEqual(form_data, async_payloads.load_form_data(form_data_hash))
+        self.assertIsNone(async_payloads.load_form_data('expired'))
+
+    @patch.dict(async_payloads.config, {'ASYNC_DASHBOARD_COMPRESS_THRESHOLD': 100})
+    def test_only_large_results_are_compressed(self):
+        small = json.dumps({'data': [1, 2]})
+        large = json.dumps({'data': list(range(100))})
+        async_payloads.store_result('small', small)
+        async_payloads.store_result('large', large.encode('utf-8'))
+        self.assertEqual(small.encode('utf-8'), self.backend.store['small'])
+        self.assertEqual(large.encode('utf-8'), zlib.decompress(self.backend.store['large']))
+        self.assertEqual(small, async_payloads.load_result(self.backend.store['small']))
+        self.assertEqual(large, async_payloads.load_result(self.backend.store['large']))
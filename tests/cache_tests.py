@@ -9,8 +9,9 @@ import json
 
 import sqlalchemy as sqla
 from mock import patch
+from werkzeug.contrib.cache import SimpleCache
 
-from superset import cache, db, utils
+from superset import cache, cache_util, db, utils
 import superset.models.core as models
 from tests.base_tests import SupersetTestCase
 
@@ -46,3 +47,36 @@ class CacheTests(SupersetTestCase):
         self.assertEqual(resp_from_cache['status'], utils.QueryStatus.SUCCESS)
         self.assertEqual(resp['data'], resp_from_cache['data'])
         self.assertEqual(resp['query'], resp_from_cache['query'])
+
+    @patch('superset.cache_util.cache', SimpleCache())
+    def test_versioned_cache(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return {'value': len(calls)}
+
+        first = cache_util.versioned_cache('test_key', ['test_version'], build)
+        second = cache_util.versioned_cache('test_key', ['test_version'], build)
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(calls))
+
+        cache_util.bump_metadata_version('test_version')
+        third = cache_util.versioned_cache('test_key', ['test_version'], build)
+        self.assertEqual(2, len(calls))
+        self.assertEqual({'value': 2}, third)
+
+    @patch('superset.cache_util.cache', SimpleCache())
+    def test_versions_are_bumped_on_commit(self):
+        session = db.session()
+        version = cache_util.get_metadata_version('test_version')
+        session.query(models.Database).first()
+        cache_util.bump_metadata_version_on_commit(session, 'test_version')
+        self.assertEqual(version, cache_util.get_metadata_version('test_version'))
+        session.rollback()
+        self.assertEqual(version, cache_util.get_metadata_version('test_version'))
+
+        session.query(models.Database).first()
+        cache_util.bump_metadata_version_on_commit(session, 'test_version')
+        session.commit()
+        self.assertNotEqual(version, cache_util.get_metadata_version('test_version'))
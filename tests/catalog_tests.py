@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Unit tests for the SQL Lab metadata catalog"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+
+from mock import patch
+import sqlalchemy as sqla
+
+from superset import catalog, db
+from superset.models.catalog import CatalogEntry, CatalogEntryKind
+from tests.base_tests import SupersetTestCase
+
+
+class CatalogTests(SupersetTestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(CatalogTests, self).__init__(*args, **kwargs)
+
+    def setUp(self):
+        self.database = self.get_main_database(db.session)
+        catalog.invalidate(self.database.id)
+
+    def tearDown(self):
+        catalog.invalidate(self.database.id)
+
+    def interrupt_crawl(self):
+        started_on = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        catalog.store(self.database.id, CatalogEntryKind.CRAWL, {
+            (None, None): {'started_on': started_on.isoformat(), 'finished_on': None},
+        })
+
+    def test_store_and_read(self):
+        catalog.store(self.database.id, CatalogEntryKind.TABLES, {
+            ('schema_a', None): ['t1', 't2'],
+            ('schema_b', None): ['t3'],
+        })
+        catalog.store(self.database.id, CatalogEntryKind.TABLES, {
+            ('schema_a', None): ['t4'],
+        })
+        payload, changed_on = catalog.read(
+            self.database.id, CatalogEntryKind.TABLES, 'schema_a')
+        self.assertEqual(['t4'], payload)
+        self.assertEqual(
+            {'schema_a': ['t4'], 'schema_b': ['t3']},
+            catalog.read_all(self.database.id, CatalogEntryKind.TABLES))
+
+        catalog.invalidate(self.database.id, 'schema_a')
+        self.assertIsNone(catalog.read(
+            self.database.id, CatalogEntryKind.TABLES, 'schema_a'))
+
+    def test_store_retries_after_a_concurrent_store(self):
+        replace_entries = catalog.replace_entries
+        conflicts = [sqla.exc.IntegrityError('INSERT', {}, Exception('UNIQUE'))]
+
+        def conflicting_replace_entries(*args):
+            if conflicts:
+                raise conflicts.pop()
+            replace_entries(*args)
+
+        with patch.object(
+                catalog, 'replace_entries',
+                side_effect=conflicting_replace_entries) as patched:
+            catalog.store(self.database.id, CatalogEntryKind.TABLES, {
+                ('main', None): ['ab_user'],
+            })
+        self.assertEqual(2, patched.call_count)
+        payload, _ = catalog.read(
+            self.database.id, CatalogEntryKind.TABLES, 'main')
+        self.assertEqual(['ab_user'], payload)
+
+    def test_get_reflects_missing_entries_once(self):
+        with patch.object(
+                catalog, 'refresh', return_value=['ab_user']) as refresh:
+            self.assertEqual(
+                ['ab_user'],
+                catalog.get_table_names(self.database, 'main'))
+            refresh.assert_called_once_with(
+                self.database, CatalogEntryKind.TABLES, 'main', None)
+
+        catalog.store(self.database.id, CatalogEntryKind.TABLES, {
+            ('main', None): ['ab_user'],
+        })
+        with patch.object(catalog, 'refresh') as refresh:
+            self.assertEqual(
+                ['ab_user'],
+                catalog.get_table_names(self.database, 'main'))
+            refresh.assert_not_called()
+
+    def test_get_refreshes_stale_entries(self):
+        catalog.store(self.database.id, CatalogEntryKind.TABLES, {
+            ('main', None): ['old'],
+        })
+        table = CatalogEntry.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.update().values(
+                changed_on=datetime.utcnow() - timedelta(days=30)))
+        with patch.object(catalog, 'refresh', return_value=['new']):
+            self.assertEqual(
+                ['new'], catalog.get_table_names(self.database, 'main'))
+
+    def test_table_metadata_is_cataloged(self):
+        metadata = catalog.get_table(self.database, 'ab_user')
+        self.assertIn('id', [col['name'] for col in metadata['columns']])
+        # same type strings as the SQLAlchemy reflection
+        reflected = self.database.inspector.get_columns('ab_user')
+        self.assertEqual(
+            ['{}'.format(col['type']) for col in reflected],
+            [col['type'] for col in metadata['columns']])
+        payload, _ = catalog.read(
+            self.database.id, CatalogEntryKind.TABLE, None, 'ab_user')
+        self.assertEqual(metadata, payload)
+
+    def test_crawl_database_resumes(self):
+        # resuming only applies to the engines reflected schema by schema
+        with patch.object(
+                self.database.db_engine_spec, 'fetch_catalog_relations',
+                return_value=None):
+            report = catalog.crawl_database(self.database)
+            self.assertEqual(0, report['skipped'])
+            self.assertGreater(report['schemas'], 0)
+            table_names = catalog.get_all_names(
+                self.database, CatalogEntryKind.TABLES)
+            self.assertIn('ab_user', [n.split('.')[-1] for n in table_names])
+
+            # an interrupted crawl started before the stored schemas skips them
+            self.interrupt_crawl()
+            report = catalog.crawl_database(self.database)
+            self.assertEqual(report['schemas'], report['skipped'])
+
+            report = catalog.crawl_database(self.database, resume=False)
+            self.assertEqual(0, report['skipped'])
+
+    def test_crawl_database_with_a_catalog_query(self):
+        if self.database.db_engine_spec.catalog_relations_sql is None:
+            return
+        self.interrupt_crawl()
+        report = catalog.crawl_database(self.database)
+        # the single query stores every schema again
+        self.assertEqual(0, report['skipped'])
+        self.assertGreater(report['tables'], 0)
+        payload, _ = catalog.read(self.database.id, CatalogEntryKind.CRAWL)
+        self.assertIsNotNone(payload['finished_on'])
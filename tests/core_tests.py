@@ -513,12 +513,19 @@ class CoreTests(SupersetTestCase):
         slc = self.get_slice('Girls', db.session)
         data = self.get_json_resp(
             '/superset/warm_up_cache?slice_id={}'.format(slc.id))
-        assert data == [{'slice_id': slc.id, 'slice_name': slc.slice_name}]
+        assert len(data) == 1
+        assert data[0]['slice_id'] == slc.id
+        assert data[0]['slice_name'] == slc.slice_name
+        assert data[0]['status'] in ('warmed', 'skipped')
 
         data = self.get_json_resp(
             '/superset/warm_up_cache?table_name=energy_usage&db_name=main')
         assert len(data) == 3
 
+        data = self.get_json_resp(
+            '/superset/warm_up_cache?slice_id={}'.format(slc.id))
+        assert data[0]['status'] == 'skipped'
+
     def test_shortner(self):
         self.login(username='test_user')
         data = (
@@ -4,9 +4,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import tempfile
 import unittest
 
-from superset.db_engine_specs import HiveEngineSpec
+from mock import patch
+import numpy
+import pandas
+from sqlalchemy import create_engine
+
+from superset.db_engine_specs import (
+    BaseEngineSpec, ClickHouseEngineSpec, config, HiveEngineSpec, PrestoEngineSpec)
 
 
 class DbEngineSpecsTestCase(unittest.TestCase):
@@ -80,3 +88,82 @@ class DbEngineSpecsTestCase(unittest.TestCase):
             17/02/07 19:16:09 INFO exec.Task: 2017-02-07 19:16:09,173 Stage-1 map = 40%,  reduce = 0%
         """.split('\n')  # noqa ignore: E501
         self.assertEquals(60, HiveEngineSpec.progress(log))
+
+
+    def test_approximate_aggregations(self):
+        self.assertEqual(
+            BaseEngineSpec.sqla_aggregations,
+            BaseEngineSpec.get_sqla_aggregations(approximate=True))
+        for spec in (ClickHouseEngineSpec, PrestoEngineSpec):
+            exact = spec.get_sqla_aggregations()
+            approximate = spec.get_sqla_aggregations(approximate=True)
+            self.assertIs(exact['SUM'], approximate['SUM'])
+            self.assertIsNot(exact['COUNT_DISTINCT'], approximate['COUNT_DISTINCT'])
+
+
+class CsvUploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.dir, 'upload.csv')
+        with open(self.csv_path, 'w') as f:
+            f.write('name,num,code\na,1,\nb,2,\nc,,x1\nd,4,x2\ne,5,x3\n')
+
+    def tearDown(self):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    @patch.dict(config, {'CSV_UPLOAD_SAMPLE_ROWS': 2, 'CSV_UPLOAD_CHUNK_SIZE': 2})
+    def test_chunks_keep_sample_types(self):
+        sample = BaseEngineSpec.read_csv_sample(filepath_or_buffer=self.csv_path)
+        self.assertEquals(['name', 'num', 'code'], list(sample.columns))
+        self.assertEquals('i', sample.dtypes['num'].kind)
+        # empty in the sample, read as text
+        self.assertEquals(object, sample.dtypes['code'])
+
+        chunks = list(BaseEngineSpec.iter_csv_chunks(
+            sample, filepath_or_buffer=self.csv_path))
+        self.assertEquals([2, 2, 1], [len(chunk) for chunk in chunks])
+        self.assertEquals([None, 4], [
+            None if v != v else v for v in chunks[1]['num'].tolist()])
+        self.assertIsInstance(chunks[1]['num'].iloc[1], int)
+
+    @patch.dict(config, {'CSV_UPLOAD_SAMPLE_ROWS': 2, 'CSV_UPLOAD_CHUNK_SIZE': 2})
+    def test_decimals_after_an_int_sample(self):
+        with open(self.csv_path, 'w') as f:
+            f.write('name,num,code\na,1,1\nb,2,2\nc,1.5,x\n')
+        sample = BaseEngineSpec.widen_csv_sample(
+            BaseEngineSpec.read_csv_sample(filepath_or_buffer=self.csv_path),
+            filepath_or_buffer=self.csv_path)
+        self.assertEquals('f', sample.dtypes['num'].kind)
+        self.assertEquals(object, sample.dtypes['code'])
+
+        chunks = list(BaseEngineSpec.iter_csv_chunks(
+            sample, filepath_or_buffer=self.csv_path))
+        self.assertEquals([1.0, 2.0, 1.5], [v for c in chunks for v in c['num'].tolist()])
+        self.assertEquals(['1', '2', 'x'], [v for c in chunks for v in c['code'].tolist()])
+
+    def test_coerce_refuses_decimals_in_int_columns(self):
+        chunk = pandas.DataFrame({'num': [1.0, 1.5]})
+        with self.assertRaises(ValueError):
+            BaseEngineSpec.coerce_csv_chunk(chunk, pandas.Series({'num': numpy.dtype('int64')}))
+
+    def test_invalid_header(self):
+        with open(self.csv_path, 'w') as f:
+            f.write('1name,num\na,1\n')
+        with self.assertRaises(Exception):
+            BaseEngineSpec.read_csv_sample(filepath_or_buffer=self.csv_path)
+
+    @patch.dict(config, {'CSV_UPLOAD_SAMPLE_ROWS': 2, 'CSV_UPLOAD_CHUNK_SIZE': 2})
+    def test_csv_to_db(self):
+        engine = create_engine(
+            'sqlite:///' + os.path.join(self.dir, 'upload.db'),
+            connect_args={'check_same_thread': False})
+        rows = BaseEngineSpec.csv_to_db(
+            engine, 'upload', filepath_or_buffer=self.csv_path)
+        self.assertEquals(5, rows)
+        self.assertEquals(
+            [('a', 1, None), ('c', None, 'x1'), ('e', 5, 'x3')],
+            engine.execute(
+                'SELECT name, num, code FROM upload '
+                "WHERE name IN ('a', 'c', 'e') ORDER BY name").fetchall())
@@ -11,6 +11,7 @@ import unittest
 from sqlalchemy.orm.session import make_transient
 
 from superset import db, utils
+from superset.bulk_import import BulkImport
 from superset.connectors.druid.models import (
     DruidColumn, DruidDatasource, DruidMetric,
 )
@@ -414,6 +415,32 @@ class ImportExportTests(SupersetTestCase):
         self.assertEquals({'remote_id': 10004, 'import_time': 1992},
                           json.loads(imported_dash.json_metadata))
 
+    def test_bulk_import_dashboard(self):
+        def payload():
+            e_slc = self.create_slice('e_slc', id=10020, table_name='energy_usage')
+            b_slc = self.create_slice('b_slc', id=10021, table_name='birth_names')
+            dash = self.create_dashboard(
+                'bulk_dashboard', slcs=[e_slc, b_slc], id=10020)
+            return {'dashboards': [dash], 'datasources': [], 'dd_slices': [b_slc]}
+
+        report = BulkImport(db.session, import_time=1993).run(payload())
+        self.assertEquals({'inserted': 2, 'updated': 0}, report['slices'])
+        self.assertEquals({'inserted': 1, 'updated': 0}, report['dashboards'])
+        imported_dash = self.get_dash_by_slug('bulk_dashboard_imported')
+        self.assertEquals(
+            ['b_slc', 'e_slc'],
+            sorted(slc.slice_name for slc in imported_dash.slices))
+        self.assertEquals(
+            {'remote_id': 10020, 'import_time': 1993},
+            json.loads(imported_dash.json_metadata))
+
+        report = BulkImport(db.session, import_time=1994).run(payload())
+        self.assertEquals({'inserted': 0, 'updated': 2}, report['slices'])
+        self.assertEquals({'inserted': 0, 'updated': 1}, report['dashboards'])
+        self.assertEquals(
+            imported_dash.id,
+            self.get_dash_by_slug('bulk_dashboard_imported').id)
+
     def test_import_table_no_metadata(self):
         table = self.create_table('pure_table', id=10001)
         imported_id = SqlaTable.import_obj(table, import_time=1989)
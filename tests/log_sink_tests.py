@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+import unittest
+
+from mock import patch
+
+from superset.log_sink import BufferedLogSink, LogSinkMode
+from superset.models.core import Log
+
+
+class BufferedLogSinkTestCase(unittest.TestCase):
+
+    def get_sink(self, **kwargs):
+        return BufferedLogSink(
+            Log, LogSinkMode.THREAD, flush_interval=3600, **kwargs)
+
+    @patch('superset.log_sink.bulk_insert')
+    def test_flush_in_batches(self, bulk_insert):
+        sink = self.get_sink(batch_size=2)
+        for i in range(5):
+            sink.put({'action': 'test', 'slice_id': i})
+        self.assertEqual(sink.flush(), 5)
+        self.assertEqual(bulk_insert.call_count, 3)
+        self.assertEqual(
+            [len(call[0][1]) for call in bulk_insert.call_args_list],
+            [2, 2, 1])
+
+    @patch('superset.log_sink.stats_logger')
+    @patch('superset.log_sink.bulk_insert')
+    def test_drop_when_full(self, bulk_insert, stats_logger):
+        sink = self.get_sink(max_size=2)
+        for i in range(3):
+            sink.put({'action': 'test', 'slice_id': i})
+        stats_logger.incr.assert_any_call('log_sink_dropped')
+        self.assertEqual(sink.flush(), 2)
+
+    @patch('superset.log_sink.stats_logger')
+    @patch('superset.log_sink.bulk_insert')
+    def test_failed_batch_is_dropped(self, bulk_insert, stats_logger):
+        bulk_insert.side_effect = Exception('db is down')
+        sink = self.get_sink()
+        sink.put({'action': 'test'})
+        sink.put({'action': 'test'})
+        self.assertEqual(sink.flush(), 0)
+        self.assertTrue(sink.queue.empty())
+        stats_logger.incr.assert_called_once_with('log_sink_dropped', 2)
+
+    @patch('superset.tasks.log.bulk_insert_logs')
+    def test_celery_payloads_are_copies(self, bulk_insert_logs):
+        sink = BufferedLogSink(Log, LogSinkMode.CELERY, flush_interval=3600)
+        entry = {'action': 'test', 'dttm': datetime(1970, 1, 2)}
+        sink.put(entry)
+        self.assertEqual(sink.flush(), 1)
+        bulk_insert_logs.delay.assert_called_once_with(
+            [{'action': 'test', 'dttm': 86400.0}])
+        self.assertEqual(datetime(1970, 1, 2), entry['dttm'])
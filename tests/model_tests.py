@@ -4,14 +4,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 import textwrap
 import unittest
 
+from mock import Mock, patch
 from sqlalchemy.engine.url import make_url
 from tests.base_tests import SupersetTestCase
 
-from superset import db
-from superset.models.core import Database
+from superset import app, db
+from superset.connectors.sqla.models import ChangeLogMixin
+from superset.models.core import Dashboard, Database
 
 
 class DatabaseModelTestCase(SupersetTestCase):
@@ -101,3 +104,51 @@ class DatabaseModelTestCase(SupersetTestCase):
         FROM bart_lines
         LIMIT 100""".format(**locals()))
         assert sql.startswith(expected)
+
+
+class ChangeLogMixinTestCase(SupersetTestCase):
+
+    def test_is_noise(self):
+        with patch.dict(app.config, {'CHANGE_LOG_COMPRESS': True}):
+            self.assertTrue(ChangeLogMixin.is_noise(None, ''))
+            self.assertTrue(ChangeLogMixin.is_noise(1, 1.0))
+            self.assertFalse(ChangeLogMixin.is_noise(True, 1))
+            self.assertFalse(ChangeLogMixin.is_noise('a', 'b'))
+            self.assertEqual(
+                ChangeLogMixin.dump_changes({'a': None, 'b': '', 'c': 1}),
+                '{"c": 1}')
+        with patch.dict(app.config, {'CHANGE_LOG_COMPRESS': False}):
+            self.assertFalse(ChangeLogMixin.is_noise(None, ''))
+
+    def test_rolled_back_logs_are_discarded(self):
+        session = db.session()
+        session.query(Database).first()
+        ChangeLogMixin.save_change_log([Mock()], session=session)
+        self.assertIn(ChangeLogMixin.change_logs_key, session.info)
+        session.rollback()
+        self.assertNotIn(ChangeLogMixin.change_logs_key, session.info)
+
+
+class DashboardExportTestCase(SupersetTestCase):
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_drilldowns_are_walked_once(self):
+        girls = self.get_slice('Girls', db.session)
+        boys = self.get_slice('Boys', db.session)
+        dash = db.session.query(Dashboard).first()
+        girls.params = json.dumps({'url_drilldowns': [
+            {'type': 'slices', 'url': boys.id},
+            {'type': 'dashboards', 'url': dash.id},
+        ]})
+        # cycle back to the exported slice
+        boys.params = json.dumps({'url_drilldowns': [
+            {'type': 'slices', 'url': girls.id},
+        ]})
+
+        slices, dashboards = Dashboard.get_slices_url_drilldowns_data(
+            [girls], 3)
+        self.assertEqual([boys.id], [slc.id for slc in slices])
+        self.assertEqual([dash.id], [d.id for d in dashboards])
+        self.assertEqual(boys.id, boys.params_dict['remote_id'])
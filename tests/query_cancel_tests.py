@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+from celery.exceptions import SoftTimeLimitExceeded
+from mock import Mock
+
+from superset import query_cancel
+from superset.db_engine_specs import (
+    BaseEngineSpec, ClickHouseEngineSpec, PostgresEngineSpec, PrestoEngineSpec,
+)
+
+
+class QueryCancelTestCase(unittest.TestCase):
+
+    def get_database(self, spec):
+        database = Mock()
+        database.db_engine_spec = spec
+        return database
+
+    def test_tag_sql(self):
+        database = self.get_database(ClickHouseEngineSpec)
+        self.assertEqual(
+            '/* superset_query_tag:abc-1 */ SELECT 1',
+            query_cancel.tag_sql(database, 'SELECT 1', 'abc-1'))
+        self.assertEqual('SELECT 1', query_cancel.tag_sql(database, 'SELECT 1', None))
+        # statements can't be found on Presto, they are left as they are
+        database = self.get_database(PrestoEngineSpec)
+        self.assertEqual('SELECT 1', query_cancel.tag_sql(database, 'SELECT 1', 'abc-1'))
+
+    def test_invalid_tags_are_not_cancelled(self):
+        database = self.get_database(ClickHouseEngineSpec)
+        self.assertFalse(query_cancel.cancel(database, "x' OR 1 = 1 --"))
+        self.assertFalse(query_cancel.cancel(database, None))
+        database.get_sqla_engine.assert_not_called()
+
+    def test_cancel_through_the_cursor(self):
+        database = self.get_database(PrestoEngineSpec)
+        cursor = Mock()
+        self.assertFalse(query_cancel.cancel(database, 'sqllab-abc'))
+        with query_cancel.running('sqllab-abc', cursor):
+            self.assertTrue(query_cancel.cancel(database, 'sqllab-abc'))
+        cursor.cancel.assert_called_once_with()
+        self.assertFalse(query_cancel.cancel(database, 'sqllab-abc'))
+
+    def test_cancel_by_tag(self):
+        database = self.get_database(ClickHouseEngineSpec)
+        engine = database.get_sqla_engine.return_value
+        engine.execute.return_value.fetchall.return_value = [('waiting',)]
+        self.assertTrue(query_cancel.cancel(database, 'abc'))
+        args, kwargs = engine.execute.call_args
+        self.assertIn('KILL QUERY', str(args[0]))
+        self.assertEqual({'prefix': 'superset_query_tag:', 'tag': 'abc'}, kwargs)
+
+        database = self.get_database(PostgresEngineSpec)
+        engine = database.get_sqla_engine.return_value
+        engine.execute.return_value.fetchall.return_value = [(False,)]
+        self.assertFalse(query_cancel.cancel(database, 'abc'))
+
+    def test_failures_are_logged(self):
+        database = self.get_database(BaseEngineSpec)
+        cursor = Mock()
+        cursor.cancel.side_effect = Exception('gone')
+        with query_cancel.running('abc', cursor):
+            self.assertFalse(query_cancel.cancel(database, 'abc'))
+
+    def test_cancel_on_timeout(self):
+        database = self.get_database(PrestoEngineSpec)
+        cursor = Mock()
+        with self.assertRaises(SoftTimeLimitExceeded):
+            with query_cancel.running('abc', cursor):
+                with query_cancel.cancel_on_timeout(database, 'abc'):
+                    raise SoftTimeLimitExceeded()
+        cursor.cancel.assert_called_once_with()
+
+        with self.assertRaises(ValueError):
+            with query_cancel.running('abc', cursor):
+                with query_cancel.cancel_on_timeout(database, 'abc'):
+                    raise ValueError()
+        cursor.cancel.assert_called_once_with()
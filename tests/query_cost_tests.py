@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+from mock import Mock, patch
+
+from superset import query_cost
+from superset.db_engine_specs import ClickHouseEngineSpec, PostgresEngineSpec
+from superset.query_cost import CostAction
+
+THRESHOLDS = {
+    'warn': {'rows': 1000},
+    'async': {'rows': 100000},
+    'reject': {'bytes': 10 ** 9},
+}
+
+
+class QueryCostTestCase(unittest.TestCase):
+
+    def get_database(self, thresholds=THRESHOLDS, estimate=None):
+        database = Mock()
+        database.id = 1
+        database.get_extra.return_value = {'cost_thresholds': thresholds}
+        database.db_engine_spec.estimate_query_cost.return_value = estimate
+        return database
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            query_cost.normalize_sql('select a\n  from t -- comment\n;'),
+            query_cost.normalize_sql('SELECT a FROM t'))
+
+    def test_get_action(self):
+        self.assertEqual(
+            CostAction.ALLOW, query_cost.get_action({'rows': 10}, THRESHOLDS))
+        self.assertEqual(
+            CostAction.WARN, query_cost.get_action({'rows': 1001}, THRESHOLDS))
+        self.assertEqual(
+            CostAction.REJECT,
+            query_cost.get_action({'rows': 1001, 'bytes': 10 ** 10}, THRESHOLDS))
+        self.assertEqual(
+            CostAction.ALLOW, query_cost.get_action({'rows': None}, THRESHOLDS))
+        self.assertEqual(CostAction.ALLOW, query_cost.get_action(None, THRESHOLDS))
+
+    @patch('superset.query_cost.log_sink')
+    @patch('superset.query_cost.cache')
+    def test_check_cost_is_cached_and_logged(self, cache, log_sink):
+        store = {}
+        cache.get.side_effect = store.get
+        cache.set.side_effect = lambda key, value, timeout=None: store.update({key: value})
+        database = self.get_database(estimate={'rows': 200000, 'bytes': 100})
+
+        cost = query_cost.check_cost(database, 'SELECT * FROM t', user_id=1)
+        self.assertEqual(CostAction.ASYNC, cost.action)
+        self.assertIn('200,000 rows', cost.message)
+        cost = query_cost.check_cost(database, 'select *\nfrom t;', user_id=1)
+        self.assertEqual(CostAction.ASYNC, cost.action)
+        self.assertEqual(
+            1, database.db_engine_spec.estimate_query_cost.call_count)
+
+        self.assertEqual(2, log_sink.emit.call_count)
+        entry = log_sink.emit.call_args[0][1]
+        self.assertEqual('query_cost', entry['action'])
+        self.assertEqual('async', json.loads(entry['json'])['cost_action'])
+
+    @patch('superset.query_cost.log_sink')
+    def test_no_thresholds_no_check(self, log_sink):
+        database = self.get_database(thresholds=None)
+        self.assertIsNone(query_cost.check_cost(database, 'SELECT 1'))
+        database.db_engine_spec.estimate_query_cost.assert_not_called()
+        log_sink.emit.assert_not_called()
+
+    def test_set_query_estimate(self):
+        query = Mock()
+        query_cost.set_query_estimate(query, {'rows': 12.0, 'bytes': None})
+        self.assertEqual(12, query.estimated_rows)
+        self.assertIsNone(query.estimated_bytes)
+
+
+class EngineCostEstimateTestCase(unittest.TestCase):
+
+    def test_postgres_sums_the_scans(self):
+        plan = [{'Plan': {
+            'Node Type': 'Hash Join',
+            'Total Cost': 42.5,
+            'Plan Rows': 10,
+            'Plan Width': 8,
+            'Plans': [
+                {'Node Type': 'Seq Scan', 'Plan Rows': 100, 'Plan Width': 4},
+                {'Node Type': 'Hash', 'Plan Rows': 20, 'Plan Width': 8, 'Plans': [
+                    {'Node Type': 'Seq Scan', 'Plan Rows': 20, 'Plan Width': 8},
+                ]},
+            ],
+        }}]
+        database = Mock()
+        database.get_sqla_engine.return_value.execute.return_value.scalar.return_value = plan
+        estimate = PostgresEngineSpec.estimate_query_cost(database, 'SELECT 1;')
+        self.assertEqual({'rows': 120, 'bytes': 560, 'cost': 42.5}, estimate)
+        sql = database.get_sqla_engine.return_value.execute.call_args[0][0]
+        self.assertEqual('EXPLAIN (FORMAT JSON) SELECT 1', sql)
+
+    def test_clickhouse_prorates_bytes(self):
+        engine = Mock()
+        engine.execute.side_effect = [
+            [('default', 'events', 3, 250, 4)],
+            [('default', 'events', 1000, 8000)],
+        ]
+        database = Mock()
+        database.get_sqla_engine.return_value = engine
+        estimate = ClickHouseEngineSpec.estimate_query_cost(
+            database, 'SELECT count() FROM events')
+        self.assertEqual({'rows': 250, 'bytes': 2000}, estimate)
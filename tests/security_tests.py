@@ -4,7 +4,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from superset import app, security_manager
+from superset import app, db, security_manager
+from superset.constants import DENIED
 from tests.base_tests import SupersetTestCase
 
 
@@ -175,3 +176,17 @@ class RolePermissionTests(SupersetTestCase):
 
         self.assert_cannot_gamma(granter_set)
         self.assert_cannot_alpha(granter_set)
+
+    def test_item_has_access_perm_set(self):
+        slc = self.get_slice('Girls', db.session)
+        item_perm = slc.get_perm()
+        perm_set = frozenset([('can_explore', item_perm)])
+        self.assertTrue(security_manager.item_has_access(
+            slc, 'can_explore', perm_set=perm_set))
+        self.assertFalse(security_manager.item_has_access(
+            slc, 'can_edit', perm_set=perm_set))
+
+        perm_set = frozenset([
+            ('can_explore', 'Superset'), (DENIED, item_perm)])
+        self.assertFalse(security_manager.item_has_access(
+            slc, 'can_explore', view_name='Superset', perm_set=perm_set))
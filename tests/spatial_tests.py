@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import base64
+import unittest
+
+from mock import Mock
+import numpy as np
+
+from superset import spatial
+from superset.db_engine_specs import BaseEngineSpec, ClickHouseEngineSpec
+
+
+class SpatialTilesTestCase(unittest.TestCase):
+
+    def test_quadkey_round_trip(self):
+        self.assertEqual(spatial.tile_to_quadkey(3, 5, 3), '213')
+        self.assertEqual(spatial.quadkey_to_tile('213'), (3, 5, 3))
+        self.assertEqual(spatial.tile_to_quadkey(0, 0, 0), '')
+        with self.assertRaises(ValueError):
+            spatial.quadkey_to_tile('214')
+
+    def test_tile_bounds(self):
+        west, south, east, north = spatial.tile_to_bounds(0, 0, 1)
+        self.assertEqual((west, east), (-180, 0))
+        self.assertAlmostEqual(south, 0)
+        self.assertAlmostEqual(north, spatial.MAX_LATITUDE, places=5)
+
+    def test_tiles_for_bounds_is_bounded(self):
+        quadkeys = spatial.tiles_for_bounds([-180, -85, 180, 85], 10, max_tiles=16)
+        self.assertLessEqual(len(quadkeys), 16)
+        self.assertEqual(len(set(len(qk) for qk in quadkeys)), 1)
+
+        quadkeys = spatial.tiles_for_bounds([37.5, 55.7, 37.6, 55.8], 12)
+        self.assertTrue(all(len(qk) == 12 for qk in quadkeys))
+
+    def test_grid_aggregate(self):
+        data = spatial.grid_aggregate(
+            [0.1, 0.2, 0.9, 5], [0.1, 0.2, 0.9, 5], [0, 0, 1, 1], 2,
+            weights=[1, 2, 3, 4])
+        self.assertEqual(data['count'], [2, 1])
+        self.assertEqual(data['weight'], [3, 3])
+        self.assertAlmostEqual(data['lon'][0], 0.15)
+
+    def test_geohash_precision(self):
+        self.assertEqual(spatial.geohash_precision(360), 1)
+        self.assertGreater(spatial.geohash_precision(0.001), 5)
+
+    def get_database(self, spec):
+        database = Mock()
+        database.db_engine_spec = spec
+        database.get_dialect.return_value.identifier_preparer.quote = (
+            lambda name: '"{}"'.format(name))
+        return database
+
+    def test_tile_aggregate_sql(self):
+        sql = spatial.tile_aggregate_sql(
+            self.get_database(BaseEngineSpec), 'SELECT lon, lat FROM t;',
+            'lon', 'lat', [0, 0, 1, 1], 4, weight='cnt', cell_type='geohash')
+        self.assertIn('FROM (SELECT lon, lat FROM t) AS inner_qry', sql)
+        self.assertIn('GROUP BY floor((inner_qry."lon" - 0.0) / 0.25)', sql)
+        self.assertIn('SUM(inner_qry."cnt") AS weight', sql)
+        self.assertIn('LIMIT 16', sql)
+
+        sql = spatial.tile_aggregate_sql(
+            self.get_database(ClickHouseEngineSpec), 'SELECT lon, lat FROM t',
+            'lon', 'lat', [0, 0, 1, 1], 4, cell_type='geohash')
+        self.assertIn('GROUP BY geohashEncode(inner_qry."lon", inner_qry."lat"', sql)
+
+
+class SpatialDecodingTestCase(unittest.TestCase):
+
+    def test_geohash_decode(self):
+        lat, lon = spatial.geohash_decode(['ezs42', 'EZS42', None])
+        self.assertAlmostEqual(lat[0], 42.60498046875)
+        self.assertAlmostEqual(lon[0], -5.60302734375)
+        self.assertAlmostEqual(lat[1], lat[0])
+        self.assertEqual((lat[2], lon[2]), (0, 0))
+
+        lat, lon = spatial.geohash_decode([])
+        self.assertEqual(len(lat), 0)
+
+    def test_parse_delimited(self):
+        first, second = spatial.parse_delimited(
+            ['55.75, 37.61', '-1.5;2e1', ' 10 20 '])
+        self.assertEqual(first.tolist(), [55.75, -1.5, 10])
+        self.assertEqual(second.tolist(), [37.61, 20, 20])
+
+    def test_encode_column(self):
+        self.assertEqual(spatial.encode_column([1, 2]), [1, 2])
+        self.assertEqual(spatial.encode_column(['a', 'b'], binary=True), ['a', 'b'])
+
+        encoded = spatial.encode_column([1.5, 2.5], binary=True)
+        self.assertEqual(encoded['dtype'], 'float64')
+        self.assertEqual(
+            np.frombuffer(base64.b64decode(encoded['data']), dtype='<f8').tolist(),
+            [1.5, 2.5])
+        self.assertEqual(spatial.encode_column([1, 2], binary=True)['dtype'], 'int32')
@@ -15,7 +15,7 @@ from flask_appbuilder.security.sqla import models as ab_models
 
 from superset import db, security_manager, utils
 from superset.models.sql_lab import Query
-from superset.sql_lab import convert_results_to_df
+from superset.sql_lab import convert_results, convert_results_to_df, encode_results
 from tests.base_tests import SupersetTestCase
 
 from superset.db_engine_specs import PostgresEngineSpec
@@ -249,6 +249,28 @@ class SqlLabTests(SupersetTestCase):
         self.assertEqual(len(data), cdf.size)
         self.assertEqual(len(cols), len(cdf.columns))
 
+    def test_columnar_results(self):
+        cols = [['string_col'], ['int_col'], ['float_col'], ['big_col']]
+        data = [['a', 4, None, 2 ** 60], ['b', None, 1.5, 1], [None, 6, 2.5, 2]]
+        cdf = convert_results_to_df(cols, data, PostgresEngineSpec)
+        rows = cdf.data
+        self.assertEqual(
+            {'string_col': 'a', 'int_col': 4, 'float_col': None,
+             'big_col': str(2 ** 60)},
+            rows[0])
+
+        columnar = cdf.columnar()
+        self.assertEqual(['a', 'b', None], columnar['columns'][0]['values'])
+        self.assertEqual([4.0, None, 6.0], columnar['columns'][1]['values'])
+        self.assertEqual('object', columnar['columns'][3]['type'])
+
+        for results_format in ('columnar', 'binary'):
+            payload = dict(
+                encode_results(cdf, results_format), columns=cdf.columns)
+            payload = json.loads(json.dumps(payload))
+            self.assertEqual(
+                rows[:2], convert_results(payload, 'rows', limit=2)['data'])
+
     def test_sqllab_viz(self):
         self.login('test_user')
         payload = {
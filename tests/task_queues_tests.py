@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+from mock import Mock, patch
+
+from superset import task_queues
+from superset.task_queues import Workload
+
+
+class TaskQueuesTestCase(unittest.TestCase):
+
+    def get_database(self, **extra):
+        database = Mock()
+        database.id = 3
+        database.backend = 'hive'
+        database.get_extra.return_value = extra
+        return database
+
+    @patch.dict(task_queues.config, {'CELERY_QUERY_QUEUE': None})
+    def test_queues_of_the_extra(self):
+        database = self.get_database(
+            celery_queues={'sql_lab': 'hive_sql_lab'}, celery_queue='hive')
+        self.assertEqual('hive_sql_lab', task_queues.get_queue(database, Workload.SQL_LAB))
+        self.assertEqual('hive', task_queues.get_queue(database, Workload.DASHBOARD))
+        self.assertEqual({}, task_queues.get_options(self.get_database(), Workload.SQL_LAB))
+        self.assertEqual({}, task_queues.get_options(None, Workload.SQL_LAB))
+
+    @patch.dict(task_queues.config, {'CELERY_QUERY_QUEUE': '{backend}_{workload}'})
+    def test_queue_template(self):
+        self.assertEqual(
+            {'queue': 'hive_dashboard'},
+            task_queues.get_options(self.get_database(), Workload.DASHBOARD))
+        database = self.get_database(celery_queue='slow')
+        self.assertEqual('slow', task_queues.get_queue(database, Workload.DASHBOARD))
+
+    @patch.dict(task_queues.config, {'CELERY_PREFETCH_ONE_QUEUES': ['hive_sql_lab', 'hive']})
+    def test_prefetches_one(self):
+        self.assertTrue(task_queues.prefetches_one(['hive']))
+        self.assertFalse(task_queues.prefetches_one(['hive', 'clickhouse_dashboard']))
+        self.assertFalse(task_queues.prefetches_one(None))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+import unittest
+
+from superset import time_buckets
+
+
+class TimeBucketsTestCase(unittest.TestCase):
+
+    def test_fixed_grain(self):
+        self.assertEqual(time_buckets.fixed_grain('PT5M'), timedelta(minutes=5))
+        self.assertEqual(time_buckets.fixed_grain('PT0.5H'), timedelta(minutes=30))
+        self.assertEqual(time_buckets.fixed_grain('P1W'), timedelta(weeks=1))
+        self.assertIsNone(time_buckets.fixed_grain('P1M'))
+        self.assertTrue(time_buckets.is_supported(None))
+        self.assertTrue(time_buckets.is_supported('P0.25Y'))
+        self.assertFalse(time_buckets.is_supported('1969-12-28T00:00:00Z/P1W'))
+        self.assertFalse(time_buckets.is_supported('P1W'))
+        self.assertTrue(time_buckets.is_supported('P1W', week_starts_monday=True))
+
+    def test_split_hours_in_days(self):
+        buckets = time_buckets.split(
+            datetime(2018, 1, 3, 5), datetime(2018, 1, 6, 12), 'PT1H',
+            timedelta(days=1), now=datetime(2018, 1, 5, 10))
+        self.assertEqual(
+            [(b.start, b.end, b.whole) for b in buckets],
+            [
+                (datetime(2018, 1, 3, 5), datetime(2018, 1, 4), False),
+                (datetime(2018, 1, 4), datetime(2018, 1, 5), True),
+                # still open
+                (datetime(2018, 1, 5), datetime(2018, 1, 6), False),
+                (datetime(2018, 1, 6), datetime(2018, 1, 6, 12), False),
+            ])
+
+    def test_split_weeks_start_on_monday(self):
+        buckets = time_buckets.split(
+            datetime(2018, 1, 3), datetime(2018, 1, 22), 'P1W',
+            timedelta(days=1), now=datetime(2018, 5, 1))
+        self.assertEqual(
+            [b.start for b in buckets],
+            [datetime(2018, 1, 3), datetime(2018, 1, 8), datetime(2018, 1, 15)])
+        self.assertEqual([b.whole for b in buckets], [False, True, True])
+
+    def test_split_quarters(self):
+        buckets = time_buckets.split(
+            datetime(2017, 11, 15), datetime(2018, 5, 1), 'P0.25Y',
+            timedelta(days=1), now=datetime(2018, 5, 1))
+        self.assertEqual(
+            [(b.start, b.whole) for b in buckets],
+            [
+                (datetime(2017, 11, 15), False),
+                (datetime(2018, 1, 1), True),
+                (datetime(2018, 4, 1), False),
+            ])
@@ -4,12 +4,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import unittest
 
 from mock import Mock, patch
 import pandas as pd
+import sqlalchemy as sqla
 
+from superset.models.core import GeoPoligonArea
 from superset.utils import DTTM_ALIAS
 import superset.viz as viz
 
@@ -33,6 +35,14 @@ class BaseVizTestCase(unittest.TestCase):
             test_viz.get_fillna_for_columns(),
         )
 
+    def test_is_approximate(self):
+        datasource = Mock()
+        datasource.type = 'table'
+        self.assertTrue(viz.BaseViz(datasource, {'approximate': True}).is_approximate)
+        self.assertFalse(viz.BaseViz(datasource, {}).is_approximate)
+        datasource.type = 'druid'
+        self.assertFalse(viz.BaseViz(datasource, {'approximate': True}).is_approximate)
+
     def test_get_df_returns_empty_df(self):
         datasource = Mock()
         datasource.type = 'table'
@@ -487,7 +497,7 @@ class PartitionVizTestCase(unittest.TestCase):
         groups = ['groupA', 'groupB', 'groupC']
         test_viz = viz.PartitionViz(Mock(), {'groupby': groups})
 
-        def return_args(df_drop, aggregate):
+        def return_args(df_drop, aggregate, groupby=None):
             return df_drop
 
         test_viz.process_data = Mock(side_effect=return_args)
@@ -631,3 +641,364 @@ class RoseVisTestCase(unittest.TestCase):
                                     {'key': ('b1',), 'value': 6, 'name': ('b1',), 'time': '2004-01-01 02:00:00'},
                                     {'key': ('c1',), 'value': 9, 'name': ('c1',), 'time': '2004-01-01 02:00:00'}]}
         self.assertEqual(expected, res)
+
+
+class HeatmapVizTestCase(unittest.TestCase):
+
+    def get_df(self):
+        return pd.DataFrame({
+            'colA': ['a', 'b', 'a', 'b'],
+            'colB': ['x', 'x', 'y', 'y'],
+            'metric1': [1, 3, 5, 9],
+        })
+
+    def test_get_data_normalizes_per_group(self):
+        fd = {
+            'all_columns_x': 'colA',
+            'all_columns_y': 'colB',
+            'metric': 'metric1',
+            'normalize_across': 'y',
+        }
+        data = viz.HeatmapViz(Mock(), fd).get_data(self.get_df())
+        self.assertEqual(
+            [0.0, 1.0, 0.0, 1.0], [r['perc'] for r in data['records']])
+        self.assertEqual([1, 9], data['extents'])
+
+    def test_get_data_matrix_format(self):
+        fd = {
+            'all_columns_x': 'colA',
+            'all_columns_y': 'colB',
+            'metric': 'metric1',
+            'normalize_across': 'heatmap',
+            'heatmap_format': 'matrix',
+        }
+        df = self.get_df().iloc[:3]
+        data = viz.HeatmapViz(Mock(), fd).get_data(df)
+        self.assertEqual(['a', 'b'], data['x'])
+        self.assertEqual(['x', 'y'], data['y'])
+        self.assertEqual([[1.0, 3.0], [5.0]], [
+            [v for v in row if v == v] for row in data['values']])
+        self.assertEqual([0.0, 0.5], data['perc'][0])
+
+
+class TreemapVizTestCase(unittest.TestCase):
+
+    def test_nest_builds_hierarchy(self):
+        df = pd.DataFrame({
+            'groupA': ['b1', 'a1', 'b1', 'a1'],
+            'groupB': ['x', 'y', 'y', 'x'],
+            'metric1': [1, 2, 3, 4],
+        }).set_index(['groupA', 'groupB'])
+        nest = viz.TreemapViz(Mock(), {})._nest('metric1', df)
+        expected = [
+            {'name': 'a1', 'children': [
+                {'name': 'y', 'value': 2}, {'name': 'x', 'value': 4}]},
+            {'name': 'b1', 'children': [
+                {'name': 'x', 'value': 1}, {'name': 'y', 'value': 3}]},
+        ]
+        self.assertEqual(expected, nest)
+
+
+class BoxPlotVizTestCase(unittest.TestCase):
+
+    def get_df(self):
+        return pd.DataFrame({
+            'groupA': ['a'] * 6 + ['b'] * 4,
+            'metric1': [1, 2, 3, 4, 5, 100, 10, 10, 20, 30],
+        })
+
+    def test_get_data_tukey(self):
+        fd = {'groupby': ['groupA'], 'metrics': ['metric1'], 'whisker_options': 'Tukey'}
+        data = viz.BoxPlotViz(Mock(), fd).get_data(self.get_df())
+        self.assertEqual(['a', 'b'], [box['label'] for box in data])
+        box = data[0]['values']
+        self.assertEqual(
+            [2.25, 3.5, 4.75],
+            [box['Q1'], box['Q2'], box['Q3']])
+        self.assertEqual(5, box['whisker_high'])
+        self.assertEqual(1, box['whisker_low'])
+        self.assertEqual([100], box['outliers'])
+        self.assertEqual([], data[1]['values']['outliers'])
+
+    def test_get_data_percentiles(self):
+        fd = {
+            'groupby': ['groupA'],
+            'metrics': ['metric1'],
+            'whisker_options': '10/90 percentiles',
+        }
+        data = viz.BoxPlotViz(Mock(), fd).get_data(self.get_df())
+        box = data[1]['values']
+        self.assertEqual(10, box['whisker_low'])
+        self.assertEqual(27, box['whisker_high'])
+        self.assertEqual([30], box['outliers'])
+
+    def test_get_data_skips_the_timestamp(self):
+        fd = {'groupby': ['groupA'], 'metrics': ['metric1'], 'whisker_options': 'Tukey'}
+        df = self.get_df()
+        df[DTTM_ALIAS] = pd.date_range('2018-01-01', periods=10)
+        data = viz.BoxPlotViz(Mock(), fd).get_data(df)
+        self.assertEqual(['a', 'b'], [box['label'] for box in data])
+        self.assertEqual(3.5, data[0]['values']['Q2'])
+
+
+class IncrementalCacheTestCase(unittest.TestCase):
+
+    def get_viz(self):
+        datasource = Mock()
+        datasource.type = 'table'
+        datasource.uid = '1__table'
+
+        def query(query_obj, session=None):
+            results = Mock()
+            results.query = 'SELECT {from_dttm:%Y-%m-%d}'.format(**query_obj)
+            results.status = 'success'
+            results.error_message = None
+            results.total_found = 1
+            results.df = pd.DataFrame({
+                DTTM_ALIAS: [query_obj['from_dttm']], 'metric': [1]})
+            return results
+        datasource.query = Mock(side_effect=query)
+        return viz.NVD3TimeSeriesViz(datasource, {'viz_type': 'line'})
+
+    def get_query_obj(self):
+        return {
+            'granularity': 'ds',
+            'is_timeseries': True,
+            'from_dttm': datetime(2018, 1, 1),
+            'to_dttm': datetime(2018, 1, 3, 12),
+            'metrics': ['metric'],
+            'extras': {'time_grain_sqla': 'P1D'},
+        }
+
+    @patch.dict(viz.config, {
+        'INCREMENTAL_CACHE_ENABLED': True,
+        'INCREMENTAL_CACHE_MIN_BUCKET': 60 * 60 * 24,
+        'INCREMENTAL_CACHE_MAX_BUCKETS': 10,
+    })
+    @patch('superset.viz.cache')
+    def test_whole_buckets_are_reused(self, cache):
+        store = {}
+        cache.get_many.side_effect = lambda *keys: [store.get(k) for k in keys]
+        cache.set.side_effect = lambda key, value, timeout=None: store.update({key: value})
+
+        test_viz = self.get_viz()
+        query_obj = self.get_query_obj()
+        self.assertTrue(test_viz.use_incremental_cache(query_obj))
+        df = test_viz.get_incremental_df(query_obj)
+        self.assertEqual(3, len(df))
+        self.assertEqual(3, test_viz.datasource.query.call_count)
+        self.assertEqual(2, len(store))
+        pieces = [c[0][0] for c in test_viz.datasource.query.call_args_list]
+        self.assertEqual(
+            [True, True, False],
+            [p['extras']['exclusive_to_dttm'] for p in pieces])
+
+        test_viz = self.get_viz()
+        df = test_viz.get_incremental_df(self.get_query_obj())
+        self.assertEqual(3, len(df))
+        # only the partial bucket is queried again
+        self.assertEqual(1, test_viz.datasource.query.call_count)
+        self.assertEqual('SELECT 2018-01-03', test_viz.query)
+
+    @patch.dict(viz.config, {
+        'INCREMENTAL_CACHE_ENABLED': True,
+        'INCREMENTAL_CACHE_MIN_BUCKET': 60 * 60 * 24,
+        'INCREMENTAL_CACHE_MAX_BUCKETS': 10,
+    })
+    @patch('superset.viz.cache')
+    def test_reached_row_limit_runs_the_query_unsplit(self, cache):
+        cache.get_many.side_effect = lambda *keys: [None for k in keys]
+        test_viz = self.get_viz()
+        query_obj = self.get_query_obj()
+        query_obj['row_limit'] = 3
+        self.assertTrue(test_viz.use_incremental_cache(query_obj))
+        df = test_viz.get_incremental_df(query_obj)
+        # the 3 buckets, then the whole range
+        self.assertEqual(4, test_viz.datasource.query.call_count)
+        self.assertEqual(query_obj, test_viz.datasource.query.call_args[0][0])
+        self.assertEqual(1, len(df))
+
+        test_viz = self.get_viz()
+        query_obj['row_limit'] = 4
+        self.assertEqual(3, len(test_viz.get_incremental_df(query_obj)))
+        self.assertEqual(3, test_viz.datasource.query.call_count)
+
+    @patch.dict(viz.config, {'INCREMENTAL_CACHE_ENABLED': True})
+    @patch('superset.viz.cache')
+    def test_weeks_are_split_on_monday_engines_only(self, cache):
+        test_viz = self.get_viz()
+        query_obj = self.get_query_obj()
+        query_obj['extras'] = {'time_grain_sqla': 'P1W'}
+        test_viz.datasource.database.db_engine_spec.week_starts_monday = True
+        self.assertTrue(test_viz.use_incremental_cache(query_obj))
+        test_viz.datasource.database.db_engine_spec.week_starts_monday = False
+        self.assertFalse(test_viz.use_incremental_cache(query_obj))
+
+    @patch.dict(viz.config, {'INCREMENTAL_CACHE_ENABLED': True})
+    @patch('superset.viz.cache')
+    def test_limited_queries_are_not_split(self, cache):
+        test_viz = self.get_viz()
+        query_obj = self.get_query_obj()
+        query_obj['timeseries_limit'] = 10
+        self.assertFalse(test_viz.use_incremental_cache(query_obj))
+        self.assertFalse(viz.TableViz(Mock(), {}).use_incremental_cache(
+            self.get_query_obj()))
+
+
+class TimeCompareUnionTestCase(unittest.TestCase):
+
+    def get_viz(self):
+        datasource = Mock()
+        datasource.type = 'table'
+        datasource.offset = 0
+        form_data = {'viz_type': 'line', 'metrics': ['metric'], 'time_compare': '1 day'}
+        return viz.NVD3TimeSeriesViz(datasource, form_data)
+
+    def get_query_obj(self, grain='P1D'):
+        return {
+            'granularity': 'ds',
+            'is_timeseries': True,
+            'from_dttm': datetime(2018, 1, 2),
+            'to_dttm': datetime(2018, 1, 5),
+            'metrics': ['metric'],
+            'row_limit': 100,
+            'extras': {'time_grain_sqla': grain},
+        }
+
+    @patch.dict(viz.config, {'TIME_COMPARE_UNION': True})
+    @patch('superset.viz.BaseViz.get_df_payload')
+    @patch('superset.viz.BaseViz.query_obj')
+    def test_windows_are_read_once(self, query_obj, get_df_payload):
+        query_obj.return_value = self.get_query_obj()
+        get_df_payload.return_value = {'df': pd.DataFrame({
+            DTTM_ALIAS: pd.date_range('2018-01-01', periods=5),
+            'metric': [1, 2, 3, 4, 5],
+        })}
+        test_viz = self.get_viz()
+        test_viz.run_extra_queries()
+        get_df_payload.assert_called_once()
+        union_obj = get_df_payload.call_args[0][0]
+        self.assertEqual(datetime(2018, 1, 1), union_obj['from_dttm'])
+        self.assertEqual(datetime(2018, 1, 5), union_obj['to_dttm'])
+        self.assertEqual(200, union_obj['row_limit'])
+
+        payload = test_viz.get_df_payload()
+        self.assertEqual([2, 3, 4, 5], payload['df']['metric'].tolist())
+        shifted = test_viz._extra_chart_data[0]['values']
+        self.assertEqual([1, 2, 3], [v['y'] for v in shifted])
+        self.assertEqual(str(datetime(2018, 1, 2)), shifted[0]['x'])
+
+    @patch.dict(viz.config, {'TIME_COMPARE_UNION': True})
+    @patch('superset.viz.BaseViz.get_df_payload')
+    @patch('superset.viz.BaseViz.query_obj')
+    def test_truncated_union_is_queried_again(self, query_obj, get_df_payload):
+        query_object = self.get_query_obj()
+        query_object['row_limit'] = 2
+        query_obj.return_value = query_object
+        get_df_payload.return_value = {'df': pd.DataFrame({
+            DTTM_ALIAS: pd.date_range('2018-01-01', periods=4),
+            'metric': [1, 2, 3, 4],
+        })}
+        test_viz = self.get_viz()
+        test_viz.run_extra_queries()
+        self.assertEqual(2, get_df_payload.call_count)
+        shifted_obj = get_df_payload.call_args[0][0]
+        self.assertEqual(datetime(2018, 1, 1), shifted_obj['from_dttm'])
+        self.assertEqual(datetime(2018, 1, 4), shifted_obj['to_dttm'])
+        self.assertEqual(2, shifted_obj['row_limit'])
+        self.assertIsNone(test_viz._time_compare_payload)
+
+    @patch.dict(viz.config, {'TIME_COMPARE_UNION': True})
+    def test_unaligned_bounds_are_not_unioned(self):
+        test_viz = self.get_viz()
+        delta = timedelta(days=1)
+        self.assertTrue(test_viz.can_union_time_compare(self.get_query_obj(), delta))
+        self.assertTrue(test_viz.can_union_time_compare(self.get_query_obj(None), delta))
+        self.assertFalse(test_viz.can_union_time_compare(
+            self.get_query_obj('P1W'), delta))
+        self.assertFalse(test_viz.can_union_time_compare(
+            self.get_query_obj(), timedelta(hours=12)))
+        self.assertFalse(test_viz.can_union_time_compare(
+            self.get_query_obj(), timedelta(days=3)))
+
+    @patch.dict(viz.config, {'TIME_COMPARE_UNION': True})
+    def test_weeks_are_unioned_on_monday_engines_only(self):
+        test_viz = self.get_viz()
+        query_obj = self.get_query_obj('P1W')
+        # 2018-01-08 is a Monday
+        query_obj['from_dttm'] = datetime(2018, 1, 8)
+        query_obj['to_dttm'] = datetime(2018, 1, 29)
+        delta = timedelta(weeks=1)
+        test_viz.datasource.database.db_engine_spec.week_starts_monday = True
+        self.assertTrue(test_viz.can_union_time_compare(query_obj, delta))
+        test_viz.datasource.database.db_engine_spec.week_starts_monday = False
+        self.assertFalse(test_viz.can_union_time_compare(query_obj, delta))
+
+
+class BubbleMapAreasTestCase(unittest.TestCase):
+
+    def get_point(self, lat, lng, name):
+        return {
+            'latitude': {'value': lat},
+            'longitude': {'value': lng},
+            'pointName': {'value': name},
+        }
+
+    def test_area_points_aggregate_every_area(self):
+        aggregates = [
+            {'points': [self.get_point(1, 2, 'a'), self.get_point(3, 4, 'b')]},
+            {'points': [self.get_point(5, 6, 'c')]},
+            {'points': []},
+        ]
+        engine = sqla.create_engine('sqlite://')
+        engine.execute('CREATE TABLE points (point_key TEXT, value INTEGER)')
+        engine.execute(
+            "INSERT INTO points VALUES "
+            "('12a', 1), ('12a', 2), ('34b', 10), ('56c', 100), ('78d', 1000)")
+        points = sqla.table('points', sqla.column('point_key'), sqla.column('value'))
+
+        areas = viz.BubbleMapVisualization.get_area_points(aggregates)
+        qry = (
+            sqla.select([areas.c.area_index, sqla.func.sum(points.c.value)])
+            .select_from(points.join(areas, points.c.point_key == areas.c.point_key))
+            .group_by(areas.c.area_index)
+        )
+        self.assertEqual({0: 13, 1: 100}, dict(engine.execute(qry).fetchall()))
+        self.assertIsNone(viz.BubbleMapVisualization.get_area_points([{'points': []}]))
+
+    def test_area_join_without_geometries(self):
+        test_viz = viz.BubbleMapVisualization(Mock(), {})
+        test_viz.lat_field = 'LAT'
+        test_viz.lng_field = 'LON'
+        polygons = sqla.select([
+            sqla.column('center_coords'), sqla.column('polygon'),
+        ]).alias('polygons_with_center_coords')
+
+        with patch.object(GeoPoligonArea, 'has_geometries', return_value=False), \
+                patch.object(test_viz, 'get_area_polygons') as get_area_polygons, \
+                patch.object(test_viz, 'get_content_polygons', return_value=polygons):
+            join = test_viz.get_area_join(['LAT', 'LON'])
+        get_area_polygons.assert_not_called()
+        self.assertIn('polygons_with_center_coords', join['join_with'])
+        self.assertEqual(['center_coords', 'polygon'], join['columns'])
+
+
+class SpatialTilesTestCase(unittest.TestCase):
+
+    @patch('superset.viz.cache', None)
+    @patch('superset.viz.spatial.tile_aggregate_sql', return_value='SELECT tile')
+    def test_tile_queries_are_guarded(self, tile_aggregate_sql):
+        datasource = Mock()
+        datasource.type = 'table'
+        datasource.run_chart_sql.return_value = (
+            pd.DataFrame({'cell': [1], 'count': [2]}), None)
+        test_viz = viz.MapboxViz(
+            datasource, {'all_columns_x': 'lon', 'all_columns_y': 'lat'})
+        data = test_viz.get_tile('0', {}, 'key', 32, 'grid')
+        datasource.run_chart_sql.assert_called_once_with('SELECT tile')
+        datasource.database.get_df.assert_not_called()
+        self.assertEqual({'cell': [1], 'count': [2]}, data)
+
+        datasource.run_chart_sql.return_value = (None, 'The query is too expensive')
+        with self.assertRaises(Exception):
+            test_viz.get_tile('1', {}, 'key', 32, 'grid')